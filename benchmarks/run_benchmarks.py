@@ -0,0 +1,355 @@
+"""End-to-end benchmarks for ingestion, retrieval, generation and evaluation.
+
+Runs the real pipeline components against synthetic corpora with a
+deterministic in-process fake LLM (the stub server's reply rules) and fake
+embeddings, so results measure our own code rather than network latency.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # all tiers
+    python benchmarks/run_benchmarks.py --tiers xs s --repeat 5
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Exit status is 1 when a stage regresses against the baseline by more than
+``--threshold`` (relative p50 latency).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = PROJECT_ROOT / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+import yaml
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from chatbot.chatbot_core import ChatbotCore
+from chatbot.content_processor import ContentProcessor
+from chatbot.evaluation_engine import EvaluationEngine, EvaluationMetric
+from chatbot.memory_manager import MemoryManager
+from chatbot.testcase_generator import TestcaseGenerator, TestcaseModeConfig
+from utils.llm_tracer import percentile
+from utils.stub_openai_server import generate_reply
+
+# name -> (documents, chunks across the corpus)
+TIERS: Dict[str, tuple] = {
+    "xs": (1, 10),
+    "s": (10, 100),
+    "m": (100, 1000),
+    "l": (500, 10000),
+}
+
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "output" / "benchmarks"
+
+_ROLE_NAMES = {"human": "user", "ai": "assistant", "system": "system"}
+
+_VOCABULARY = [
+    "用户", "登录", "支付", "订单", "库存", "权限", "通知", "搜索", "报表", "配置",
+    "接口", "超时", "重试", "并发", "缓存", "审计", "导出", "退款", "审批", "同步",
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model answering with the stub server's rules."""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        payload = [
+            {"role": _ROLE_NAMES.get(message.type, "user"), "content": message.content}
+            for message in messages
+        ]
+        reply = generate_reply(payload)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+
+def synthesize_document(index: int, chunks: int, chunk_chars: int, rng: random.Random) -> str:
+    """Build a markdown PRD-like document of roughly ``chunks`` splitter chunks."""
+
+    lines = [f"# 需求文档 {index}"]
+    size = 0
+    section = 0
+    while size < chunks * chunk_chars:
+        section += 1
+        topic = rng.choice(_VOCABULARY)
+        heading = f"## {topic}模块 {index}-{section}"
+        body = "".join(
+            f"{rng.choice(_VOCABULARY)}{rng.choice(_VOCABULARY)}需要满足规则{rng.randint(1, 99)}。"
+            for _ in range(12)
+        )
+        lines.extend([heading, body])
+        size += len(heading) + len(body)
+    return "\n\n".join(lines)
+
+
+def write_corpus(directory: Path, documents: int, total_chunks: int, chunk_chars: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    per_doc = max(1, total_chunks // documents)
+    paths: List[str] = []
+    for index in range(documents):
+        path = directory / f"doc_{index:04d}.md"
+        path.write_text(synthesize_document(index, per_doc, chunk_chars, rng), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def peak_rss_mb() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return usage / (1024 * 1024) if platform.system() == "Darwin" else usage / 1024
+
+
+def traced_peak_mb(func: Callable[[], Any]) -> float:
+    """Peak Python heap allocated while ``func`` runs.
+
+    Measured with tracemalloc, so it is specific to the stage (unlike the
+    process-wide ``ru_maxrss``) but does not see native buffers such as the
+    FAISS index.
+    """
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Time ``repeat`` runs, then do one extra traced run for the stage's peak allocation."""
+
+    latencies: List[float] = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - started)
+    # Traced separately: tracemalloc slows allocation-heavy code and would skew the latencies.
+    return {"latencies": latencies, "result": result, "peak_alloc_mb": traced_peak_mb(func)}
+
+
+def summarize(latencies: List[float], items: int, peak_alloc_mb: float) -> Dict[str, Any]:
+    p50 = percentile(latencies, 50)
+    return {
+        "runs": len(latencies),
+        "items": items,
+        "p50": round(p50, 6),
+        "p95": round(percentile(latencies, 95), 6),
+        "mean": round(sum(latencies) / len(latencies), 6),
+        "throughput": round(items / p50, 3) if p50 else None,
+        "peak_alloc_mb": round(peak_alloc_mb, 1),
+    }
+
+
+def load_mode(config: Dict[str, Any], mode: str) -> TestcaseModeConfig:
+    raw = (config.get('testcase_modes') or {}).get(mode) or {}
+    return TestcaseModeConfig(
+        name=mode,
+        planner_prompt=raw.get('planner_prompt') or '请列出需要覆盖的模块。\n{context}',
+        builder_prompt=raw.get('builder_prompt') or '针对模块「{module}」输出 JSON {"module_goal": "...","cases": []}\n{context}',
+        system_prompt=raw.get('system_prompt'),
+        context_tokens=int(raw.get('context_tokens') or raw.get('context_limit', 12000)),
+        metadata=raw.get('metadata', {}),
+        layout=raw.get('layout') or 'detailed',
+    )
+
+
+def run_tier(name: str, config: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    documents, total_chunks = TIERS[name]
+    splitter = (config.get('processing') or {}).get('text_splitter') or {}
+    chunk_size = int(splitter.get('chunk_size', 1000))
+    chunk_overlap = int(splitter.get('chunk_overlap', 200))
+    stages: Dict[str, Any] = {}
+
+    llm = FakeChatModel(latency=args.llm_latency)
+    core = ChatbotCore(api_key="benchmark", base_url="http://127.0.0.1:9/v1", text_splitter_config=splitter)
+    core.llm = llm
+    core.embedding_model = DeterministicFakeEmbedding(size=args.embedding_size)
+    processor = ContentProcessor()
+
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as tmp:
+        paths = write_corpus(Path(tmp), documents, total_chunks, chunk_size - chunk_overlap, args.seed)
+
+        ingest = measure(lambda: processor.process_local_files(paths), args.repeat)
+        segments = ingest["result"]
+        stages["ingest"] = summarize(ingest["latencies"], len(segments), ingest["peak_alloc_mb"])
+
+        docs = [{"name": segment.source, "content": segment.content} for segment in segments]
+        index = measure(lambda: core.create_vector_store(docs), args.repeat)
+        vector_store = index["result"]
+        chunk_count = vector_store.index.ntotal if vector_store else 0
+        stages["vector_store"] = summarize(index["latencies"], chunk_count, index["peak_alloc_mb"])
+
+        rng = random.Random(args.seed)
+        queries = [f"{rng.choice(_VOCABULARY)}{rng.choice(_VOCABULARY)}的规则是什么" for _ in range(args.queries)]
+        per_query: List[float] = []
+        for query in queries:
+            started = time.perf_counter()
+            vector_store.similarity_search(query, k=4)
+            per_query.append(time.perf_counter() - started)
+        retrieval_peak = traced_peak_mb(lambda: [vector_store.similarity_search(query, k=4) for query in queries])
+        stages["retrieval"] = summarize(per_query, 1, retrieval_peak)
+
+        memory = MemoryManager()
+        generator = TestcaseGenerator(llm, memory, layout_config=config.get('testcase_layouts') or {})
+        mode = load_mode(config, args.mode)
+        generation = measure(lambda: generator.generate(segments, mode), args.repeat)
+        document = generation["result"]
+        stages["generate"] = summarize(generation["latencies"], len(document.modules), generation["peak_alloc_mb"])
+
+        review_metrics = (config.get('evaluation') or {}).get('review_metrics') or []
+        metrics = [
+            EvaluationMetric(
+                name=raw.get('name', 'metric'),
+                prompt=raw['prompt'],
+                system_prompt=raw.get('system_prompt'),
+                metadata=raw.get('metadata', {}),
+            )
+            for raw in config.get('evaluation_metrics') or []
+            if raw.get('prompt')
+        ]
+        engine = EvaluationEngine(llm, memory, review_metrics=review_metrics)
+        baseline_text = segments[0].content[:4000] if segments else ""
+        candidate_text = document.to_json()
+        evaluation = measure(
+            lambda: engine.evaluate(baseline_text, candidate_text, metrics, 0.0),
+            args.repeat,
+        )
+        stages["evaluate"] = summarize(
+            evaluation["latencies"], len(evaluation["result"]), evaluation["peak_alloc_mb"]
+        )
+
+    return {"documents": documents, "chunks": chunk_count, "stages": stages}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return human-readable regressions of p50 latency beyond ``threshold``."""
+
+    regressions: List[str] = []
+    for tier, payload in results["tiers"].items():
+        base_tier = (baseline.get("tiers") or {}).get(tier)
+        if not base_tier:
+            continue
+        for stage, stats in payload["stages"].items():
+            base_stats = base_tier["stages"].get(stage)
+            if not base_stats or not base_stats.get("p50"):
+                continue
+            change = stats["p50"] / base_stats["p50"] - 1
+            stats["vs_baseline"] = round(change, 4)
+            if change > threshold:
+                regressions.append(
+                    f"{tier}/{stage}: p50 {base_stats['p50']:.4f}s -> {stats['p50']:.4f}s (+{change:.0%})"
+                )
+    return regressions
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    header = f"{'tier':<5}{'stage':<14}{'items':>8}{'p50 (s)':>12}{'p95 (s)':>12}{'items/s':>12}{'alloc MB':>10}{'Δ p50':>9}"
+    print(header)
+    print("-" * len(header))
+    for tier, payload in results["tiers"].items():
+        for stage, stats in payload["stages"].items():
+            delta = stats.get("vs_baseline")
+            print(
+                f"{tier:<5}{stage:<14}{stats['items']:>8}{stats['p50']:>12.4f}{stats['p95']:>12.4f}"
+                f"{(stats['throughput'] or 0):>12.1f}{stats['peak_alloc_mb']:>10.1f}"
+                f"{(f'{delta:+.0%}' if delta is not None else ''):>9}"
+            )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval, generation and evaluation.")
+    parser.add_argument("--config", default=str(PROJECT_ROOT / "config.yaml"))
+    parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=list(TIERS))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (default: 3).")
+    parser.add_argument("--queries", type=int, default=50, help="Retrieval queries per tier (default: 50).")
+    parser.add_argument("--mode", default="default", help="Testcase mode from config (default: default).")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per fake LLM call.")
+    parser.add_argument("--embedding-size", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Result JSON path (default: output/benchmarks/<timestamp>.json).")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative p50 slowdown (default: 0.2).")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline path.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    config_path = Path(args.config)
+    config = yaml.safe_load(config_path.read_text(encoding='utf-8')) if config_path.exists() else {}
+    config = config or {}
+
+    results: Dict[str, Any] = {
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "repeat": args.repeat,
+            "queries": args.queries,
+            "mode": args.mode,
+            "llm_latency": args.llm_latency,
+            "embedding_size": args.embedding_size,
+            "seed": args.seed,
+        },
+        "tiers": {},
+    }
+    for tier in args.tiers:
+        print(f"Running tier {tier} ({TIERS[tier][0]} documents, ~{TIERS[tier][1]} chunks)...", flush=True)
+        results["tiers"][tier] = run_tier(tier, config, args)
+    # ru_maxrss only ever grows, so it is reported once for the whole run rather than per stage.
+    results["process_peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    regressions: List[str] = []
+    if args.baseline:
+        baseline_path = Path(args.baseline)
+        if baseline_path.exists():
+            regressions = compare(results, json.loads(baseline_path.read_text(encoding='utf-8')), args.threshold)
+            results["regressions"] = regressions
+        else:
+            print(f"Baseline {baseline_path} not found; skipping comparison.")
+
+    print()
+    print_table(results)
+    print(f"\nProcess peak RSS (all tiers): {results['process_peak_rss_mb']:.1f} MB")
+
+    output_path = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    targets = [output_path] + ([Path(args.save_baseline)] if args.save_baseline else [])
+    for target in targets:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"\nResults written to {output_path}")
+
+    if regressions:
+        print("\nRegressions beyond threshold:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
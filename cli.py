@@ -1,12 +1,14 @@
 """Terminal entry point for the LangChain chatbot."""
 
 import argparse
+import io
 import os
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.history import InMemoryHistory
@@ -19,9 +21,18 @@ SRC_DIR = PROJECT_ROOT / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-from chatbot.terminal_chatbot_core import TerminalChatbotCore
 from terminal.command_handler import CommandHandler
-from terminal.stream_handler import TerminalStreamHandler
+from terminal.daemon import ChatDaemon, DaemonClient, create_server
+from terminal.script_runner import (
+    SCRIPT_SUFFIXES,
+    HandlerFactory,
+    ScriptRunner,
+    active_console,
+    handle_chat_message,
+)
+
+if TYPE_CHECKING:
+    from chatbot.terminal_chatbot_core import TerminalChatbotCore
 
 DEFAULT_CONFIG_PATH = PROJECT_ROOT / "config.yaml"
 
@@ -38,8 +49,56 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "-f",
         "--file",
-        dest="script_file",
-        help="Path to a command script (.tcl/.txt) to execute before exiting.",
+        dest="script_files",
+        nargs="+",
+        help="Command scripts (.tcl/.txt) or directories of scripts to execute in one process before exiting.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        help="Number of scripts to run in parallel (defaults to config.batch.jobs or 1).",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Start a long-running daemon that keeps models and indexes warm and accepts work over HTTP.",
+    )
+    parser.add_argument(
+        "--host",
+        help="Daemon bind address (defaults to config.daemon.host or 127.0.0.1).",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="Daemon port (defaults to config.daemon.port or 8765).",
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="URL",
+        help="Send scripts or interactive input to a running daemon instead of loading models locally.",
+    )
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="Answer all model calls from a local OpenAI-compatible stub server (offline runs, see config.stub_server).",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Record every model and vision request/response into a cassette file.",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Serve model and vision responses from a recorded cassette instead of the network.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help="With -f: estimate model/vision calls, tokens and wall time of the scripts without calling any model.",
     )
     parser.add_argument(
         "--log-file",
@@ -88,47 +147,73 @@ def build_status_callback(console: Console):
             'error': 'red',
         }
         color = styles.get(level, 'white')
-        console.print(f"[{color}]{message}[/{color}]")
+        active_console(console).print(f"[{color}]{message}[/{color}]")
 
     return _callback
 
 
-def handle_chat_message(
-    chatbot: TerminalChatbotCore,
-    console: Console,
-    prompt: str,
-    use_rag: Optional[bool] = None,
-) -> None:
-    """Send a prompt to the chatbot and stream the response."""
+SessionFactory = Callable[[Console], Tuple['TerminalChatbotCore', HandlerFactory]]
 
-    console.print(f"[bold blue]You:[/bold blue] {prompt}")
-    stream_handler = TerminalStreamHandler(console)
 
-    try:
-        response_text = chatbot.ask(prompt, stream_handler=stream_handler, use_rag=use_rag)
-        if not stream_handler.get_full_response() and response_text:
-            console.print(response_text)
-    except Exception as exc:  # pragma: no cover - runtime feedback
-        console.print(f"[red]Failed to generate response: {exc}[/red]")
+def collect_script_files(paths: List[str], console: Console) -> List[Path]:
+    """Expand script arguments; directories contribute their .tcl/.txt files sorted by name."""
+
+    scripts: List[Path] = []
+    for raw in paths:
+        path = Path(raw).expanduser()
+        if path.is_dir():
+            found = sorted(
+                item for item in path.iterdir()
+                if item.is_file() and item.suffix.lower() in SCRIPT_SUFFIXES
+            )
+            if not found:
+                console.print(f"[yellow]No .tcl/.txt scripts found in {path}[/yellow]")
+            scripts.extend(found)
+        else:
+            scripts.append(path)
+    return scripts
 
 
-def run_script_file(
-    script_path: str,
-    chatbot: TerminalChatbotCore,
-    command_handler: CommandHandler,
+def run_script_batch(
+    script_files: List[Path],
+    build_session: SessionFactory,
     console: Console,
     log_path: Path,
+    stream_options: Optional[Dict[str, Any]] = None,
+    jobs: int = 1,
+    step_parallelism: int = 4,
 ) -> None:
-    """Execute commands from a script file sequentially."""
+    """Run several scripts in one process, each in its own chat session.
 
-    script_file = Path(script_path).expanduser()
-    if not script_file.exists():
-        console.print(f"[red]Script file not found: {script_file}[/red]")
-        return
+    Sessions share the warm models and clients of the process. With
+    ``jobs > 1`` scripts run concurrently; their console output and log
+    entries are buffered and emitted in script order. ``step_parallelism``
+    bounds how many independent steps of one script run at once.
+    """
 
-    if script_file.suffix.lower() not in {'.tcl', '.txt'}:
-        console.print(f"[red]Unsupported script extension {script_file.suffix}. Use .tcl or .txt.[/red]")
-        return
+    def _execute(script_file: Path, script_console: Console, log) -> None:
+        chatbot, build_handler = build_session(script_console)
+        runner = ScriptRunner(
+            chatbot,
+            build_handler,
+            script_console,
+            log,
+            stream_options=stream_options,
+            max_workers=step_parallelism,
+        )
+        try:
+            runner.run(script_file)
+        finally:
+            chatbot.close()
+
+    def _execute_logged(script_file: Path, script_console: Console, log) -> None:
+        """Run one script; a failure is reported and logged without stopping the batch."""
+
+        try:
+            _execute(script_file, script_console, log)
+        except Exception as exc:  # pragma: no cover - batch mode
+            script_console.print(f"[red]Script {script_file} aborted: {exc}[/red]")
+            log.write(f"[{datetime.now().isoformat()}] ERROR: {exc}\n{traceback.format_exc()}\n")
 
     log_path = log_path.expanduser()
     try:
@@ -136,42 +221,141 @@ def run_script_file(
     except OSError as exc:
         console.print(f"[yellow]Failed to prepare log directory {log_path.parent}: {exc}[/yellow]")
 
-    with script_file.open('r', encoding='utf-8') as handle, log_path.open('a', encoding='utf-8') as log:
-        for line_no, raw_line in enumerate(handle, start=1):
-            line = raw_line.strip()
-            if not line or line.startswith('#'):
+    show_banner = len(script_files) > 1
+
+    if jobs <= 1 or len(script_files) <= 1:
+        with log_path.open('a', encoding='utf-8') as log:
+            for script_file in script_files:
+                if show_banner:
+                    console.rule(f"[ {script_file.name} ]")
+                _execute_logged(script_file, console, log)
+        return
+
+    def _run_buffered(script_file: Path) -> Tuple[str, str]:
+        output = io.StringIO()
+        script_console = Console(
+            file=output,
+            force_terminal=console.is_terminal,
+            color_system=console.color_system,
+            width=console.width,
+        )
+        log_buffer = io.StringIO()
+        _execute_logged(script_file, script_console, log_buffer)
+        return output.getvalue(), log_buffer.getvalue()
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="script") as executor:
+        futures = [executor.submit(_run_buffered, script_file) for script_file in script_files]
+        with log_path.open('a', encoding='utf-8') as log:
+            for script_file, future in zip(script_files, futures):
+                rendered, log_text = future.result()
+                if show_banner:
+                    console.rule(f"[ {script_file.name} ]")
+                console.file.write(rendered)
+                console.file.flush()
+                log.write(log_text)
+                log.flush()
+
+
+def run_client(
+    base_url: str,
+    script_files: List[Path],
+    console: Console,
+) -> None:
+    """Submit scripts (or interactive lines) to a running daemon session."""
+
+    client = DaemonClient(base_url)
+    try:
+        client.health()
+    except RuntimeError as exc:
+        console.print(f"[red]{exc}[/red]")
+        sys.exit(1)
+
+    def _submit(script: str) -> str:
+        try:
+            result = client.run(script, width=console.width)
+        except RuntimeError as exc:
+            console.print(f"[red]{exc}[/red]")
+            return 'error'
+        console.print(result.get('output', ''), end="", markup=False, highlight=False)
+        return result.get('status', 'ok')
+
+    if script_files:
+        show_banner = len(script_files) > 1
+        for script_file in script_files:
+            if not script_file.exists():
+                console.print(f"[red]Script file not found: {script_file}[/red]")
                 continue
+            if show_banner:
+                console.rule(f"[ {script_file.name} ]")
+            client.open_session()
+            try:
+                _submit(script_file.read_text(encoding='utf-8'))
+            finally:
+                client.close_session()
+        return
 
-            timestamp = datetime.now().isoformat()
-            log.write(f"[{timestamp}] CMD#{line_no}: {line}\n")
+    session = PromptSession(history=InMemoryHistory())
+    client.open_session()
+    console.print(f"[dim]Connected to {base_url} (session {client.session_id}).[/dim]")
+    try:
+        while True:
             try:
-                console.print(f"[dim]script > {line}[/dim]")
-                if line.startswith('/'):
-                    should_continue, payload = command_handler.process(line)
-                    log.write(f"[{timestamp}] RESULT: command executed.\n")
-                    if payload and payload.get('prompt'):
-                        handle_chat_message(
-                            chatbot,
-                            console,
-                            payload['prompt'],
-                            use_rag=payload.get('use_rag'),
-                        )
-                        log.write(f"[{timestamp}] RESULT: custom command prompt sent.\n")
-                    if not should_continue:
-                        log.write(f"[{timestamp}] INFO: script requested exit.\n\n")
-                        return
-                else:
-                    handle_chat_message(chatbot, console, line)
-                    log.write(f"[{timestamp}] RESULT: chat executed.\n")
-            except Exception as exc:  # pragma: no cover - script mode
-                console.print(f"[red]Script command failed (line {line_no}): {exc}[/red]")
-                log.write(f"[{timestamp}] ERROR: {exc}\n")
-                log.write(traceback.format_exc())
-                log.write("\n")
-                return
-
-            log.write("\n")
-        log.write(f"[{datetime.now().isoformat()}] INFO: script completed.\n\n")
+                user_input = session.prompt("daemon > ")
+            except KeyboardInterrupt:
+                console.print("[dim]Press Ctrl-D or type /exit to quit.[/dim]")
+                continue
+            except EOFError:
+                break
+            if user_input.strip() and _submit(user_input.strip()) == 'exit':
+                break
+    finally:
+        client.close_session()
+        console.print("\n[bold]Goodbye![/bold]")
+
+
+def run_dry_run(
+    script_files: List[Path],
+    config: Dict[str, Any],
+    model_name: Optional[str],
+    trace_log_path: Optional[str],
+    console: Console,
+) -> None:
+    """Print the estimated cost and latency of each script without calling any model."""
+
+    from terminal.dry_run import DryRunEstimator, render_estimate
+
+    if not script_files:
+        console.print("[red]--dry-run needs scripts to estimate (-f script.tcl).[/red]")
+        sys.exit(1)
+    estimator = DryRunEstimator(config, model_name=model_name, trace_log_path=trace_log_path)
+    for script_file in script_files:
+        if not script_file.exists():
+            console.print(f"[red]Script file not found: {script_file}[/red]")
+            continue
+        render_estimate(estimator.estimate(script_file), console)
+
+
+def serve_daemon(
+    daemon: ChatDaemon,
+    host: str,
+    port: int,
+    console: Console,
+) -> None:
+    """Run the daemon until interrupted."""
+
+    try:
+        server = create_server(daemon, host, port)
+    except OSError as exc:
+        console.print(f"[red]Failed to bind daemon on {host}:{port}: {exc}[/red]")
+        sys.exit(1)
+
+    console.print(f"[green]Daemon listening on http://{host}:{port} (Ctrl-C to stop).[/green]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("\n[bold]Daemon stopped.[/bold]")
+    finally:
+        server.server_close()
 
 
 def main() -> None:
@@ -181,7 +365,7 @@ def main() -> None:
     console = Console()
 
     config_path = Path(args.config)
-    script_path_arg = args.script_file
+    script_path_args = args.script_files or []
     script_log_arg = args.log_file
     config = load_config(config_path)
     app_config = config.get('app', {})
@@ -202,9 +386,34 @@ def main() -> None:
     paths_config = config.get('paths', {})
     latest_cache_path = paths_config.get('latest_testcase_cache')
     script_log_default = paths_config.get('script_log')
+    trace_log_path = paths_config.get('trace_log')
     image_prompt_config = config.get('image_prompts', {})
     embedding_model_name = processing_config.get('embedding_model')
     text_splitter_config = processing_config.get('text_splitter', {})
+    rag_config = config.get('rag', {})
+    daemon_config = config.get('daemon', {})
+    batch_config = config.get('batch', {})
+
+    if args.connect:
+        run_client(
+            args.connect,
+            collect_script_files(script_path_args, console),
+            console,
+        )
+        return
+
+    # Imported here so the thin --connect client does not pay for loading LangChain.
+    from chatbot.terminal_chatbot_core import TerminalChatbotCore
+    from utils.llm_cassette import build_cassette_client
+    from utils.http_pool import (
+        ConnectionStats,
+        build_http_client,
+        build_http_transport,
+        build_timeout,
+        configure_download_session,
+    )
+    from utils.load_balancer import EndpointPool, parse_endpoints
+    from utils.model_router import ModelRoute, ModelRouter
 
     api_key = resolve_setting(
         app_config.get('api_key'),
@@ -237,10 +446,115 @@ def main() -> None:
     )
     system_prompt = app_config.get('system_prompt')
 
+    if args.dry_run:
+        run_dry_run(
+            collect_script_files(script_path_args, console),
+            config,
+            model_name,
+            trace_log_path,
+            console,
+        )
+        return
+
+    try:
+        endpoints = parse_endpoints(app_config.get('endpoints'), api_key)
+        image_endpoints = parse_endpoints(app_config.get('image_endpoints'), image_api_key)
+    except ValueError as exc:
+        console.print(f"[red]Invalid endpoint pool: {exc}[/red]")
+        sys.exit(1)
+
+    routing_config = config.get('routing') or {}
+    stub_config = config.get('stub_server', {})
+    if args.stub or stub_config.get('enabled'):
+        from utils.stub_openai_server import StubBehavior, start_stub_server
+
+        instances = max(1, int(stub_config.get('instances', 1) or 1))
+        stub_urls = []
+        try:
+            for index in range(instances):
+                _, stub_url = start_stub_server(
+                    StubBehavior.from_config(stub_config),
+                    host=stub_config.get('host', '127.0.0.1'),
+                    # Extra instances always take a free port.
+                    port=int(stub_config.get('port', 0) or 0) if index == 0 else 0,
+                )
+                stub_urls.append(stub_url)
+        except OSError as exc:
+            console.print(f"[red]Failed to start stub server: {exc}[/red]")
+            sys.exit(1)
+        base_url = image_base_url = stub_urls[0]
+        api_key = api_key or "sk-stub"
+        image_api_key = image_api_key or api_key
+        endpoints = parse_endpoints(
+            [{'base_url': url, 'api_key': f"{api_key}-{index}"} for index, url in enumerate(stub_urls)]
+        ) if instances > 1 else []
+        image_endpoints = []
+        # Routed stages keep their model names but are served by the stub as well.
+        routing_config = {
+            stage: {'model': raw.get('model')} if isinstance(raw, dict) else raw
+            for stage, raw in routing_config.items()
+        }
+        console.print(f"[dim]Using stub model server at {', '.join(stub_urls)}[/dim]")
+
+    # Requests to a logical base URL are spread over its endpoint pool; the
+    # first endpoint's URL and key stand in as the logical ones.
+    balancing_config = config.get('http', {}).get('load_balancing') or {}
+    routes = {}
+    for pool_endpoints in (endpoints, image_endpoints):
+        if not pool_endpoints or pool_endpoints[0].base_url in routes:
+            continue
+        routes[pool_endpoints[0].base_url] = EndpointPool(
+            pool_endpoints,
+            failure_threshold=int(balancing_config.get('failure_threshold', 3)),
+            cooldown=float(balancing_config.get('cooldown', 30)),
+        )
+    if endpoints:
+        if image_base_url == base_url and not image_endpoints:
+            image_base_url, image_api_key = endpoints[0].base_url, endpoints[0].api_key
+        base_url, api_key = endpoints[0].base_url, endpoints[0].api_key
+    if image_endpoints:
+        image_base_url, image_api_key = image_endpoints[0].base_url, image_endpoints[0].api_key
+
+    # One pooled client for chat and vision traffic; a cassette wraps the same pool.
+    http_config = config.get('http', {})
+    connection_stats = ConnectionStats()
+    http_transport = build_http_transport(http_config, connection_stats, routes)
+    configure_download_session(http_config, connection_stats)
+
+    cassette_config = dict(config.get('cassette') or {})
+    if args.record or args.replay:
+        cassette_config.update(mode='record' if args.record else 'replay', path=args.record or args.replay)
+    try:
+        http_client = build_cassette_client(
+            cassette_config,
+            timeout=build_timeout(http_config),
+            transport=http_transport,
+        )
+    except (OSError, ValueError) as exc:
+        console.print(f"[red]Failed to open cassette: {exc}[/red]")
+        sys.exit(1)
+    if http_client is None:
+        http_client = build_http_client(http_config, http_transport)
+    else:
+        cassette_mode = cassette_config.get('mode')
+        if cassette_mode == 'replay':
+            api_key = api_key or "sk-replay"
+            image_api_key = image_api_key or api_key
+        console.print(f"[dim]Cassette {cassette_mode}: {cassette_config.get('path')}[/dim]")
+
     if not api_key:
         console.print("[red]API key not provided. Set it in config.yaml or via KIMI_API_KEY.[/red]")
         sys.exit(1)
 
+    # Stages without a route keep the default chat / vision model.
+    model_router = ModelRouter.from_config(
+        routing_config,
+        ModelRoute(model_name, base_url, api_key),
+        ModelRoute(image_model_name, image_base_url, image_api_key or api_key),
+    )
+    for stage, target in model_router.describe().items():
+        console.print(f"[dim]Routing {stage} → {target}[/dim]")
+
     import json as _json
     import hashlib
 
@@ -249,7 +563,7 @@ def main() -> None:
     ).hexdigest()[:12]
 
     status_callback = build_status_callback(console)
-    chatbot = TerminalChatbotCore(
+    chatbot_kwargs: Dict[str, Any] = dict(
         api_key=api_key,
         base_url=base_url,
         model_name=model_name,
@@ -259,7 +573,9 @@ def main() -> None:
         system_prompt=system_prompt,
         image_prompt_config=image_prompt_config,
         history_limit=app_config.get('history_limit', 50),
-        status_callback=status_callback,
+        history_token_budget=app_config.get('history_token_budget'),
+        history_recent_turns=app_config.get('history_recent_turns', 4),
+        history_summary_max_failures=int(app_config.get('history_summary_max_failures', 3) or 0),
         feishu_app_id=feishu_config.get('app_id'),
         feishu_app_secret=feishu_config.get('app_secret'),
         feishu_base_url=feishu_config.get('base_url', 'https://open.feishu.cn'),
@@ -269,11 +585,26 @@ def main() -> None:
         default_testcase_dir=default_case_dir,
         evaluation_output_dir=default_eval_dir,
         latest_testcase_cache=latest_cache_path,
+        generation_runs_dir=paths_config.get('generation_runs', './output/runs'),
+        generation_config=config.get('generation', {}),
+        summary_config=config.get('summaries', {}),
+        summary_cache_dir=paths_config.get('summary_cache', './output/cache/summaries'),
         embedding_model_name=embedding_model_name,
         text_splitter_config=text_splitter_config,
+        rag_config=rag_config,
+        token_config=config.get('tokens', {}),
+        trace_log_path=trace_log_path,
         config_hash=config_hash,
         evaluation_metrics=evaluation_metrics,
         review_metrics=review_metrics,
+        evaluation_config=evaluation_config,
+    )
+    chatbot = TerminalChatbotCore(
+        status_callback=status_callback,
+        http_client=http_client,
+        connection_stats=connection_stats,
+        model_router=model_router,
+        **chatbot_kwargs,
     )
 
     command_handler = CommandHandler(
@@ -283,14 +614,56 @@ def main() -> None:
         default_case_format=default_case_format,
     )
     log_path = Path(script_log_arg or script_log_default or "./output/logs/shell.log")
+    stream_options = {
+        'flush_interval': float(app_config.get('stream_flush_interval', 0.05)),
+        'show_metrics': bool(app_config.get('stream_show_metrics', True)),
+    }
+
+    def build_session(session_console: Console) -> Tuple['TerminalChatbotCore', HandlerFactory]:
+        session_bot = TerminalChatbotCore(
+            status_callback=build_status_callback(session_console),
+            **chatbot_kwargs,
+            **chatbot.shared_resources(),
+        )
 
-    if script_path_arg:
-        run_script_file(
-            script_path_arg,
-            chatbot,
-            command_handler,
+        def build_handler(handler_console: Console) -> CommandHandler:
+            return CommandHandler(
+                session_bot,
+                handler_console,
+                custom_commands=commands_config,
+                default_case_format=default_case_format,
+            )
+
+        return session_bot, build_handler
+
+    step_parallelism = int(batch_config.get('step_parallelism', 4) or 1)
+
+    if args.serve:
+        serve_daemon(
+            ChatDaemon(
+                build_session,
+                log_path=log_path.expanduser(),
+                stream_options=stream_options,
+                step_parallelism=step_parallelism,
+                session_ttl=float(daemon_config.get('session_ttl', 0) or 0),
+                max_sessions=int(daemon_config.get('max_sessions', 0) or 0),
+            ),
+            args.host or daemon_config.get('host', '127.0.0.1'),
+            int(args.port or daemon_config.get('port', 8765)),
+            console,
+        )
+        return
+
+    if script_path_args:
+        jobs = args.jobs or int(batch_config.get('jobs', 1) or 1)
+        run_script_batch(
+            collect_script_files(script_path_args, console),
+            build_session,
             console,
             log_path,
+            stream_options=stream_options,
+            jobs=jobs,
+            step_parallelism=step_parallelism,
         )
         return
 
@@ -333,10 +706,13 @@ def main() -> None:
                     console,
                     payload['prompt'],
                     use_rag=payload.get('use_rag'),
+                    stream_options=stream_options,
                 )
             continue
 
-        handle_chat_message(chatbot, console, stripped)
+        handle_chat_message(chatbot, console, stripped, stream_options=stream_options)
+
+    chatbot.close()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 """Core chatbot functionality using Kimi AI."""
 
-from typing import Dict, List, Optional
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -8,6 +13,34 @@ from langchain_community.vectorstores import FAISS
 from langchain.chains import ConversationalRetrievalChain
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 
+from chatbot.memory_manager import ConversationStore
+from utils.llm_tracer import LLMTracer
+from utils.model_router import ModelRoute, ModelRouter
+from utils.token_counter import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_SUMMARY_PROMPT = (
+    "请将以下对话压缩为简洁的摘要，保留用户目标、关键事实、结论与未决问题，"
+    "不超过 {max_chars} 字。\n\n"
+    "已有摘要：\n{summary}\n\n"
+    "新增对话：\n{transcript}"
+)
+
+RAG_CONDENSE_STRATEGIES = {"llm", "auto", "rewrite", "embed_recent"}
+
+DEFAULT_RAG_CONDENSE_PROMPT = (
+    "根据以下对话历史，将后续问题改写为一个无需上下文即可理解的独立问题，只输出改写后的问题。\n\n"
+    "对话历史：\n{history}\n\n"
+    "后续问题：{question}"
+)
+
+DEFAULT_RAG_ANSWER_PROMPT = (
+    "请依据以下参考资料回答问题；如果资料中没有答案，请直接说明不知道，不要编造。\n\n"
+    "参考资料：\n{context}\n\n"
+    "问题：{question}"
+)
+
 
 class ChatbotCore:
     """Core chatbot functionality with Kimi AI integration."""
@@ -19,6 +52,11 @@ class ChatbotCore:
         model_name: str = "kimi-k2-turbo-preview",
         embedding_model_name: Optional[str] = None,
         text_splitter_config: Optional[Dict[str, int]] = None,
+        rag_config: Optional[Dict[str, Any]] = None,
+        tracer: Optional[LLMTracer] = None,
+        http_client=None,
+        token_config: Optional[Dict[str, Any]] = None,
+        model_router: Optional[ModelRouter] = None,
     ):
         """Initialize chatbot core.
 
@@ -26,13 +64,29 @@ class ChatbotCore:
             api_key: API key for Kimi model.
             base_url: Base URL for Kimi API.
             model_name: Name of the Kimi model.
+            rag_config: RAG options (condense_strategy, recent_turns, top_k).
+            tracer: Tracer for auxiliary LLM calls made by the chains.
+            http_client: Optional ``httpx.Client`` used for all model requests.
+            token_config: Tokenizer, context window and output reserve used
+                to budget and pre-flight check prompts.
+            model_router: Optional per-stage model routing; stages without a
+                route use ``model_name`` at ``base_url``.
         """
         self.api_key = api_key
         self.base_url = base_url
         self.model_name = model_name
         self.embedding_model_name = embedding_model_name or "BAAI/bge-small-en-v1.5"
         self.text_splitter_config = text_splitter_config or {}
+        self.rag_config = rag_config or {}
+        self.tracer = tracer or LLMTracer()
+        self.http_client = http_client
+        self.token_config = token_config
+        self.token_counter = TokenCounter.from_config(model_name, token_config)
+        self.model_router = model_router
+        self._routed_counters: Dict[str, TokenCounter] = {}
         self.llm = None
+        self._routed_llms: Dict[ModelRoute, ChatOpenAI] = {}
+        self._routed_lock = threading.Lock()
         self.embedding_model = None
         self.vector_store = None
         self.conversation_chain = None
@@ -42,18 +96,24 @@ class ChatbotCore:
         self.llm = self._create_llm()
         self.embedding_model = self._create_embedding_model()
 
-    def _create_llm(self) -> ChatOpenAI:
+    def _create_llm(self, route: Optional[ModelRoute] = None) -> ChatOpenAI:
         """Create and configure Kimi LLM.
 
+        Args:
+            route: Model and endpoint to use instead of the default ones.
+
         Returns:
             Configured ChatOpenAI instance.
         """
         return ChatOpenAI(
-            model_name=self.model_name,
+            model_name=route.model if route else self.model_name,
             temperature=0,
             streaming=True,
-            openai_api_key=self.api_key,
-            openai_api_base=self.base_url
+            openai_api_key=route.api_key if route else self.api_key,
+            openai_api_base=route.base_url if route else self.base_url,
+            http_client=self.http_client,
+            # ChatOpenAI would otherwise send timeout=None and override the client's timeouts.
+            request_timeout=self.http_client.timeout if self.http_client is not None else None,
         )
 
     def _create_embedding_model(self) -> FastEmbedEmbeddings:
@@ -98,43 +158,157 @@ class ChatbotCore:
 
         return None
 
-    def create_conversation_chain(self, vector_store: Optional[FAISS] = None, system_prompt: Optional[str] = None):
+    def create_conversation_chain(
+        self,
+        vector_store: Optional[FAISS] = None,
+        system_prompt: Optional[str] = None,
+        history_token_budget: Optional[int] = None,
+        history_recent_turns: int = 4,
+        store: Optional[ConversationStore] = None,
+        history_summary_max_failures: int = 3,
+    ):
         """Create conversational chain.
 
         Args:
             vector_store: Optional FAISS vector store for RAG.
+            system_prompt: System prompt for the basic chain.
+            history_token_budget: Token budget for verbatim history; older
+                turns are folded into a rolling summary once exceeded.
+            history_recent_turns: Number of recent turns always kept verbatim.
+            store: Shared conversation store read by the basic chain.
+            history_summary_max_failures: Consecutive summarization failures
+                after which the oldest pending turns are dropped (0 = never).
 
         Returns:
             Conversational chain instance.
         """
+        chat_llm = self.get_llm('chat')
+        condense_llm = self.get_llm('condense')
         if vector_store:
-            chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=vector_store.as_retriever(),
-                verbose=False
+            strategy = str(self.rag_config.get('condense_strategy', 'auto')).lower()
+            if strategy not in RAG_CONDENSE_STRATEGIES:
+                logger.warning("Unknown rag.condense_strategy %s; falling back to auto.", strategy)
+                strategy = 'auto'
+            if strategy == 'llm':
+                return ConversationalRetrievalChain.from_llm(
+                    llm=chat_llm,
+                    retriever=vector_store.as_retriever(),
+                    condense_question_llm=condense_llm,
+                    verbose=False
+                )
+            return _FastRetrievalChain(
+                chat_llm,
+                vector_store,
+                condense_llm=condense_llm,
+                strategy=strategy,
+                system_prompt=system_prompt,
+                recent_turns=int(self.rag_config.get('recent_turns', 2)),
+                top_k=int(self.rag_config.get('top_k', 4)),
+                tracer=self.tracer,
+                token_counter=self.get_token_counter('chat'),
             )
-            return chain
 
-        return _BasicConversationChain(self.llm, system_prompt=system_prompt)
+        return _BasicConversationChain(
+            chat_llm,
+            summary_llm=condense_llm,
+            system_prompt=system_prompt,
+            history_token_budget=history_token_budget,
+            history_recent_turns=history_recent_turns,
+            history_summary_max_failures=history_summary_max_failures,
+            store=store,
+            tracer=self.tracer,
+            token_counter=self.get_token_counter('chat'),
+        )
+
+    def get_llm(self, stage: Optional[str] = None) -> ChatOpenAI:
+        """Get the LLM instance for ``stage``.
 
-    def get_llm(self) -> ChatOpenAI:
-        """Get the configured LLM instance.
+        Args:
+            stage: Pipeline stage (see ``utils.model_router.ROUTED_STAGES``);
+                ``None`` or an unrouted stage returns the default LLM.
 
         Returns:
             ChatOpenAI instance.
         """
+        if self.model_router is not None and stage and not self.model_router.is_default(stage):
+            route = self.model_router.route(stage)
+            with self._routed_lock:
+                if route not in self._routed_llms:
+                    self._routed_llms[route] = self._create_llm(route)
+                return self._routed_llms[route]
         if not self.llm:
             self.llm = self._create_llm()
         return self.llm
 
+    def get_token_counter(self, stage: Optional[str] = None) -> TokenCounter:
+        """Get the token counter for the model that serves ``stage``.
+
+        Routed stages count, budget and pre-flight check prompts with their
+        own model's tokenizer and context window; other stages use
+        :attr:`token_counter`.
+        """
+        if self.model_router is None or not stage or self.model_router.is_default(stage):
+            return self.token_counter
+        model = self.model_router.route(stage).model
+        if model == self.model_name:
+            return self.token_counter
+        with self._routed_lock:
+            if model not in self._routed_counters:
+                self._routed_counters[model] = TokenCounter.from_config(model, self.token_config)
+            return self._routed_counters[model]
+
 
 class _BasicConversationChain:
-    """Lightweight replacement for the deprecated ConversationChain."""
+    """Lightweight replacement for the deprecated ConversationChain.
+
+    History is read from a shared :class:`ConversationStore`; the chain only
+    keeps cursors into it. When ``history_token_budget`` is set, only the most
+    recent turns are sent verbatim and older turns are compacted into a
+    rolling summary by a background worker so the prompt size stays flat over
+    long sessions.
+    """
 
-    def __init__(self, llm: ChatOpenAI, system_prompt: Optional[str] = None):
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        system_prompt: Optional[str] = None,
+        history_token_budget: Optional[int] = None,
+        history_recent_turns: int = 4,
+        summary_prompt: Optional[str] = None,
+        store: Optional[ConversationStore] = None,
+        tracer: Optional[LLMTracer] = None,
+        token_counter: Optional[TokenCounter] = None,
+        summary_llm: Optional[ChatOpenAI] = None,
+        history_summary_max_failures: int = 3,
+    ):
         self.llm = llm
-        self.history = []
+        self.summary_llm = summary_llm or llm
+        self.token_counter = token_counter or TokenCounter()
         self.system_prompt = system_prompt
+        self.history_token_budget = history_token_budget if history_token_budget and history_token_budget > 0 else None
+        self.history_recent_turns = max(1, int(history_recent_turns or 1))
+        self.summary_prompt = summary_prompt or DEFAULT_HISTORY_SUMMARY_PROMPT
+        self.tracer = tracer or LLMTracer()
+        # When no store is shared the chain records its own turns.
+        self._owns_store = store is None
+        self.store = store if store is not None else ConversationStore()
+        self.summary = ""
+        # Messages before _summary_cursor are covered by the summary; messages
+        # before _window_cursor are no longer sent verbatim.
+        self._summary_cursor = 0
+        self._window_cursor = 0
+        self._lock = threading.Lock()
+        self._summary_future = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.history_summary_max_failures = max(0, int(history_summary_max_failures or 0))
+        self._summary_failures = 0
+
+    @property
+    def history(self) -> List:
+        """Verbatim history window as LangChain messages."""
+
+        return self._to_messages(self.store.slice(self._window_cursor))
 
     def invoke(self, inputs, config=None):
         user_input = ""
@@ -146,18 +320,286 @@ class _BasicConversationChain:
         if not user_input:
             return {"response": ""}
 
+        self._compact_history()
         messages = []
         if self.system_prompt:
             messages.append(SystemMessage(content=self.system_prompt))
-        messages.extend(self.history)
+        messages.extend(self._history_messages())
         messages.append(HumanMessage(content=user_input))
+        self.token_counter.check((message.content for message in messages), 'Chat')
         response = self.llm.invoke(messages, config)
 
-        self.history.append(HumanMessage(content=user_input))
-        if isinstance(response, AIMessage):
-            self.history.append(response)
-            content = response.content
-        else:
-            content = str(response)
+        content = response.content if isinstance(response, AIMessage) else str(response)
+        if self._owns_store:
+            self.store.append('user', user_input)
+            self.store.append('assistant', content)
+            self._compact_history()
 
         return {"response": content}
+
+    @staticmethod
+    def _to_messages(records: List[Dict[str, str]]) -> List:
+        messages = []
+        for record in records:
+            if record['role'] == 'user':
+                messages.append(HumanMessage(content=record['content']))
+            elif record['role'] == 'assistant':
+                messages.append(AIMessage(content=record['content']))
+        return messages
+
+    def _history_messages(self) -> List:
+        """Return the summary (if any), unsummarized overflow and recent turns."""
+
+        with self._lock:
+            summary = self.summary
+            summary_cursor = self._summary_cursor
+
+        messages = []
+        if summary:
+            messages.append(SystemMessage(content=f"此前对话摘要：\n{summary}"))
+        messages.extend(self._to_messages(self.store.slice(summary_cursor)))
+        return messages
+
+    def _compact_history(self) -> None:
+        """Slide the verbatim window past turns that exceed the token budget."""
+
+        if not self.history_token_budget:
+            return
+
+        keep = self.history_recent_turns * 2
+        # The summary worker reads _window_cursor; update it under the same lock.
+        with self._lock:
+            self._window_cursor = max(self._window_cursor, self.store.first_index)
+            window = self.store.slice(self._window_cursor)
+            moved = 0
+            while len(window) - moved > keep and (
+                self.token_counter.count_messages(record['content'] for record in window[moved:])
+                > self.history_token_budget
+            ):
+                moved += 2
+            if not moved:
+                return
+            self._window_cursor += moved
+
+        self._schedule_summary()
+
+    def close(self) -> None:
+        """Stop the history-summary worker; a summary already running is allowed to finish."""
+
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_summary(self) -> None:
+        with self._lock:
+            if self._closed or (self._summary_future and not self._summary_future.done()):
+                return
+            if self._summary_cursor >= self._window_cursor:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+            self._summary_future = self._executor.submit(self._summarize_pending)
+
+    def _summarize_pending(self) -> None:
+        while True:
+            with self._lock:
+                start, end = self._summary_cursor, self._window_cursor
+                previous = self.summary
+
+            batch = self.store.slice(start, end)
+            if not batch:
+                with self._lock:
+                    self._summary_cursor = max(self._summary_cursor, end)
+                return
+
+            transcript = "\n".join(
+                f"{'用户' if record['role'] == 'user' else '助手'}: {record['content']}"
+                for record in batch
+            )
+            max_chars = max(200, (self.history_token_budget or 2000) // 2)
+            prompt = (
+                self.summary_prompt
+                .replace("{max_chars}", str(max_chars))
+                .replace("{summary}", previous or "（无）")
+                .replace("{transcript}", transcript)
+            )
+            try:
+                response = self.summary_llm.invoke(
+                    [HumanMessage(content=prompt)],
+                    self.tracer.config('history_summary'),
+                )
+                summary = str(getattr(response, "content", response)).strip()
+            except Exception as exc:  # network failure keeps pending turns
+                logger.warning("History summarization failed: %s", exc)
+                with self._lock:
+                    self._summary_failures += 1
+                    if self.history_summary_max_failures and self._summary_failures >= self.history_summary_max_failures:
+                        self._drop_pending_over_budget()
+                return
+
+            with self._lock:
+                self.summary = summary[:max_chars]
+                self._summary_cursor = end
+                self._summary_failures = 0
+
+    def _drop_pending_over_budget(self) -> None:
+        """Drop the oldest unsummarized turns until the history fits the budget; caller holds ``_lock``.
+
+        Used once summarization keeps failing, so pending turns (which are
+        sent verbatim until summarized) cannot grow the prompt without bound.
+        The existing summary is kept.
+        """
+
+        cursor = max(self._summary_cursor, self.store.first_index)
+        pending = self.store.slice(cursor)
+        dropped = 0
+        while cursor + dropped < self._window_cursor and (
+            self.token_counter.count_messages(record['content'] for record in pending[dropped:]) > self.history_token_budget
+        ):
+            dropped += 2
+        dropped = min(dropped, self._window_cursor - cursor)
+        if not dropped:
+            return
+        self._summary_cursor = cursor + dropped
+        logger.warning(
+            "History summarization failed %d times in a row; dropped the %d oldest unsummarized message(s).",
+            self._summary_failures,
+            dropped,
+        )
+
+
+class _FastRetrievalChain:
+    """Retrieval QA chain that avoids the question-condensing LLM call when possible.
+
+    Strategies:
+        auto: skip condensing when history is empty or the question looks
+            self-contained, otherwise condense with the LLM.
+        rewrite: never call the LLM; prefix follow-up questions with the
+            previous user question locally.
+        embed_recent: never call the LLM; retrieve with the raw question plus
+            the most recent turns.
+    """
+
+    # Explicit references to earlier turns, wherever they appear.
+    _REFERENCE_MARKERS = ('上述', '刚才', '刚刚', '前面提到', '上面提到', '之前提到', '你说的', '你提到')
+    # Pronouns or connectives that open a follow-up ("它支持…", "那退款呢").
+    _LEADING_REFERENCE = re.compile(r"^(它们?|他们|她们|这个|那个|这些|那些|这|那|继续|还有|然后|另外)")
+    # Short elliptical questions that only make sense after the previous answer.
+    _ELLIPTICAL_QUESTION = re.compile(r"^(为什么|怎么办|怎么做|然后呢|还有吗|还有呢|.{1,10}呢)[?？。!！]*$")
+    _ENGLISH_LEADING = re.compile(
+        r"^(it|its|this|that|these|those|they|them|he|she|and|also|what about|how about)\b",
+        re.IGNORECASE,
+    )
+    _ENGLISH_REFERENCE = re.compile(
+        r"\b(the above|mentioned above|you (just )?(said|mentioned)|(previous|last) (answer|question|one))\b",
+        re.IGNORECASE,
+    )
+    _ENGLISH_ELLIPTICAL = re.compile(r"^(why|how come|really|and then)\b[^.?!]{0,15}[?.!]*$", re.IGNORECASE)
+
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        vector_store: FAISS,
+        strategy: str = "auto",
+        system_prompt: Optional[str] = None,
+        recent_turns: int = 2,
+        top_k: int = 4,
+        condense_prompt: Optional[str] = None,
+        answer_prompt: Optional[str] = None,
+        tracer: Optional[LLMTracer] = None,
+        token_counter: Optional[TokenCounter] = None,
+        condense_llm: Optional[ChatOpenAI] = None,
+    ):
+        self.llm = llm
+        self.condense_llm = condense_llm or llm
+        self.token_counter = token_counter or TokenCounter()
+        self.vector_store = vector_store
+        self.strategy = strategy
+        self.system_prompt = system_prompt
+        self.recent_turns = max(1, recent_turns)
+        self.top_k = max(1, top_k)
+        self.condense_prompt = condense_prompt or DEFAULT_RAG_CONDENSE_PROMPT
+        self.answer_prompt = answer_prompt or DEFAULT_RAG_ANSWER_PROMPT
+        self.tracer = tracer or LLMTracer()
+
+    def invoke(self, inputs, config=None):
+        question = inputs.get("question", "") if isinstance(inputs, dict) else str(inputs)
+        history: List[Tuple[str, str]] = list(inputs.get("chat_history") or []) if isinstance(inputs, dict) else []
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        query, condensed = self._build_query(question, history)
+        timings['condense'] = time.perf_counter() - started
+
+        retrieve_started = time.perf_counter()
+        documents = self.vector_store.similarity_search(query, k=self.top_k)
+        timings['retrieve'] = time.perf_counter() - retrieve_started
+
+        messages = []
+        if self.system_prompt:
+            messages.append(SystemMessage(content=self.system_prompt))
+        for user_text, assistant_text in history[-self.recent_turns:]:
+            messages.append(HumanMessage(content=user_text))
+            messages.append(AIMessage(content=assistant_text))
+
+        # Retrieved passages get whatever the window leaves after the rest of the prompt.
+        fixed_tokens = self.token_counter.count_messages(
+            [*(message.content for message in messages), self.answer_prompt, question]
+        )
+        context = self.token_counter.truncate(
+            "\n\n".join(doc.page_content for doc in documents),
+            self.token_counter.prompt_budget - fixed_tokens,
+        )
+        prompt = self.answer_prompt.replace("{context}", context).replace("{question}", question)
+        messages.append(HumanMessage(content=prompt))
+        self.token_counter.check((message.content for message in messages), 'RAG answer')
+
+        answer_started = time.perf_counter()
+        response = self.llm.invoke(messages, config)
+        timings['answer'] = time.perf_counter() - answer_started
+        timings['total'] = time.perf_counter() - started
+
+        return {
+            "answer": response.content if isinstance(response, AIMessage) else str(response),
+            "source_documents": documents,
+            "generated_question": query,
+            "strategy": self.strategy,
+            "condensed": condensed,
+            "timings": timings,
+        }
+
+    def _build_query(self, question: str, history: List[Tuple[str, str]]) -> Tuple[str, bool]:
+        """Return the retrieval query and whether an LLM condense call was made."""
+
+        if not history or self.is_self_contained(question):
+            return question, False
+
+        recent = history[-self.recent_turns:]
+        if self.strategy == 'rewrite':
+            return f"{recent[-1][0]}\n{question}", False
+        if self.strategy == 'embed_recent':
+            turns = "\n".join(f"{user_text}\n{assistant_text[:300]}" for user_text, assistant_text in recent)
+            return f"{turns}\n{question}", False
+
+        transcript = "\n".join(f"用户: {user_text}\n助手: {assistant_text}" for user_text, assistant_text in recent)
+        prompt = self.condense_prompt.replace("{history}", transcript).replace("{question}", question)
+        response = self.condense_llm.invoke([HumanMessage(content=prompt)], self.tracer.config('condense'))
+        condensed = str(getattr(response, "content", response)).strip()
+        return condensed or question, True
+
+    @classmethod
+    def is_self_contained(cls, question: str) -> bool:
+        """Heuristically decide whether a question can be answered without history."""
+
+        text = question.strip()
+        if len(text) < 6:
+            return False
+        if any(marker in text for marker in cls._REFERENCE_MARKERS):
+            return False
+        if cls._LEADING_REFERENCE.match(text) or cls._ELLIPTICAL_QUESTION.match(text):
+            return False
+        if cls._ENGLISH_LEADING.match(text) or cls._ENGLISH_ELLIPTICAL.match(text):
+            return False
+        return not cls._ENGLISH_REFERENCE.search(text)
@@ -0,0 +1,239 @@
+"""Hierarchical, content-addressed summaries of long documents for planning."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import HumanMessage, SystemMessage
+
+from chatbot.content_processor import ContentSegment
+from utils.llm_tracer import LLMTracer
+
+logger = logging.getLogger(__name__)
+
+_HEADING = re.compile(r'^\s{0,3}(#{1,6})\s+(.*)$')
+
+DEFAULT_SECTION_PROMPT = (
+    "请用不超过 {max_chars} 字概括以下需求章节，保留功能点、业务规则、约束与异常场景，"
+    "只输出要点，不要复述标题。\n\n章节：{title}\n\n{content}"
+)
+
+DEFAULT_DOCUMENT_PROMPT = (
+    "以下是文档《{source}》各章节的摘要。请用不超过 {max_chars} 字概括整篇文档的目标、"
+    "主要功能模块与它们之间的关系。\n\n{sections}"
+)
+
+
+@dataclass
+class SectionSummary:
+    title: str
+    level: int
+    summary: str
+
+
+@dataclass
+class DocumentSummary:
+    """Section tree of one document: an overview plus one summary per section."""
+
+    source: str
+    overview: str
+    sections: List[SectionSummary] = field(default_factory=list)
+
+    def render(self) -> str:
+        lines = [f"### {self.source}"]
+        if self.overview:
+            lines.append(f"概述：{self.overview}")
+        for section in self.sections:
+            indent = "  " * max(0, section.level - 1)
+            lines.append(f"{indent}- {section.title}：{section.summary}")
+        return "\n".join(lines)
+
+
+def split_sections(content: str, max_chars: int) -> List[Tuple[str, int, str]]:
+    """Split a document at Markdown headings, then by size, into ``(title, level, text)``."""
+
+    sections: List[Tuple[str, int, str]] = []
+    title, level, lines = "", 1, []
+
+    def _flush() -> None:
+        text = "\n".join(lines).strip()
+        if not text:
+            return
+        for start in range(0, len(text), max_chars):
+            part = text[start:start + max_chars]
+            part_title = title or part.splitlines()[0][:30]
+            if start:
+                part_title = f"{part_title}（续）"
+            sections.append((part_title, level, part))
+
+    for line in content.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            _flush()
+            title, level, lines = match.group(2).strip(), len(match.group(1)), []
+        else:
+            lines.append(line)
+    _flush()
+    return sections
+
+
+class DocumentSummarizer:
+    """Summarizes documents once, map-reduce style, and caches results on disk.
+
+    Sections are summarized concurrently (map) and the section summaries are
+    merged into a short document overview (reduce). Every section summary
+    and overview is cached under the SHA-256 of its input, so re-reading a
+    document, or a new version that only changed some sections, reuses the
+    summaries that are still valid. Documents shorter than ``min_chars``
+    are kept verbatim.
+    """
+
+    def __init__(
+        self,
+        llm,
+        tracer: Optional[LLMTracer] = None,
+        cache_dir: Optional[str] = None,
+        min_chars: int = 4000,
+        section_chars: int = 3000,
+        summary_chars: int = 200,
+        overview_chars: int = 400,
+        max_workers: int = 4,
+        section_prompt: Optional[str] = None,
+        document_prompt: Optional[str] = None,
+    ):
+        self.llm = llm
+        self.tracer = tracer or LLMTracer()
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else None
+        self.min_chars = min_chars
+        self.section_chars = section_chars
+        self.summary_chars = summary_chars
+        self.overview_chars = overview_chars
+        self.max_workers = max(1, max_workers)
+        self.section_prompt = section_prompt or DEFAULT_SECTION_PROMPT
+        self.document_prompt = document_prompt or DEFAULT_DOCUMENT_PROMPT
+
+    def summarize(self, segment: ContentSegment) -> Optional[DocumentSummary]:
+        """Section tree for ``segment``; ``None`` when it is short enough to use as is."""
+
+        if len(segment.content) < self.min_chars:
+            return None
+        sections = split_sections(segment.content, self.section_chars)
+        if not sections:
+            return None
+
+        def _summarize(section: Tuple[str, int, str]) -> SectionSummary:
+            title, level, text = section
+            prompt = self.section_prompt.format(max_chars=self.summary_chars, title=title, content=text)
+            return SectionSummary(title=title, level=level, summary=self._cached_invoke(prompt, 'summary_map', title))
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sections))) as executor:
+            summarized = list(executor.map(_summarize, sections))
+
+        overview = self._cached_invoke(self._overview_prompt(segment, summarized), 'summary_reduce', segment.source)
+        return DocumentSummary(source=segment.source, overview=overview, sections=summarized)
+
+    def planned_calls(self, segment: ContentSegment) -> Dict[str, int]:
+        """Model calls per stage that :meth:`summarize` would make for ``segment`` (cache misses only)."""
+
+        if len(segment.content) < self.min_chars:
+            return {}
+        sections = split_sections(segment.content, self.section_chars)
+        if not sections:
+            return {}
+        summarized = [
+            SectionSummary(
+                title=title,
+                level=level,
+                summary=self._load(
+                    self._cache_key(
+                        self.section_prompt.format(max_chars=self.summary_chars, title=title, content=text),
+                        'summary_map',
+                    )
+                ),
+            )
+            for title, level, text in sections
+        ]
+        missing = sum(1 for section in summarized if section.summary is None)
+        # The overview prompt embeds the section summaries, so it can only be
+        # looked up once every section is cached.
+        overview_cached = not missing and self._load(
+            self._cache_key(self._overview_prompt(segment, summarized), 'summary_reduce')
+        ) is not None
+        return {'summary_map': missing, 'summary_reduce': 0 if overview_cached else 1}
+
+    def _overview_prompt(self, segment: ContentSegment, sections: List[SectionSummary]) -> str:
+        section_lines = "\n".join(f"- {section.title}：{section.summary}" for section in sections)
+        return self.document_prompt.format(source=segment.source, max_chars=self.overview_chars, sections=section_lines)
+
+    @staticmethod
+    def _cache_key(prompt: str, stage: str) -> str:
+        return hashlib.sha256(f"{stage}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def _cached_invoke(self, prompt: str, stage: str, label: str) -> str:
+        key = self._cache_key(prompt, stage)
+        cached = self._load(key)
+        if cached is not None:
+            self.tracer.record(stage=stage, latency=0.0, module=label, cache="hit")
+            return cached
+        messages = [
+            SystemMessage(content="你是需求分析专家，擅长提炼文档要点。"),
+            HumanMessage(content=prompt),
+        ]
+        text = self.llm.invoke(messages, self.tracer.config(stage, module=label)).content.strip()
+        self._store(key, text)
+        return text
+
+    def _load(self, key: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.json"
+        try:
+            return json.loads(path.read_text(encoding='utf-8')).get('summary')
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _store(self, key: str, summary: str) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{key}.json"
+            tmp_path = path.with_suffix('.json.tmp')
+            tmp_path.write_text(json.dumps({"summary": summary}, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning("Failed to cache summary %s: %s", key, exc)
+
+    @classmethod
+    def from_config(
+        cls,
+        llm,
+        config: Optional[Dict[str, Any]],
+        tracer: Optional[LLMTracer] = None,
+        cache_dir: Optional[str] = None,
+    ) -> Optional['DocumentSummarizer']:
+        """Build a summarizer from the ``summaries`` config section; ``None`` when disabled."""
+
+        config = config or {}
+        if not config.get('enabled', True):
+            return None
+        return cls(
+            llm,
+            tracer=tracer,
+            cache_dir=cache_dir,
+            min_chars=int(config.get('min_chars', 4000)),
+            section_chars=int(config.get('section_chars', 3000)),
+            summary_chars=int(config.get('summary_chars', 200)),
+            overview_chars=int(config.get('overview_chars', 400)),
+            max_workers=int(config.get('max_workers', 4)),
+            section_prompt=config.get('section_prompt'),
+            document_prompt=config.get('document_prompt'),
+        )
@@ -3,13 +3,31 @@
 from __future__ import annotations
 
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from langchain.schema import HumanMessage, SystemMessage
 
 from chatbot.memory_manager import EvaluationRecord, MemoryManager
+from utils.llm_tracer import LLMTracer
+from utils.token_counter import TokenCounter
 
+# Baseline used when /evaluate_cases is given none.
+BASELINE_PLACEHOLDER = "[baseline placeholder] 未提供基线内容，将直接依据候选用例进行评审。"
+
+# Appended to every map-reduce prompt: a chunk holds only some modules of the suite.
+CHUNK_SCOPE_NOTE = (
+    "注意：待评审用例只是完整用例集的一部分，仅包含以下模块：{modules}。"
+    "请只评审这些模块自身的问题，不要因需求中其他模块未出现或未覆盖而扣分。"
+)
+
+# Appended to every sampled-replicate prompt: the cases are a random sample of the suite.
+SAMPLE_SCOPE_NOTE = (
+    "注意：待评审用例是从完整用例集中随机抽取的 {cases} 条样本（来自模块：{modules}）。"
+    "请只评价这些用例本身的质量，不要因未抽中的模块或场景扣分。"
+)
 
 @dataclass
 class EvaluationMetric:
@@ -17,6 +35,8 @@ class EvaluationMetric:
     prompt: str
     system_prompt: Optional[str]
     metadata: Dict[str, str]
+    # "case": the score is a mean over cases and can be extrapolated from a sample; "suite": judged on the whole suite.
+    scope: str = "suite"
 
 
 @dataclass
@@ -38,13 +58,131 @@ class EvaluationResult:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+@dataclass
+class CandidateModule:
+    """One module of a generated suite, split into individually renderable cases."""
+
+    name: str
+    header: str
+    cases: List[str]
+    payload: Optional[Dict[str, Any]] = None  # module dict when parsed from JSON/JSONL
+
+    def render(self, case_indices: Optional[Sequence[int]] = None) -> str:
+        selected = range(len(self.cases)) if case_indices is None else case_indices
+        if self.payload is not None:
+            module = dict(self.payload)
+            module['cases'] = [self.payload['cases'][index] for index in selected]
+            return json.dumps(module, ensure_ascii=False, indent=2)
+        return "\n".join([self.header, *(self.cases[index] for index in selected)])
+
+
+@dataclass
+class CandidateChunk:
+    """A slice of the candidate suite scored by one map-reduce call."""
+
+    text: str
+    modules: List[str]
+    cases: int
+
+
+def parse_candidate_modules(candidate_text: str) -> List[CandidateModule]:
+    """Split a generated suite (JSON, JSONL or Markdown output) into modules."""
+
+    stripped = candidate_text.strip()
+    payloads: Optional[List[Dict[str, Any]]] = None
+    if stripped.startswith('{'):
+        try:
+            data = json.loads(stripped)
+            payloads = (data.get('document') or data).get('modules')
+        except (json.JSONDecodeError, AttributeError):
+            payloads = None
+        if payloads is None:
+            records = []
+            for line in stripped.splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and record.get('type') == 'module':
+                    records.append(record)
+            payloads = records or None
+    if payloads is not None:
+        modules = []
+        for payload in payloads:
+            if not isinstance(payload, dict):
+                continue
+            payload = {key: value for key, value in payload.items() if key not in {'type', 'index'}}
+            payload['cases'] = list(payload.get('cases') or [])
+            modules.append(
+                CandidateModule(
+                    name=str(payload.get('name') or ''),
+                    header=str(payload.get('goal') or payload.get('fallback_content') or ''),
+                    cases=[json.dumps(case, ensure_ascii=False) for case in payload['cases']],
+                    payload=payload,
+                )
+            )
+        return modules
+
+    modules = []
+    current: Optional[CandidateModule] = None
+    for line in candidate_text.splitlines():
+        if re.match(r'^##\s', line):
+            current = CandidateModule(name=line.lstrip('#').strip(), header=line, cases=[])
+            modules.append(current)
+        elif current is None:
+            continue
+        elif re.match(r'^###\s', line):
+            current.cases.append(line)
+        elif current.cases:
+            current.cases[-1] += "\n" + line
+        else:
+            current.header += "\n" + line
+    return modules
+
+
+def chunk_candidate(modules: List[CandidateModule], chunk_chars: int) -> List[CandidateChunk]:
+    """Group whole modules into chunks of roughly ``chunk_chars`` characters."""
+
+    chunks: List[CandidateChunk] = []
+    texts: List[str] = []
+    names: List[str] = []
+    cases = 0
+    size = 0
+    for module in modules:
+        text = module.render()
+        if texts and size + len(text) > chunk_chars:
+            chunks.append(CandidateChunk("\n\n".join(texts), names, cases))
+            texts, names, cases, size = [], [], 0, 0
+        texts.append(text)
+        names.append(module.name)
+        cases += len(module.cases)
+        size += len(text)
+    if texts:
+        chunks.append(CandidateChunk("\n\n".join(texts), names, cases))
+    return chunks
+
+
 class EvaluationEngine:
     """Runs configured evaluation metrics and returns structured results."""
 
-    def __init__(self, llm, memory: MemoryManager, review_metrics: Optional[List[Dict[str, Any]]] = None):
+    def __init__(
+        self,
+        llm,
+        memory: MemoryManager,
+        review_metrics: Optional[List[Dict[str, Any]]] = None,
+        tracer: Optional[LLMTracer] = None,
+        max_workers: int = 4,
+        token_counter: Optional[TokenCounter] = None,
+        stage_llms: Optional[Dict[str, Any]] = None,
+    ):
         self.llm = llm
+        # Per-stage overrides ('review', 'infer_level') from model routing; metric scoring follows 'review'.
+        self.stage_llms = stage_llms or {}
+        self.token_counter = token_counter or TokenCounter()
         self.memory = memory
+        self.tracer = tracer or LLMTracer()
         self.review_metrics = self._build_review_configs(review_metrics or [])
+        self.max_workers = max(1, int(max_workers))
 
     def evaluate(
         self,
@@ -52,35 +190,50 @@ class EvaluationEngine:
         candidate_text: str,
         metrics: List[EvaluationMetric],
         placeholder_score: float,
+        chunks: Optional[List[CandidateChunk]] = None,
     ) -> List[EvaluationResult]:
-        results: List[EvaluationResult] = []
+        """Score the candidate with every review and plain metric.
 
-        if self.review_metrics:
-            results.extend(self._run_structured_review(baseline_text, candidate_text))
+        With more than one ``chunk`` each metric is run on every chunk
+        concurrently (map) and the chunk results are merged per metric
+        (reduce), so no prompt has to hold the whole suite.
+        """
 
-        for metric in metrics or []:
-            user_prompt = self._fill_template(
-                metric.prompt,
-                baseline=baseline_text,
-                candidate=candidate_text,
-            )
-            messages = [
-                SystemMessage(content=metric.system_prompt or "你是评测专家，请返回 JSON。"),
-                HumanMessage(content=user_prompt),
-            ]
-            response = self.llm.invoke(messages).content.strip()
-            score = self._extract_score(response)
-            results.append(
-                EvaluationResult(
-                    name=metric.name,
-                    score=score,
-                    rationale=response,
-                    suggestions=[],
-                    penalty_summary={},
-                    metadata=metric.metadata,
-                )
-            )
+        if chunks and len(chunks) > 1:
+            results = self._evaluate_chunked(baseline_text, chunks, metrics or [])
+        else:
+            results = []
+            if self.review_metrics:
+                results.extend(self._run_structured_review(baseline_text, candidate_text))
+            for metric in metrics or []:
+                results.append(self._score_metric(metric, baseline_text, candidate_text))
+        self._remember(results)
+        return results
+
+    def evaluate_sample(
+        self,
+        baseline_text: str,
+        replicates: List[CandidateChunk],
+        metrics: List[EvaluationMetric],
+    ) -> List[EvaluationResult]:
+        """Score each sampled replicate with case-level ``metrics`` only.
+
+        Every prompt states that the cases are a random sample, and review
+        metrics (suite-level deduction totals) are not run. Each result's
+        ``penalty_summary.chunk_scores`` holds the replicate scores.
+        """
 
+        results = self._evaluate_chunked(
+            baseline_text,
+            replicates,
+            metrics,
+            include_review=False,
+            scope_template=SAMPLE_SCOPE_NOTE,
+        )
+        self._remember(results)
+        return results
+
+    def _remember(self, results: List[EvaluationResult]) -> None:
         for record in results:
             self.memory.add_evaluation(
                 EvaluationRecord(
@@ -91,119 +244,287 @@ class EvaluationEngine:
                 )
             )
 
-        return results
+    def _score_metric(
+        self,
+        metric: EvaluationMetric,
+        baseline_text: str,
+        candidate_text: str,
+        label: Optional[str] = None,
+        scope_note: str = "",
+    ) -> EvaluationResult:
+        user_prompt = self._fill_template(
+            metric.prompt,
+            baseline=self._fit_baseline(
+                f"{metric.prompt}\n{scope_note}", metric.system_prompt, baseline_text, candidate_text
+            ),
+            candidate=candidate_text,
+        )
+        if scope_note:
+            user_prompt = f"{user_prompt}\n{scope_note}"
+        messages = [
+            SystemMessage(content=metric.system_prompt or "你是评测专家，请返回 JSON。"),
+            HumanMessage(content=user_prompt),
+        ]
+        self.token_counter.check((message.content for message in messages), f"Metric {label or metric.name}")
+        llm = self.stage_llms.get('review', self.llm)
+        response = llm.invoke(messages, self.tracer.config('metric', module=label or metric.name)).content.strip()
+        return EvaluationResult(
+            name=metric.name,
+            score=self._metric_score(response),
+            rationale=response,
+            suggestions=[],
+            penalty_summary={},
+            metadata=metric.metadata,
+        )
+
+    def _evaluate_chunked(
+        self,
+        baseline_text: str,
+        chunks: List[CandidateChunk],
+        metrics: List[EvaluationMetric],
+        include_review: bool = True,
+        scope_template: str = CHUNK_SCOPE_NOTE,
+    ) -> List[EvaluationResult]:
+        review_metrics = self.review_metrics if include_review else []
+        jobs: List[Tuple[Any, int]] = [
+            (metric, index)
+            for metric in [*review_metrics, *metrics]
+            for index in range(len(chunks))
+        ]
+        if not jobs:
+            return []
+
+        def _run(job: Tuple[Any, int]) -> EvaluationResult:
+            metric, index = job
+            label = f"{metric.name}[{index + 1}/{len(chunks)}]"
+            modules = "、".join(name for name in chunks[index].modules if name) or "（未命名）"
+            scope_note = scope_template.format(modules=modules, cases=chunks[index].cases)
+            if isinstance(metric, ReviewMetricConfig):
+                return self._review_metric(metric, baseline_text, chunks[index].text, label, scope_note)
+            return self._score_metric(metric, baseline_text, chunks[index].text, label, scope_note)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs)) or 1) as executor:
+            outputs = list(executor.map(_run, jobs))
+
+        per_metric: Dict[int, List[EvaluationResult]] = {}
+        metric_order: List[Any] = []
+        for (metric, _), result in zip(jobs, outputs):
+            if id(metric) not in per_metric:
+                per_metric[id(metric)] = []
+                metric_order.append(metric)
+            per_metric[id(metric)].append(result)
+        return [self._reduce_chunk_results(metric, chunks, per_metric[id(metric)]) for metric in metric_order]
 
-    def _run_structured_review(self, baseline_text: str, candidate_text: str) -> List[EvaluationResult]:
-        review_results: List[EvaluationResult] = []
-        for metric in self.review_metrics:
-            prompt_body = self._fill_template(
-                metric.prompt,
-                baseline=baseline_text,
-                candidate=candidate_text,
-            )
-            if metric.format_hint:
-                prompt_body = f"{prompt_body}\n{metric.format_hint}"
-            messages = [
-                SystemMessage(content=metric.system_prompt or "你是 QA 评审专家，请根据指引返回 JSON。"),
-                HumanMessage(content=prompt_body),
-            ]
-            response = self.llm.invoke(messages).content.strip()
-            parsed = self._parse_json_response(response)
-            # Summary stays descriptive only
-            summary = parsed.get('summary') or response
-
-            # Normalize suggestions structure (array of dicts)
-            raw_suggestions = parsed.get('suggestions') or []
-            if not isinstance(raw_suggestions, list):
-                raw_suggestions = []
-            # Fallback: if model returns 'risks' list, convert to suggestions with default level
-            if not raw_suggestions:
-                risks_data = parsed.get('risks') or []
-                if isinstance(risks_data, list):
-                    raw_suggestions = risks_data
-
-            normalized: List[Dict[str, Any]] = []
-            total_deduction = 0
-
-            for idx, item in enumerate(raw_suggestions, start=1):
-                if not isinstance(item, dict):
-                    # convert plain string to suggestion with default priority
-                    text = str(item).strip()
-                    if not text:
-                        continue
-                    # infer level via LLM; if cannot infer, skip (no default)
-                    inferred_level = self._infer_level(text)
-                    if inferred_level is None:
-                        continue
-                    deduction = 10 - inferred_level
-                    normalized.append({
-                        "id": f"S{idx}",
-                        "text": text,
-                        "priority": f"P{inferred_level}",
-                        "level": inferred_level,
-                        "deduction": deduction,
-                        "category": "general",
-                        "hint": "Level inferred by model",
-                    })
-                    total_deduction += deduction
+    @staticmethod
+    def _reduce_chunk_results(
+        metric: Any,
+        chunks: List[CandidateChunk],
+        chunk_results: List[EvaluationResult],
+    ) -> EvaluationResult:
+        """Merge per-chunk results of one metric.
+
+        Review metrics are scored like full mode, ``100 - total_deduction``,
+        where ``total_deduction`` is the case-weighted mean of the chunk
+        deductions: every chunk review lists its own issues, so summing them
+        would lower the score as the suite is split into more chunks. The
+        de-duplicated suggestions of all chunks are still reported, with
+        their raw sum as ``merged_deduction``. Plain metrics return a single
+        score, so their chunk scores are averaged weighted by case count and
+        no deduction total is reported.
+        """
+
+        merged: List[Dict[str, Any]] = []
+        seen = set()
+        for chunk_index, result in enumerate(chunk_results, start=1):
+            for suggestion in result.suggestions:
+                key = str(suggestion.get('text', '')).strip().lower()
+                if key in seen:
                     continue
+                seen.add(key)
+                merged.append({**suggestion, "id": f"S{len(merged) + 1}", "chunk": chunk_index})
+
+        rationale = "\n".join(
+            f"[{index}/{len(chunks)}] {result.rationale}" for index, result in enumerate(chunk_results, start=1)
+        )
+        penalty_summary: Dict[str, Any] = {
+            "count": len(merged),
+            "chunk_scores": [result.score for result in chunk_results],
+        }
+        if isinstance(metric, ReviewMetricConfig):
+            chunk_deductions = [
+                (
+                    (result.penalty_summary or {}).get(
+                        'total_deduction',
+                        sum(item.get('deduction', 0) for item in result.suggestions),
+                    ),
+                    chunk.cases or 1,
+                )
+                for chunk, result in zip(chunks, chunk_results)
+            ]
+            total_weight = sum(weight for _, weight in chunk_deductions)
+            total_deduction = round(
+                sum(deduction * weight for deduction, weight in chunk_deductions) / total_weight, 2
+            ) if total_weight else 0
+            penalty_summary["total_deduction"] = total_deduction
+            penalty_summary["merged_deduction"] = sum(item.get('deduction', 0) for item in merged)
+            score: Optional[float] = max(0.0, round(100 - total_deduction, 2))
+        else:
+            weighted = [
+                (result.score, chunk.cases or 1)
+                for chunk, result in zip(chunks, chunk_results)
+                if result.score is not None
+            ]
+            total_weight = sum(weight for _, weight in weighted)
+            score = round(sum(value * weight for value, weight in weighted) / total_weight, 2) if weighted else None
+        return EvaluationResult(
+            name=metric.name,
+            score=score,
+            rationale=rationale,
+            suggestions=merged,
+            penalty_summary=penalty_summary,
+            metadata={**(metric.metadata or {}), "chunks": len(chunks)},
+        )
+
+    def _fit_baseline(
+        self,
+        template: str,
+        system_prompt: Optional[str],
+        baseline_text: str,
+        candidate_text: str,
+    ) -> str:
+        """Trim the baseline (at paragraph boundaries) so the prompt fits the model window."""
 
-                # extract fields
-                text = str(item.get('text') or item.get('内容') or '').strip()
-                sid = str(item.get('id') or item.get('编号') or f"S{idx}")
-                priority = str(item.get('priority') or '').strip().upper()
-                level_val = item.get('level')
-                deduction_val = item.get('deduction')
-                category = item.get('category') or 'general'
-                hint = item.get('hint') or ''
-
-                # determine level from priority if missing
-                if level_val is None and priority.startswith('P') and priority[1:].isdigit():
-                    level_val = int(priority[1:])
-
-                # If still missing, infer via LLM; if fail, skip this suggestion
-                if not isinstance(level_val, int):
-                    level_val = self._infer_level(text)
-                    if level_val is None:
-                        continue
-                level_val = max(0, min(9, level_val))
-
-                # ensure priority matches level
-                priority = priority or f"P{level_val}"
-
-                # compute deduction if missing; clamp 0..10
-                if not isinstance(deduction_val, (int, float)):
-                    deduction_val = 10 - level_val
-                deduction_val = max(0, min(10, int(deduction_val)))
+        fixed = self.token_counter.count_messages([system_prompt or "", template, candidate_text])
+        budget = self.token_counter.prompt_budget - fixed
+        if self.token_counter.count(baseline_text) <= budget:
+            return baseline_text
+        return self.token_counter.truncate(baseline_text, budget)
 
+    def _run_structured_review(self, baseline_text: str, candidate_text: str) -> List[EvaluationResult]:
+        return [self._review_metric(metric, baseline_text, candidate_text) for metric in self.review_metrics]
+
+    def _review_metric(
+        self,
+        metric: ReviewMetricConfig,
+        baseline_text: str,
+        candidate_text: str,
+        label: Optional[str] = None,
+        scope_note: str = "",
+    ) -> EvaluationResult:
+        prompt_body = self._fill_template(
+            metric.prompt,
+            baseline=self._fit_baseline(
+                f"{metric.prompt}\n{scope_note}\n{metric.format_hint or ''}",
+                metric.system_prompt,
+                baseline_text,
+                candidate_text,
+            ),
+            candidate=candidate_text,
+        )
+        if scope_note:
+            prompt_body = f"{prompt_body}\n{scope_note}"
+        if metric.format_hint:
+            prompt_body = f"{prompt_body}\n{metric.format_hint}"
+        messages = [
+            SystemMessage(content=metric.system_prompt or "你是 QA 评审专家，请根据指引返回 JSON。"),
+            HumanMessage(content=prompt_body),
+        ]
+        self.token_counter.check((message.content for message in messages), f"Review {label or metric.name}")
+        llm = self.stage_llms.get('review', self.llm)
+        response = llm.invoke(messages, self.tracer.config('review', module=label or metric.name)).content.strip()
+        parsed = self._parse_json_response(response)
+        # Summary stays descriptive only
+        summary = parsed.get('summary') or response
+
+        # Normalize suggestions structure (array of dicts)
+        raw_suggestions = parsed.get('suggestions') or []
+        if not isinstance(raw_suggestions, list):
+            raw_suggestions = []
+        # Fallback: if model returns 'risks' list, convert to suggestions with default level
+        if not raw_suggestions:
+            risks_data = parsed.get('risks') or []
+            if isinstance(risks_data, list):
+                raw_suggestions = risks_data
+
+        normalized: List[Dict[str, Any]] = []
+        total_deduction = 0
+
+        for idx, item in enumerate(raw_suggestions, start=1):
+            if not isinstance(item, dict):
+                # convert plain string to suggestion with default priority
+                text = str(item).strip()
+                if not text:
+                    continue
+                # infer level via LLM; if cannot infer, skip (no default)
+                inferred_level = self._infer_level(text)
+                if inferred_level is None:
+                    continue
+                deduction = 10 - inferred_level
                 normalized.append({
-                    "id": sid,
-                    "text": text or f"Suggestion {sid}",
-                    "priority": priority,
-                    "level": level_val,
-                    "deduction": deduction_val,
-                    "category": category,
-                    "hint": hint,
+                    "id": f"S{idx}",
+                    "text": text,
+                    "priority": f"P{inferred_level}",
+                    "level": inferred_level,
+                    "deduction": deduction,
+                    "category": "general",
+                    "hint": "Level inferred by model",
                 })
-                total_deduction += deduction_val
-
-            # score per metric: 100 - total_deduction (lower bounded at 0)
-            score_metric = max(0.0, float(100 - total_deduction))
-
-            review_results.append(
-                EvaluationResult(
-                    name=metric.name,
-                    score=score_metric,
-                    rationale=summary,
-                    suggestions=normalized,
-                    penalty_summary={
-                        "count": len(normalized),
-                        "total_deduction": total_deduction,
-                    },
-                    metadata=metric.metadata,
-                )
-            )
-        return review_results
+                total_deduction += deduction
+                continue
+
+            # extract fields
+            text = str(item.get('text') or item.get('内容') or '').strip()
+            sid = str(item.get('id') or item.get('编号') or f"S{idx}")
+            priority = str(item.get('priority') or '').strip().upper()
+            level_val = item.get('level')
+            deduction_val = item.get('deduction')
+            category = item.get('category') or 'general'
+            hint = item.get('hint') or ''
+
+            # determine level from priority if missing
+            if level_val is None and priority.startswith('P') and priority[1:].isdigit():
+                level_val = int(priority[1:])
+
+            # If still missing, infer via LLM; if fail, skip this suggestion
+            if not isinstance(level_val, int):
+                level_val = self._infer_level(text)
+                if level_val is None:
+                    continue
+            level_val = max(0, min(9, level_val))
+
+            # ensure priority matches level
+            priority = priority or f"P{level_val}"
+
+            # compute deduction if missing; clamp 0..10
+            if not isinstance(deduction_val, (int, float)):
+                deduction_val = 10 - level_val
+            deduction_val = max(0, min(10, int(deduction_val)))
+
+            normalized.append({
+                "id": sid,
+                "text": text or f"Suggestion {sid}",
+                "priority": priority,
+                "level": level_val,
+                "deduction": deduction_val,
+                "category": category,
+                "hint": hint,
+            })
+            total_deduction += deduction_val
+
+        # score per metric: 100 - total_deduction (lower bounded at 0)
+        score_metric = max(0.0, float(100 - total_deduction))
+
+        return EvaluationResult(
+            name=metric.name,
+            score=score_metric,
+            rationale=summary,
+            suggestions=normalized,
+            penalty_summary={
+                "count": len(normalized),
+                "total_deduction": total_deduction,
+            },
+            metadata=metric.metadata,
+        )
 
     @staticmethod
     def _build_review_configs(configs: List[Dict[str, Any]]) -> List[ReviewMetricConfig]:
@@ -258,7 +579,8 @@ class EvaluationEngine:
                 SystemMessage(content="你是评审专家，只返回JSON"),
                 HumanMessage(content=hint),
             ]
-            resp = self.llm.invoke(messages).content.strip()
+            llm = self.stage_llms.get('infer_level', self.llm)
+            resp = llm.invoke(messages, self.tracer.config('infer_level')).content.strip()
             data = self._parse_json_response(resp)
             lvl = data.get('level')
             if isinstance(lvl, int) and 0 <= lvl <= 9:
@@ -280,6 +602,24 @@ class EvaluationEngine:
             result = result.replace(f'{{{key}}}', str(value))
         return result
 
+    @classmethod
+    def _metric_score(cls, response: str) -> Optional[float]:
+        """Mean of per-case scores when the JSON reply lists them, else its ``score``."""
+
+        parsed = cls._parse_json_response(response)
+        if not isinstance(parsed, dict):
+            return cls._extract_score(response)
+        case_scores = [
+            float(item['score'])
+            for item in parsed.get('cases') or []
+            if isinstance(item, dict) and isinstance(item.get('score'), (int, float)) and 0 <= item['score'] <= 100
+        ]
+        if case_scores:
+            return round(sum(case_scores) / len(case_scores), 2)
+        if isinstance(parsed.get('score'), (int, float)) and 0 <= parsed['score'] <= 100:
+            return float(parsed['score'])
+        return cls._extract_score(response)
+
     @staticmethod
     def _extract_score(response: str) -> Optional[float]:
         try:
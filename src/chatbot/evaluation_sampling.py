@@ -0,0 +1,231 @@
+"""Stratified case sampling and score extrapolation for large test case suites.
+
+Cases are sampled per module (stratum) in proportion to the module size and
+dealt round-robin into a few replicate sub-samples. Each replicate is scored
+independently, so the spread of the replicate scores gives a confidence
+interval for the score of the whole suite (interpenetrating sub-samples).
+
+Only scores that are means over cases can be extrapolated this way, so a
+sample is scored with :func:`case_quality_metric` and metrics declared
+``scope: case``; suite-level metrics such as coverage are left out.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import statistics
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from chatbot.evaluation_engine import CandidateChunk, CandidateModule, EvaluationMetric
+
+DEFAULT_CASE_QUALITY_PROMPT = (
+    "需求（baseline）：\n{baseline}\n\n"
+    "待评审用例：\n{candidate}\n\n"
+    "请逐条评估上述每个用例本身的质量（0-100）：步骤是否清晰可执行、预期结果是否明确可验证、"
+    "是否与需求一致、前置条件与数据是否完整。score 为所有用例得分的算术平均值。\n"
+    '仅返回 JSON {"score":...,"cases":[{"title":"...","score":...,"issue":"..."}],"summary":"..."}。'
+)
+
+
+def case_quality_metric(prompt: Optional[str] = None) -> EvaluationMetric:
+    """Per-case quality metric whose score is the mean case score, used for sampled evaluation."""
+
+    return EvaluationMetric(
+        name="case_quality",
+        prompt=prompt or DEFAULT_CASE_QUALITY_PROMPT,
+        system_prompt="你是 QA 评审专家，逐条评估测试用例质量，请返回 JSON。",
+        metadata={},
+        scope="case",
+    )
+
+
+@dataclass
+class SamplingPlan:
+    """Replicate chunks to score plus the numbers needed to extrapolate."""
+
+    replicates: List[CandidateChunk]
+    population_cases: int
+    sampled_cases: int
+    confidence: float
+    per_module: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {
+            "population_cases": self.population_cases,
+            "sampled_cases": self.sampled_cases,
+            "replicates": len(self.replicates),
+            "confidence": self.confidence,
+            "per_module": self.per_module,
+        }
+
+
+def required_sample_size(population: int, confidence: float = 0.95, margin: float = 0.05) -> int:
+    """Conservative sample size (p = 0.5) with finite population correction."""
+
+    if population <= 0:
+        return 0
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    n0 = (z ** 2) * 0.25 / (margin ** 2)
+    return min(population, math.ceil(n0 / (1 + (n0 - 1) / population)))
+
+
+def _allocate(sizes: List[int], sample_size: int) -> List[int]:
+    """Proportional allocation with at least one case per non-empty stratum."""
+
+    total = sum(sizes)
+    non_empty = sum(1 for size in sizes if size)
+    if sample_size >= total:
+        return list(sizes)
+    if sample_size <= non_empty:
+        # Not enough budget for every stratum: favour the largest modules.
+        order = sorted(range(len(sizes)), key=lambda index: -sizes[index])
+        allocation = [0] * len(sizes)
+        for index in order[:sample_size]:
+            allocation[index] = 1
+        return allocation
+
+    remaining = sample_size - non_empty
+    extra_capacity = [max(0, size - 1) for size in sizes]
+    capacity_total = sum(extra_capacity)
+    quotas = [remaining * capacity / capacity_total if capacity_total else 0.0 for capacity in extra_capacity]
+    allocation = [(1 if size else 0) + int(quota) for size, quota in zip(sizes, quotas)]
+    leftover = sample_size - sum(allocation)
+    by_remainder = sorted(range(len(sizes)), key=lambda index: -(quotas[index] - int(quotas[index])))
+    for index in by_remainder:
+        if leftover <= 0:
+            break
+        if allocation[index] < sizes[index]:
+            allocation[index] += 1
+            leftover -= 1
+    return allocation
+
+
+def plan_stratified_sample(
+    modules: List[CandidateModule],
+    sample_size: int,
+    replicates: int = 4,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+) -> SamplingPlan:
+    """Sample ``sample_size`` cases across modules and split them into replicates.
+
+    At least two replicates are required, since the confidence interval
+    comes from their spread; a sample smaller than ``replicates`` gets
+    one case per replicate.
+    """
+
+    if replicates < 2:
+        raise ValueError(f"replicates must be at least 2 to estimate a confidence interval, got {replicates}")
+    rng = random.Random(seed)
+    sizes = [len(module.cases) for module in modules]
+    allocation = _allocate(sizes, sample_size)
+    sampled = sum(allocation)
+    replicates = max(1, min(replicates, sampled))
+
+    picks: List[Dict[int, List[int]]] = [{} for _ in range(replicates)]
+    per_module: Dict[str, Dict[str, int]] = {}
+    slot = 0
+    for module_index, (module, count) in enumerate(zip(modules, allocation)):
+        per_module[module.name or f"module_{module_index + 1}"] = {"cases": len(module.cases), "sampled": count}
+        chosen = rng.sample(range(len(module.cases)), count) if count else []
+        rng.shuffle(chosen)
+        for case_index in chosen:
+            picks[slot % replicates].setdefault(module_index, []).append(case_index)
+            slot += 1
+
+    chunks = []
+    for pick in picks:
+        parts = [modules[index].render(sorted(cases)) for index, cases in sorted(pick.items())]
+        chunks.append(
+            CandidateChunk(
+                text="\n\n".join(parts),
+                modules=[modules[index].name for index in sorted(pick)],
+                cases=sum(len(cases) for cases in pick.values()),
+            )
+        )
+    return SamplingPlan(
+        replicates=chunks,
+        population_cases=sum(sizes),
+        sampled_cases=sampled,
+        confidence=confidence,
+        per_module=per_module,
+    )
+
+
+# Beyond this many degrees of freedom the Cornish-Fisher expansion is accurate to ~1e-4.
+_EXPANSION_MIN_DF = 30
+
+
+def _t_abs_cdf(t: float, df: int) -> float:
+    """P(|T| < t) for Student's t with integer ``df`` (closed form, Abramowitz & Stegun 26.7.3-4)."""
+
+    theta = math.atan(t / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    if df % 2:
+        if df == 1:
+            return 2 * theta / math.pi
+        term = total = 1.0
+        for k in range(2, df - 1, 2):
+            term *= cos2 * k / (k + 1)
+            total += term
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+    term = total = 1.0
+    for k in range(1, df - 2, 2):
+        term *= cos2 * k / (k + 1)
+        total += term
+    return math.sin(theta) * total
+
+
+def _t_quantile(probability: float, df: int) -> float:
+    """Upper Student-t quantile for ``probability`` > 0.5.
+
+    Small ``df`` are solved exactly from the closed-form CDF; large ``df``
+    use the Cornish-Fisher expansion around the normal quantile.
+    """
+
+    if df < _EXPANSION_MIN_DF:
+        target = 2 * probability - 1
+        low, high = 0.0, 1.0
+        while _t_abs_cdf(high, df) < target:
+            high *= 2
+        for _ in range(200):
+            mid = (low + high) / 2
+            if _t_abs_cdf(mid, df) < target:
+                low = mid
+            else:
+                high = mid
+            if high - low < 1e-10:
+                break
+        return (low + high) / 2
+
+    z = statistics.NormalDist().inv_cdf(probability)
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def score_interval(
+    estimate: Optional[float],
+    replicate_scores: List[Optional[float]],
+    plan: SamplingPlan,
+) -> Dict[str, Any]:
+    """Confidence interval for a suite-level score from its replicate scores."""
+
+    scores = [float(score) for score in replicate_scores if score is not None]
+    interval: Dict[str, Any] = {"estimate": estimate, "replicate_scores": scores, "ci_low": None, "ci_high": None}
+    if estimate is None or len(scores) < 2:
+        return interval
+    fpc = math.sqrt(max(0.0, 1 - plan.sampled_cases / plan.population_cases)) if plan.population_cases else 1.0
+    standard_error = statistics.stdev(scores) / math.sqrt(len(scores)) * fpc
+    half_width = _t_quantile(0.5 + plan.confidence / 2, len(scores) - 1) * standard_error
+    interval.update(
+        ci_low=round(max(0.0, estimate - half_width), 2),
+        ci_high=round(min(100.0, estimate + half_width), 2),
+        margin=round(half_width, 2),
+    )
+    return interval
@@ -0,0 +1,503 @@
+"""On-disk checkpoints for the plan→build test case pipeline."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from chatbot.content_processor import ContentSegment
+
+# Words that appear in almost every plan line and say nothing about the feature.
+_GENERIC_TERMS = {'模块', '功能', '测试', '用例', '场景', '验证', 'module', 'test', 'tests', 'case', 'cases'}
+_HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,6}\s')
+_CJK_RUN = re.compile(r'[\u4e00-\u9fff]+')
+_WORD = re.compile(r'[A-Za-z0-9_]{2,}')
+
+
+def segments_fingerprint(segments: Iterable[ContentSegment]) -> str:
+    """Hash of the loaded documents that a generation run was built from."""
+
+    digest = hashlib.sha256()
+    for segment in segments:
+        digest.update(f"{segment.type}\0{segment.source}\0".encode('utf-8'))
+        digest.update(segment.content.encode('utf-8'))
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def split_chunks(segments: Iterable[ContentSegment]) -> List[Tuple[str, str]]:
+    """Split loaded documents into ``(hash, text)`` chunks for change tracking.
+
+    Chunks follow Markdown headings (or blank-line paragraphs when a segment
+    has no headings), so editing one section only changes that section's hash.
+    """
+
+    chunks: List[Tuple[str, str]] = []
+    for segment in segments:
+        lines = segment.content.splitlines()
+        has_headings = any(_HEADING_PATTERN.match(line) for line in lines)
+        current: List[str] = []
+        blocks: List[str] = []
+        for line in lines:
+            boundary = _HEADING_PATTERN.match(line) if has_headings else not line.strip()
+            if boundary and current:
+                blocks.append("\n".join(current))
+                current = []
+            if has_headings or line.strip():
+                current.append(line)
+        if current:
+            blocks.append("\n".join(current))
+        for block in blocks:
+            text = block.strip()
+            if not text:
+                continue
+            digest = hashlib.sha256(f"{segment.source}\0{text}".encode('utf-8')).hexdigest()
+            chunks.append((digest, text))
+    return chunks
+
+
+def _terms(text: str) -> Set[str]:
+    """Lower-cased words plus CJK character bigrams, minus generic plan words."""
+
+    terms = {word.lower() for word in _WORD.findall(text)}
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.add(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms - _GENERIC_TERMS
+
+
+def map_plans_to_chunks(
+    plans: List[str],
+    chunks: List[Tuple[str, str]],
+    min_overlap: float = 0.5,
+) -> Dict[str, List[str]]:
+    """Chunk hashes each planned module draws on, keyed by 1-based module index.
+
+    A chunk belongs to a module when at least ``min_overlap`` of the terms in
+    the module's name (the text before the first colon) occur in the chunk.
+    """
+
+    chunk_terms = [(digest, _terms(text)) for digest, text in chunks]
+    mapping: Dict[str, List[str]] = {}
+    for index, plan in enumerate(plans, start=1):
+        name = re.split(r'[:：]', plan, maxsplit=1)[0]
+        plan_terms = _terms(name) or _terms(plan)
+        if not plan_terms:
+            mapping[str(index)] = []
+            continue
+        mapping[str(index)] = [
+            digest
+            for digest, terms in chunk_terms
+            if len(plan_terms & terms) / len(plan_terms) >= min_overlap
+        ]
+    return mapping
+
+
+def chunks_in_texts(texts: Iterable[str], chunks: List[Tuple[str, str]], min_line_chars: int = 4) -> List[str]:
+    """Chunk hashes whose lines occur in ``texts`` (e.g. the retrieved context of a module).
+
+    Vector-store chunks and change-tracking chunks are split differently, so
+    a tracked chunk counts as seen when any of its non-trivial lines is part
+    of the given texts.
+    """
+
+    seen_lines = {
+        line.strip()
+        for text in texts
+        for line in text.splitlines()
+        if len(line.strip()) >= min_line_chars
+    }
+    return [
+        digest
+        for digest, text in chunks
+        if any(line.strip() in seen_lines for line in text.splitlines() if len(line.strip()) >= min_line_chars)
+    ]
+
+
+@dataclass
+class IncrementalPlan:
+    """Outcome of comparing a new run against a previous one."""
+
+    base_run_id: str
+    reused: List[int] = field(default_factory=list)
+    rebuild: List[int] = field(default_factory=list)
+    added_chunks: int = 0
+    removed_chunks: int = 0
+    uncovered_chunks: int = 0
+
+
+def _lock_owner(lock_path: Path) -> Optional[int]:
+    try:
+        return int(lock_path.read_text(encoding='utf-8').strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+class GenerationCheckpoint:
+    """Persists planner output and each builder output of one generation run.
+
+    A run lives in ``<root>/<run_id>/`` with a ``manifest.json`` (mode,
+    hashes, plans, status) and one ``modules/NNN.json`` per built module.
+    The run id combines the mode, the document and config hashes and a
+    unique suffix, so concurrent runs on the same inputs never share a
+    directory; resuming with different inputs is rejected by the manifest.
+    While a run is open it holds ``run.lock`` (and an in-process claim), so
+    the same run cannot be resumed by two sessions at once.
+    """
+
+    _active: Set[Path] = set()
+    _active_lock = threading.Lock()
+
+    def __init__(self, run_dir: Path, manifest: Dict[str, Any], chunks: Optional[List[Tuple[str, str]]] = None):
+        self.run_dir = run_dir
+        self.manifest = manifest
+        self.chunks = chunks or []
+        self._locked = False
+
+    @property
+    def run_id(self) -> str:
+        return self.manifest['run_id']
+
+    @staticmethod
+    def make_run_id(mode: str, context_hash: str, config_hash: str) -> str:
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        return f"{mode}_{context_hash[:10]}_{config_hash[:8]}_{stamp}_{uuid.uuid4().hex[:6]}"
+
+    @classmethod
+    def start(
+        cls,
+        root: Path,
+        mode: str,
+        context_hash: str,
+        config_hash: str,
+        chunks: Optional[List[Tuple[str, str]]] = None,
+    ) -> 'GenerationCheckpoint':
+        """Begin a fresh run in a new, uniquely named directory.
+
+        ``chunks`` (from :func:`split_chunks`) are recorded by hash so a later
+        run can tell which parts of the documents changed.
+        """
+
+        run_id = cls.make_run_id(mode, context_hash, config_hash)
+        run_dir = Path(root).expanduser() / run_id
+        (run_dir / 'modules').mkdir(parents=True)
+        checkpoint = cls(
+            run_dir,
+            {
+                "run_id": run_id,
+                "mode": mode,
+                "context_hash": context_hash,
+                "config_hash": config_hash,
+                "created_at": datetime.now().isoformat(),
+                "status": "planning",
+                "plans": None,
+                "chunks": [digest for digest, _ in chunks or []],
+                "module_chunks": {},
+                "output": None,
+            },
+            chunks,
+        )
+        checkpoint._acquire()
+        checkpoint._save_manifest()
+        return checkpoint
+
+    @classmethod
+    def resume(
+        cls,
+        root: Path,
+        run_id: str,
+        mode: str,
+        context_hash: str,
+        config_hash: str,
+        chunks: Optional[List[Tuple[str, str]]] = None,
+    ) -> 'GenerationCheckpoint':
+        run_dir = Path(root).expanduser() / run_id
+        manifest_path = run_dir / 'manifest.json'
+        if not manifest_path.exists():
+            raise ValueError(f"No generation checkpoint found for run '{run_id}' in {run_dir.parent}")
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        expected = {'mode': mode, 'context_hash': context_hash, 'config_hash': config_hash}
+        mismatched = [key for key, value in expected.items() if manifest.get(key) != value]
+        if mismatched:
+            raise ValueError(
+                f"Run '{run_id}' was generated with a different {', '.join(mismatched)}; "
+                "reload the same documents and config or start a new run."
+            )
+        (run_dir / 'modules').mkdir(parents=True, exist_ok=True)
+        checkpoint = cls(run_dir, manifest, chunks)
+        checkpoint._acquire()
+        checkpoint.manifest['status'] = 'resumed'
+        checkpoint.manifest['resumed_at'] = datetime.now().isoformat()
+        checkpoint._save_manifest()
+        return checkpoint
+
+    # ------------------------------------------------------------------
+    # Planner / builder results
+    # ------------------------------------------------------------------
+
+    def load_plans(self) -> Optional[List[str]]:
+        return self.manifest.get('plans')
+
+    def save_plans(self, plans: List[str]) -> None:
+        self.manifest['plans'] = plans
+        if self.chunks:
+            self.manifest['module_chunks'] = map_plans_to_chunks(plans, self.chunks)
+        self.manifest['status'] = 'building'
+        self._save_manifest()
+
+    def load_module(self, index: int, plan: str) -> Optional[str]:
+        """Raw builder output of module ``index`` if it was completed for ``plan``."""
+
+        path = self._module_path(index)
+        if not path.exists():
+            return None
+        try:
+            payload = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            return None
+        if payload.get('plan') != plan:
+            return None
+        return payload.get('raw_output')
+
+    def save_module(
+        self,
+        index: int,
+        plan: str,
+        raw_output: str,
+        context_texts: Optional[List[str]] = None,
+    ) -> None:
+        """Persist a builder output.
+
+        ``context_texts`` are the retrieved chunks the builder saw; the chunks
+        they cover replace the lexical plan mapping of this module, so later
+        incremental runs rebuild it exactly when those chunks change.
+        """
+
+        _write_json_atomic(
+            self._module_path(index),
+            {"index": index, "plan": plan, "raw_output": raw_output, "saved_at": datetime.now().isoformat()},
+        )
+        if context_texts is not None and self.chunks:
+            self.manifest.setdefault('module_chunks', {})[str(index)] = chunks_in_texts(context_texts, self.chunks)
+            self.manifest.setdefault('retrieved_modules', [])
+            if index not in self.manifest['retrieved_modules']:
+                self.manifest['retrieved_modules'].append(index)
+            self._save_manifest()
+
+    def completed_modules(self) -> int:
+        plans = self.load_plans() or []
+        return sum(1 for index, plan in enumerate(plans, start=1) if self.load_module(index, plan) is not None)
+
+    def mark_complete(self, output_path: str) -> None:
+        self.manifest['status'] = 'complete'
+        self.manifest['output'] = output_path
+        self.manifest['completed_at'] = datetime.now().isoformat()
+        self._save_manifest()
+        self.release()
+
+    def release(self) -> None:
+        """Give up the run lock (idempotent); the run can then be resumed elsewhere."""
+
+        if not self._locked:
+            return
+        try:
+            (self.run_dir / 'run.lock').unlink()
+        except OSError:
+            pass
+        with self._active_lock:
+            self._active.discard(self.run_dir.resolve())
+        self._locked = False
+
+    def _acquire(self) -> None:
+        """Claim the run for this session; a lock left by a dead process is taken over.
+
+        ``run.lock`` is created with ``O_CREAT | O_EXCL``, so of several
+        processes opening the same run exactly one wins. A stale lock is
+        unlinked and the exclusive create retried.
+        """
+
+        key = self.run_dir.resolve()
+        lock_path = self.run_dir / 'run.lock'
+        with self._active_lock:
+            if key in self._active:
+                raise ValueError(f"Run '{self.run_id}' is already in use by another session.")
+            for _ in range(3):
+                try:
+                    fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    owner = _lock_owner(lock_path)
+                    if owner is None and lock_path.exists():
+                        # Another process may be between creating and writing the lock.
+                        time.sleep(0.05)
+                        owner = _lock_owner(lock_path)
+                    if owner is not None and owner != os.getpid() and _pid_alive(owner):
+                        raise ValueError(f"Run '{self.run_id}' is already in use by process {owner}.")
+                    # Only remove the lock if it still names the stale owner (not a fresh winner).
+                    if _lock_owner(lock_path) == owner:
+                        try:
+                            lock_path.unlink()
+                        except FileNotFoundError:
+                            pass
+                    continue
+                with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                    handle.write(str(os.getpid()))
+                self._active.add(key)
+                self._locked = True
+                return
+        raise ValueError(f"Run '{self.run_id}' is being claimed by another process; try again.")
+
+    # ------------------------------------------------------------------
+    # Incremental regeneration
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def find_previous(
+        cls,
+        root: Path,
+        mode: str,
+        config_hash: str,
+        run_id: Optional[str] = None,
+    ) -> Optional['GenerationCheckpoint']:
+        """The named run, or the most recent complete run for ``mode`` and ``config_hash``."""
+
+        root = Path(root).expanduser()
+        if run_id:
+            manifest_path = root / run_id / 'manifest.json'
+            if not manifest_path.exists():
+                raise ValueError(f"No generation checkpoint found for run '{run_id}' in {root}")
+            manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            if manifest.get('mode') != mode or manifest.get('config_hash') != config_hash:
+                raise ValueError(f"Run '{run_id}' was generated with a different mode or config.")
+            return cls(manifest_path.parent, manifest)
+
+        latest: Optional[Tuple[str, Path, Dict[str, Any]]] = None
+        for manifest_path in root.glob('*/manifest.json'):
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+            except (OSError, json.JSONDecodeError):
+                continue
+            if (
+                manifest.get('status') != 'complete'
+                or manifest.get('mode') != mode
+                or manifest.get('config_hash') != config_hash
+            ):
+                continue
+            completed_at = manifest.get('completed_at') or ''
+            if latest is None or completed_at > latest[0]:
+                latest = (completed_at, manifest_path.parent, manifest)
+        if latest is None:
+            return None
+        return cls(latest[1], latest[2])
+
+    def seed_from(
+        self,
+        previous: 'GenerationCheckpoint',
+        max_change_ratio: float = 0.5,
+        retrieved_texts: Optional[Dict[int, List[str]]] = None,
+    ) -> Optional[IncrementalPlan]:
+        """Copy the previous run's plans and the modules untouched by document changes.
+
+        The previous run itself is only read, so it stays the latest
+        complete run if this one fails. With unchanged documents every
+        module is reused. Otherwise a module is left for the builder when:
+
+        * it was built from the shared document context (``builder_context:
+          full``): the builder saw the whole document, so any chunk change
+          makes it stale;
+        * it was built from retrieved context and a chunk its builder
+          actually saw was edited or removed, or an added chunk is now
+          retrieved for it (``retrieved_texts``: module index -> chunks
+          retrieved for it now);
+        * it could not be tied to any chunk.
+
+        Returns ``None`` (nothing seeded) when the previous run has no
+        usable plans or chunk hashes, or when more than ``max_change_ratio``
+        of the chunks changed, in which case a full run re-plans from scratch.
+        """
+
+        plans = previous.load_plans()
+        if not plans:
+            return None
+        unchanged = previous.manifest.get('context_hash') == self.manifest.get('context_hash')
+        old_chunks = set(previous.manifest.get('chunks') or [])
+        new_chunks = {digest for digest, _ in self.chunks}
+        added = new_chunks - old_chunks
+        removed = old_chunks - new_chunks
+        if not unchanged:
+            if not old_chunks or not new_chunks:
+                return None
+            if (len(added) + len(removed)) / len(old_chunks | new_chunks) > max_change_ratio:
+                return None
+
+        self.save_plans(plans)
+        self.manifest['base_run_id'] = previous.run_id
+        old_mapping = previous.manifest.get('module_chunks') or {}
+        retrieved_modules = set(previous.manifest.get('retrieved_modules') or [])
+        if unchanged:
+            # Same documents: the chunks each retrieval builder saw are still exact.
+            for index in retrieved_modules:
+                self.manifest['module_chunks'][str(index)] = list(old_mapping.get(str(index)) or [])
+            if retrieved_modules:
+                self.manifest['retrieved_modules'] = sorted(retrieved_modules)
+        else:
+            for index, texts in (retrieved_texts or {}).items():
+                self.manifest['module_chunks'][str(index)] = chunks_in_texts(texts, self.chunks)
+            if retrieved_texts:
+                self.manifest['retrieved_modules'] = sorted(retrieved_texts)
+        self._save_manifest()
+        new_mapping = self.manifest.get('module_chunks') or {}
+        outcome = IncrementalPlan(
+            base_run_id=previous.run_id,
+            added_chunks=len(added),
+            removed_chunks=len(removed),
+            uncovered_chunks=len(added - {digest for digests in new_mapping.values() for digest in digests}),
+        )
+        documents_changed = not unchanged and bool(added or removed)
+        for index, plan in enumerate(plans, start=1):
+            if not documents_changed:
+                stale = False
+            elif index in retrieved_modules:
+                old_used = set(old_mapping.get(str(index)) or [])
+                new_used = set(new_mapping.get(str(index)) or [])
+                stale = bool(old_used & removed or new_used & added) or (not old_used and not new_used)
+            else:
+                stale = True
+            raw_output = None if stale else previous.load_module(index, plan)
+            if raw_output is None:
+                outcome.rebuild.append(index)
+                continue
+            self.save_module(index, plan, raw_output)
+            outcome.reused.append(index)
+        return outcome
+
+    def _module_path(self, index: int) -> Path:
+        return self.run_dir / 'modules' / f"{index:03d}.json"
+
+    def _save_manifest(self) -> None:
+        _write_json_atomic(self.run_dir / 'manifest.json', self.manifest)
@@ -2,8 +2,25 @@
 
 from __future__ import annotations
 
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+def _window(items: Deque[T], begin: int, stop: int) -> List[T]:
+    """Copy ``items[begin:stop]``, walking the deque from whichever end is nearer."""
+
+    size = len(items)
+    if begin >= stop:
+        return []
+    if size - stop < begin:
+        window = list(islice(reversed(items), size - stop, size - begin))
+        window.reverse()
+        return window
+    return list(islice(items, begin, stop))
 
 
 @dataclass
@@ -14,12 +31,84 @@ class EvaluationRecord:
     suggestions: str
 
 
+class ConversationStore:
+    """Single append-only copy of the conversation with incremental views.
+
+    Messages are addressed by an absolute index that keeps growing even when
+    the oldest entries fall out of the retention window, so consumers can
+    track their own cursor instead of copying the history. ``slice`` and the
+    ``limit`` of ``messages``/``pairs`` copy only the requested range, so
+    reading the recent turns costs the same however long the session is.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit if limit and limit > 0 else None
+        self._messages: Deque[Dict[str, str]] = deque(maxlen=self.limit)
+        # Each exchange is two messages; keep only the pairs whose messages are still retained.
+        self._pairs: Deque[Tuple[str, str]] = deque(maxlen=max(1, self.limit // 2) if self.limit else None)
+        self._pending_user: Optional[str] = None
+        self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    @property
+    def total(self) -> int:
+        """Number of messages appended so far (absolute end index)."""
+
+        return self._total
+
+    @property
+    def first_index(self) -> int:
+        """Absolute index of the oldest retained message."""
+
+        return self._total - len(self._messages)
+
+    def append(self, role: str, content: str) -> Dict[str, str]:
+        message = {'role': role, 'content': content}
+        self._messages.append(message)
+        self._total += 1
+
+        if role == 'user':
+            self._pending_user = content
+        elif role == 'assistant' and self._pending_user is not None:
+            self._pairs.append((self._pending_user, content))
+            self._pending_user = None
+        return message
+
+    def messages(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Retained messages, or only the last ``limit`` of them."""
+
+        size = len(self._messages)
+        if limit is None:
+            return list(self._messages)
+        return _window(self._messages, max(0, size - limit), size)
+
+    def slice(self, start: int, end: Optional[int] = None) -> List[Dict[str, str]]:
+        """Return retained messages with absolute indices in ``[start, end)``."""
+
+        offset = self.first_index
+        size = len(self._messages)
+        begin = max(0, start - offset)
+        stop = size if end is None else min(size, end - offset)
+        return _window(self._messages, begin, stop)
+
+    def pairs(self, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Completed (user, assistant) exchanges, oldest first; only the last ``limit`` if given."""
+
+        size = len(self._pairs)
+        if limit is None:
+            return list(self._pairs)
+        return _window(self._pairs, max(0, size - limit), size)
+
+
 class MemoryManager:
     """Stores chat history, document summaries, and evaluation records."""
 
     def __init__(self, chat_history_limit: int = 100):
-        self.chat_history: List[Dict[str, str]] = []
+        self.conversation = ConversationStore(limit=chat_history_limit)
         self.document_summaries: List[str] = []
+        self.generation_notes: List[str] = []
         self.evaluations: List[EvaluationRecord] = []
         self.chat_history_limit = chat_history_limit
 
@@ -27,19 +116,23 @@ class MemoryManager:
     # Chat history helpers
     # ------------------------------------------------------------------
 
+    @property
+    def chat_history(self) -> List[Dict[str, str]]:
+        return self.conversation.messages()
+
     def add_chat_message(self, role: str, content: str) -> None:
-        self.chat_history.append({'role': role, 'content': content})
-        if len(self.chat_history) > self.chat_history_limit:
-            self.chat_history = self.chat_history[-self.chat_history_limit:]
+        self.conversation.append(role, content)
 
     def get_recent_messages(self, limit: int = 10) -> List[Dict[str, str]]:
-        return self.chat_history[-limit:]
+        return self.conversation.messages(limit)
 
     # ------------------------------------------------------------------
     # Document summaries
     # ------------------------------------------------------------------
 
     def add_document_summary(self, summary: str) -> None:
+        if summary in self.document_summaries:
+            return
         self.document_summaries.append(summary)
         if len(self.document_summaries) > 200:
             self.document_summaries = self.document_summaries[-200:]
@@ -49,6 +142,19 @@ class MemoryManager:
             return ""
         return "\n\n".join(self.document_summaries[-20:])
 
+    # ------------------------------------------------------------------
+    # Generation notes (kept apart from document summaries so they never
+    # leak into later generation prompts)
+    # ------------------------------------------------------------------
+
+    def add_generation_note(self, note: str) -> None:
+        self.generation_notes.append(note)
+        if len(self.generation_notes) > 50:
+            self.generation_notes = self.generation_notes[-50:]
+
+    def get_generation_notes(self, limit: int = 10) -> List[str]:
+        return self.generation_notes[-limit:]
+
     # ------------------------------------------------------------------
     # Evaluation records
     # ------------------------------------------------------------------
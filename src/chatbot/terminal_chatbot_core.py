@@ -1,32 +1,81 @@
 """Terminal-focused chatbot core orchestrating LLM, RAG, and external docs."""
 
+import hashlib
 import json
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 from langchain.chains import ConversationChain, ConversationalRetrievalChain
 from langchain.schema import HumanMessage, SystemMessage
 
 from chatbot.chatbot_core import ChatbotCore
 from chatbot.content_processor import ContentProcessor, ContentSegment
+from chatbot.document_summarizer import DocumentSummarizer, DocumentSummary
 from chatbot.memory_manager import MemoryManager
 from chatbot.testcase_generator import (
-    TestcaseDocument,
     TestcaseGenerator,
     TestcaseModeConfig,
 )
-from chatbot.evaluation_engine import EvaluationEngine, EvaluationMetric, EvaluationResult
+from chatbot.generation_checkpoint import GenerationCheckpoint, segments_fingerprint, split_chunks
+from chatbot.testcase_writer import STREAM_FORMATS, TestcaseStreamWriter, create_testcase_writer
+from chatbot.evaluation_engine import (
+    BASELINE_PLACEHOLDER,
+    EvaluationEngine,
+    EvaluationMetric,
+    EvaluationResult,
+    chunk_candidate,
+    parse_candidate_modules,
+)
+from chatbot.evaluation_sampling import (
+    SamplingPlan,
+    case_quality_metric,
+    plan_stratified_sample,
+    required_sample_size,
+    score_interval,
+)
 from utils.image_analyzer import ImageAnalyzer
 from utils.feishu_client import FeishuDocClient
+from utils.http_pool import ConnectionStats
+from utils.llm_tracer import LLMTracer, aggregate_traces
+from utils.model_router import ModelRouter
+from utils.token_counter import TokenCounter
 
 StatusCallback = Callable[[str, str], None]
 
 
+class IngestSequencer:
+    """Lets concurrent ingestions commit their results in a fixed order.
+
+    Processing (file parsing, image analysis, embedding) runs in parallel;
+    only the final update of session state waits for every earlier position
+    to finish, so the result matches running the steps one by one.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._completed = set()
+
+    def wait_for_turn(self, position: int) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: all(index in self._completed for index in range(position)))
+
+    def complete(self, position: int) -> None:
+        with self._condition:
+            self._completed.add(position)
+            self._condition.notify_all()
+
+
 class TerminalChatbotCore:
     """Coordinates document loading and conversations for the CLI."""
 
+    # Default output names claimed by any session of this process (parallel scripts share output dirs).
+    _claimed_output_paths: Set[Path] = set()
+    _output_paths_lock = threading.Lock()
+
     def __init__(
         self,
         api_key: str,
@@ -34,6 +83,9 @@ class TerminalChatbotCore:
         model_name: str = "kimi-k2-turbo-preview",
         status_callback: Optional[StatusCallback] = None,
         history_limit: int = 50,
+        history_token_budget: Optional[int] = None,
+        history_recent_turns: int = 4,
+        history_summary_max_failures: int = 3,
         image_api_key: Optional[str] = None,
         image_base_url: Optional[str] = None,
         image_model_name: Optional[str] = None,
@@ -42,46 +94,93 @@ class TerminalChatbotCore:
         testcase_modes: Optional[Dict[str, Dict[str, Any]]] = None,
         evaluation_metrics: Optional[List[Dict[str, Any]]] = None,
         review_metrics: Optional[List[Dict[str, Any]]] = None,
+        evaluation_config: Optional[Dict[str, Any]] = None,
         testcase_layouts: Optional[Dict[str, Any]] = None,
         default_testcase_format: Optional[str] = None,
         default_testcase_dir: Optional[str] = None,
         evaluation_output_dir: Optional[str] = None,
         latest_testcase_cache: Optional[str] = None,
+        generation_runs_dir: Optional[str] = "./output/runs",
+        generation_config: Optional[Dict[str, Any]] = None,
+        summary_config: Optional[Dict[str, Any]] = None,
+        summary_cache_dir: Optional[str] = "./output/cache/summaries",
         embedding_model_name: Optional[str] = None,
         text_splitter_config: Optional[Dict[str, int]] = None,
+        rag_config: Optional[Dict[str, Any]] = None,
+        token_config: Optional[Dict[str, Any]] = None,
+        trace_log_path: Optional[str] = None,
         config_hash: Optional[str] = None,
         feishu_app_id: Optional[str] = None,
         feishu_app_secret: Optional[str] = None,
         feishu_base_url: str = "https://open.feishu.cn",
+        core: Optional[ChatbotCore] = None,
+        image_analyzer: Optional[ImageAnalyzer] = None,
+        feishu_client: Optional[FeishuDocClient] = None,
+        tracer: Optional[LLMTracer] = None,
+        http_client=None,
+        connection_stats: Optional[ConnectionStats] = None,
+        model_router: Optional[ModelRouter] = None,
     ):
+        """Create a chat session.
+
+        ``core``, ``image_analyzer``, ``feishu_client`` and ``tracer`` may be
+        taken from another session's :meth:`shared_resources` so several
+        sessions reuse the same warm models and clients while keeping their
+        own history, documents and indexes. ``http_client`` (an
+        ``httpx.Client``) carries every chat and vision request, e.g. the
+        shared connection pool or a record/replay cassette;
+        ``connection_stats`` are the counters of that pool. ``model_router``
+        assigns other models or endpoints to individual stages.
+        """
         self.logger = logging.getLogger(__name__)
         self._status_callback = status_callback
         self.history_limit = history_limit
         self.system_prompt = system_prompt
-
-        self.core = ChatbotCore(
-            api_key=api_key,
-            base_url=base_url,
-            model_name=model_name,
-            embedding_model_name=embedding_model_name,
-            text_splitter_config=text_splitter_config,
-        )
-        self.core.initialize_models()
+        self.tracer = tracer or (core.tracer if core else LLMTracer(trace_log_path))
+        self.connection_stats = connection_stats
+
+        if core is None:
+            core = ChatbotCore(
+                api_key=api_key,
+                base_url=base_url,
+                model_name=model_name,
+                embedding_model_name=embedding_model_name,
+                text_splitter_config=text_splitter_config,
+                rag_config=rag_config,
+                tracer=self.tracer,
+                http_client=http_client,
+                token_config=token_config,
+                model_router=model_router,
+            )
+            core.initialize_models()
+        self.core = core
         self.llm = self.core.get_llm()
+        self.token_counter = self._warning_counter(self.core.token_counter)
 
-        self.base_chain: ConversationChain = self.core.create_conversation_chain(system_prompt=self.system_prompt)
         self.vector_store = None
         self.rag_chain: Optional[ConversationalRetrievalChain] = None
 
-        analyzer = None
-        if image_api_key and image_model_name:
+        analyzer = image_analyzer
+        if analyzer is None and image_api_key and image_model_name:
             analyzer = ImageAnalyzer(
                 api_key=image_api_key,
                 base_url=image_base_url or base_url,
                 model_name=image_model_name,
+                tracer=self.tracer,
+                http_client=http_client,
+                model_router=model_router,
             )
+        self.image_analyzer = analyzer
 
         self.memory = MemoryManager(chat_history_limit=history_limit)
+        self.conversation = self.memory.conversation
+        self.base_chain: ConversationChain = self.core.create_conversation_chain(
+            system_prompt=self.system_prompt,
+            history_token_budget=history_token_budget,
+            history_recent_turns=history_recent_turns,
+            history_summary_max_failures=history_summary_max_failures,
+            store=self.conversation,
+        )
 
         self.content_processor = ContentProcessor(
             image_analyzer=analyzer,
@@ -95,32 +194,88 @@ class TerminalChatbotCore:
         self.evaluation_output_dir = Path(evaluation_output_dir or './output/evaluations').expanduser()
         self.latest_testcase_cache_path = Path(latest_testcase_cache or './output/latest_testcase.json').expanduser()
         self.latest_testcase_path: Optional[str] = self._load_latest_testcase_cache()
+        self.generation_runs_dir = Path(generation_runs_dir).expanduser() if generation_runs_dir else None
+        generation_config = generation_config or {}
+        self.incremental_generation = bool(generation_config.get('incremental', False))
+        self.incremental_max_change_ratio = float(generation_config.get('max_change_ratio', 0.5))
 
+        self.document_summarizer = DocumentSummarizer.from_config(
+            self.llm,
+            summary_config,
+            tracer=self.tracer,
+            cache_dir=summary_cache_dir,
+        )
         self.testcase_generator = TestcaseGenerator(
             self.llm,
             self.memory,
             layout_config=self.testcase_layouts,
+            tracer=self.tracer,
+            token_counter=self.token_counter,
+            stage_llms={stage: self.core.get_llm(stage) for stage in ('planner', 'builder')},
+            stage_token_counters={
+                stage: self._warning_counter(self.core.get_token_counter(stage)) for stage in ('planner', 'builder')
+            },
         )
+        evaluation_config = evaluation_config or {}
+        self.evaluation_strategy = str(evaluation_config.get('strategy', 'auto')).lower()
+        self.evaluation_chunk_chars = int(evaluation_config.get('chunk_chars', 12000))
+        self.evaluation_sampling = dict(evaluation_config.get('sampling') or {})
         self.evaluation_engine = EvaluationEngine(
             self.llm,
             self.memory,
             review_metrics=review_metrics or [],
+            tracer=self.tracer,
+            max_workers=int(evaluation_config.get('max_workers', 4)),
+            # Metric and review prompts are all sent to the review route.
+            token_counter=self._warning_counter(self.core.get_token_counter('review')),
+            stage_llms={stage: self.core.get_llm(stage) for stage in ('review', 'infer_level')},
         )
 
-        self.feishu_client: Optional[FeishuDocClient] = None
-        if feishu_app_id and feishu_app_secret:
+        self.feishu_client: Optional[FeishuDocClient] = feishu_client
+        if self.feishu_client is None and feishu_app_id and feishu_app_secret:
             self.feishu_client = FeishuDocClient(
                 app_id=feishu_app_id,
                 app_secret=feishu_app_secret,
                 base_url=feishu_base_url,
             )
 
-        self.conversation_history: List[Dict[str, str]] = []
         self.loaded_segments: List[ContentSegment] = []
+        self.document_summaries: List[Optional[DocumentSummary]] = []  # aligned with loaded_segments
+        self._segment_hashes: Set[str] = set()  # content hashes of ingested (or in-flight) segments
+        self._state_lock = threading.Lock()
+        self._ingest_ticket = threading.local()
         self.testcase_modes = testcase_modes or {}
         self.evaluation_metrics = evaluation_metrics or []
         self.config_hash = config_hash or "unknown"
 
+    def _warning_counter(self, counter: TokenCounter) -> TokenCounter:
+        return counter.with_warning(lambda message: self._notify('warning', message))
+
+    def shared_resources(self) -> Dict[str, Any]:
+        """Warm, session-independent components that other sessions can reuse."""
+
+        return {
+            'core': self.core,
+            'image_analyzer': self.image_analyzer,
+            'feishu_client': self.feishu_client,
+            'tracer': self.tracer,
+            'connection_stats': self.connection_stats,
+        }
+
+    def new_ingest_sequencer(self) -> IngestSequencer:
+        return IngestSequencer()
+
+    @contextmanager
+    def ingest_slot(self, sequencer: IngestSequencer, position: int):
+        """Run ingestion on this thread as step ``position`` of an ordered batch."""
+
+        self._ingest_ticket.value = (sequencer, position)
+        try:
+            yield
+        finally:
+            self._ingest_ticket.value = None
+            sequencer.complete(position)
+
     def ingest_local_files(self, file_paths: Sequence[str]) -> int:
         """Ingest local files and rebuild the retriever."""
 
@@ -166,27 +321,50 @@ class TerminalChatbotCore:
     def ask(self, prompt: str, stream_handler=None, use_rag: Optional[bool] = None) -> str:
         """Generate a response, optionally using the RAG chain."""
 
-        self._append_history('user', prompt)
         chain, payload = self._select_chain(prompt, use_rag)
-        config = {'callbacks': [stream_handler]} if stream_handler else None
+        config = self.tracer.config('ask', callbacks=[stream_handler] if stream_handler else None)
 
+        # The chains read history from the shared store, so the prompt is only
+        # recorded once the chain has consumed the previous turns.
         try:
             if config:
                 result = chain.invoke(payload, config)
             else:
                 result = chain.invoke(payload)
         except Exception as exc:  # pragma: no cover
+            self._append_history('user', prompt)
             self._notify('error', f"Failed to generate response: {exc}")
             raise
 
         response = self._extract_response(chain, result)
+        self._report_rag_timings(result)
+        self._append_history('user', prompt)
         self._append_history('assistant', response)
         return response
 
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        return self.conversation.messages()
+
     def get_conversation_history(self) -> List[Dict[str, str]]:
         """Return recent messages for display/saving."""
 
-        return list(self.conversation_history)
+        return self.conversation.messages()
+
+    def get_trace_stats(self, session_only: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Aggregate traced LLM calls into per-stage latency and token statistics."""
+
+        return aggregate_traces(self.tracer.load(session_only=session_only))
+
+    def get_connection_stats(self) -> Optional[Dict[str, Any]]:
+        """Request and connection-reuse counters of the shared HTTP pool."""
+
+        return self.connection_stats.snapshot() if self.connection_stats else None
+
+    def close(self) -> None:
+        """Stop the background workers of this session (history summarization)."""
+
+        self.base_chain.close()
 
     def reset_vector_store(self) -> None:
         """Clear loaded documents and retriever."""
@@ -217,38 +395,74 @@ class TerminalChatbotCore:
     def _extract_response(chain: ConversationChain, result: Dict[str, str]) -> str:
         """Normalize chain outputs to a plain string."""
 
-        if isinstance(chain, ConversationalRetrievalChain):
+        if isinstance(chain, ConversationalRetrievalChain) or 'answer' in result:
             return result.get('answer') or result.get('result', '')
         return result.get('response', '') or ''
 
+    def _report_rag_timings(self, result: Dict[str, Any]) -> None:
+        """Report per-turn RAG latency so condense strategies can be compared."""
+
+        timings = result.get('timings') if isinstance(result, dict) else None
+        if not timings:
+            return
+        condensed = "llm-condensed" if result.get('condensed') else "no condense"
+        self._notify(
+            'info',
+            f"RAG[{result.get('strategy')}, {condensed}] "
+            f"condense {timings.get('condense', 0):.2f}s · retrieve {timings.get('retrieve', 0):.2f}s · "
+            f"answer {timings.get('answer', 0):.2f}s · total {timings.get('total', 0):.2f}s",
+        )
+
     def _append_history(self, role: str, content: str) -> None:
-        """Append a message to the local history buffer."""
+        """Append a message to the shared conversation store."""
 
-        self.conversation_history.append({'role': role, 'content': content})
         self.memory.add_chat_message(role, content)
-        if len(self.conversation_history) > self.history_limit:
-            self.conversation_history = self.conversation_history[-self.history_limit:]
 
     def _build_rag_history(self) -> List[tuple]:
-        """Create chat history tuples for ConversationalRetrievalChain."""
-
-        history: List[tuple] = []
-        last_user: Optional[str] = None
+        """Chat history tuples for ConversationalRetrievalChain (maintained incrementally)."""
 
-        for message in self.conversation_history:
-            if message['role'] == 'user':
-                last_user = message['content']
-            elif message['role'] == 'assistant' and last_user is not None:
-                history.append((last_user, message['content']))
-                last_user = None
-
-        return history[-self.history_limit:]
+        return self.conversation.pairs(self.history_limit)
 
     def _ingest_segments(self, documents: List[ContentSegment]) -> int:
         if not documents:
             self._notify('warning', "No documents were processed.")
             return 0
 
+        # Re-reading a document must not add its chunks to the store a second time.
+        fresh, reserved = self._reserve_new_segments(documents)
+        skipped = len(documents) - len(fresh)
+        if skipped:
+            self._notify('info', f"Skipped {skipped} already loaded document(s).")
+        if not fresh:
+            return skipped
+        count = 0
+        try:
+            count = self._index_segments(fresh)
+        finally:
+            if not count:
+                self._release_segment_hashes(reserved)
+        return count + skipped if count else 0
+
+    def _reserve_new_segments(self, documents: List[ContentSegment]) -> Tuple[List[ContentSegment], List[str]]:
+        """Drop segments whose content is already loaded; claim the rest before embedding."""
+
+        fresh: List[ContentSegment] = []
+        reserved: List[str] = []
+        with self._state_lock:
+            for segment in documents:
+                digest = hashlib.sha256(segment.content.encode('utf-8')).hexdigest()
+                if digest in self._segment_hashes:
+                    continue
+                self._segment_hashes.add(digest)
+                reserved.append(digest)
+                fresh.append(segment)
+        return fresh, reserved
+
+    def _release_segment_hashes(self, reserved: List[str]) -> None:
+        with self._state_lock:
+            self._segment_hashes.difference_update(reserved)
+
+    def _index_segments(self, documents: List[ContentSegment]) -> int:
         vector_store_documents = [
             {
                 'content': segment.content,
@@ -263,15 +477,53 @@ class TerminalChatbotCore:
             self._notify('warning', "Unable to build vector store from documents.")
             return 0
 
-        self.vector_store = vector_store
-        self.loaded_segments.extend(documents)
-        for segment in documents:
-            snippet = segment.content[:500]
-            self.memory.add_document_summary(f"{segment.source}: {snippet}")
-        self.rag_chain = self.core.create_conversation_chain(vector_store, system_prompt=self.system_prompt)
+        summaries = [self._summarize_segment(segment) for segment in documents]
+
+        ticket = getattr(self._ingest_ticket, 'value', None)
+        if ticket:
+            ticket[0].wait_for_turn(ticket[1])
+        with self._state_lock:
+            # Accumulate every ingested document so retrieval covers all loaded sources.
+            if self.vector_store is None:
+                self.vector_store = vector_store
+            else:
+                self.vector_store.merge_from(vector_store)
+            self.loaded_segments.extend(documents)
+            self.document_summaries.extend(summaries)
+            for segment in documents:
+                snippet = segment.content[:500]
+                self.memory.add_document_summary(f"{segment.source}: {snippet}")
+            self.rag_chain = self.core.create_conversation_chain(self.vector_store, system_prompt=self.system_prompt)
+        if ticket:
+            ticket[0].complete(ticket[1])
         self._notify('success', f"Indexed {len(documents)} document(s).")
         return len(documents)
 
+    def _summarize_segment(self, segment: ContentSegment) -> Optional[DocumentSummary]:
+        if self.document_summarizer is None:
+            return None
+        try:
+            summary = self.document_summarizer.summarize(segment)
+        except Exception as exc:
+            self._notify('warning', f"Failed to summarize {segment.source}: {exc}")
+            return None
+        if summary is not None:
+            self._notify('info', f"Summarized {segment.source} into {len(summary.sections)} section(s).")
+        return summary
+
+    def _planner_overview(self) -> Optional[str]:
+        """Full-coverage planner input: summaries of long documents, short ones verbatim."""
+
+        if not any(self.document_summaries):
+            return None
+        parts = []
+        for segment, summary in zip(self.loaded_segments, self.document_summaries):
+            if summary is not None:
+                parts.append(summary.render())
+            else:
+                parts.append(f"### {segment.type}:{segment.source}\n{segment.content}")
+        return "\n\n".join(parts)
+
     # ------------------------------------------------------------------
     # Testcase generation & evaluation
     # ------------------------------------------------------------------
@@ -283,15 +535,71 @@ class TerminalChatbotCore:
         output_format: Optional[str] = None,
         show_thoughts: bool = False,
         show_plan_summary: bool = False,
+        resume: Optional[str] = None,
+        incremental: Optional[bool] = None,
+        base_run: Optional[str] = None,
     ) -> Tuple[str, Optional[List[str]], Optional[List[Dict[str, Any]]]]:
+        """Generate test cases, checkpointing every planner and builder result.
+
+        ``resume`` names an earlier run whose completed modules are reused.
+        With ``incremental`` (or an explicit ``base_run``) only the modules
+        affected by document changes since that run (by default the latest
+        complete run of the same mode and config) are rebuilt.
+        """
         if not self.testcase_modes:
             raise ValueError("No testcase_modes configured in config.yaml")
 
         mode_conf = self._resolve_mode_config(mode)
-        document = self.testcase_generator.generate(self.loaded_segments, mode_conf)
         final_format = (output_format or self.default_testcase_format).lower()
-        serialized, suffix = self._render_testcase_document(document, mode, final_format)
-        output = self._write_output('testcases', output_path, serialized, suffix=suffix)
+        if incremental is None:
+            incremental = self.incremental_generation
+        checkpoint = self._open_generation_checkpoint(
+            mode,
+            resume,
+            incremental=bool(incremental or base_run),
+            base_run=base_run,
+            mode_conf=mode_conf,
+        )
+        try:
+            writer = self._open_testcase_writer(mode, mode_conf, final_format, output_path)
+        except Exception:
+            if checkpoint:
+                checkpoint.release()
+            raise
+        output = str(writer.path)
+        self._notify('info', f"Writing test cases to {output} as modules complete...")
+
+        def _on_module(index: int, module) -> None:
+            writer.write_module(index, module)
+            self._notify('info', f"Module {index} ready: {module.name}")
+
+        try:
+            document = self.testcase_generator.generate(
+                self.loaded_segments,
+                mode_conf,
+                on_module=_on_module,
+                checkpoint=checkpoint,
+                vector_store=self.vector_store,
+                planner_context=self._planner_overview(),
+            )
+        except Exception:
+            writer.abort()
+            if writer.modules_written:
+                self._notify('warning', f"Generation stopped; {writer.modules_written} module(s) kept in {output}")
+            if checkpoint:
+                self._notify(
+                    'warning',
+                    f"Continue later with /generate_cases mode={mode} resume={checkpoint.run_id}",
+                )
+                checkpoint.release()
+            raise
+        try:
+            writer.close(document.planner_notes, document.plan_summary)
+            if checkpoint:
+                checkpoint.mark_complete(output)
+        finally:
+            if checkpoint:
+                checkpoint.release()
         self._notify('success', f"Generated test cases saved to {output}")
         self._update_latest_testcase_cache(output)
         plan_notes = document.planner_notes if show_thoughts else None
@@ -307,12 +615,24 @@ class TerminalChatbotCore:
         baseline_path: Optional[str] = None,
         candidate_path: Optional[str] = None,
         output_path: Optional[str] = None,
+        strategy: Optional[str] = None,
+        sample_size: Optional[int] = None,
+        confidence: Optional[float] = None,
     ) -> str:
+        """Evaluate a generated suite and write the JSON report.
+
+        ``strategy`` is ``full`` (whole suite in every prompt), ``map_reduce``
+        (score module chunks concurrently and merge), ``sample`` (score a
+        stratified sample of cases and extrapolate with confidence intervals)
+        or ``auto`` (map-reduce once the candidate exceeds
+        ``evaluation.chunk_chars``). ``sample_size`` and ``confidence``
+        override ``evaluation.sampling``.
+        """
 
         baseline_text = self._load_input_text(
             baseline_path,
             role='baseline',
-            fallback_text="[baseline placeholder] 未提供基线内容，将直接依据候选用例进行评审。",
+            fallback_text=BASELINE_PLACEHOLDER,
         )
         candidate_source = candidate_path or self.latest_testcase_path
         candidate_text = self._load_input_text(
@@ -323,12 +643,102 @@ class TerminalChatbotCore:
 
         metrics = self._build_metric_configs()
         placeholder = self._calculate_case_health(candidate_text)
-        results = self.evaluation_engine.evaluate(baseline_text, candidate_text, metrics, placeholder)
-        report_text = self._format_evaluation_report_json(results)
+        strategy = (strategy or self.evaluation_strategy).lower()
+        if strategy not in {'auto', 'full', 'map_reduce', 'sample'}:
+            raise ValueError(f"Unknown evaluation strategy: {strategy}")
+
+        sampling = None
+        if strategy == 'sample':
+            sampling = self._plan_evaluation_sample(candidate_text, sample_size, confidence)
+            strategy = 'auto' if sampling is None else strategy
+        if sampling is not None:
+            # Only means over cases extrapolate from a sample; suite-level metrics are skipped.
+            chunks = sampling.replicates
+            case_metrics = [
+                case_quality_metric(self.evaluation_sampling.get('case_prompt')),
+                *(metric for metric in metrics if metric.scope == 'case'),
+            ]
+            skipped = [
+                *(metric.name for metric in self.evaluation_engine.review_metrics),
+                *(metric.name for metric in metrics if metric.scope != 'case'),
+            ]
+            results = self.evaluation_engine.evaluate_sample(baseline_text, chunks, case_metrics)
+        else:
+            chunks = self._plan_evaluation_chunks(candidate_text, strategy)
+            results = self.evaluation_engine.evaluate(baseline_text, candidate_text, metrics, placeholder, chunks=chunks)
+        evaluation_metadata: Dict[str, Any] = {
+            "strategy": 'sample' if sampling else ("map_reduce" if chunks else "full"),
+            "chunks": len(chunks) if chunks else 1,
+        }
+        if sampling is not None:
+            evaluation_metadata['sampling'] = {
+                **sampling.as_metadata(),
+                "scores": {
+                    record.name: score_interval(record.score, record.penalty_summary.get('chunk_scores') or [], sampling)
+                    for record in results
+                },
+                "skipped_metrics": {
+                    name: "suite-level metric; not extrapolable from a sample (use strategy=full or map_reduce)"
+                    for name in skipped
+                },
+            }
+            if skipped:
+                self._notify('warning', f"Sampled evaluation skips suite-level metric(s): {', '.join(skipped)}")
+        report_text = self._format_evaluation_report_json(results, evaluation_metadata)
         output = self._write_output('evaluations', output_path, report_text, suffix='report.json')
         self._notify('success', f"Evaluation report saved to {output}")
         return output
 
+    def _plan_evaluation_chunks(self, candidate_text: str, strategy: str):
+        """Module chunks for map-reduce evaluation, or ``None`` to score the suite whole."""
+
+        if strategy == 'full':
+            return None
+        counter = self.evaluation_engine.token_counter
+        fits_window = counter.count(candidate_text) <= counter.prompt_budget // 2
+        if strategy == 'auto' and len(candidate_text) <= self.evaluation_chunk_chars and fits_window:
+            return None
+        modules = parse_candidate_modules(candidate_text)
+        chunks = chunk_candidate(modules, self.evaluation_chunk_chars)
+        if len(chunks) < 2:
+            return None
+        self._notify('info', f"Evaluating {len(modules)} module(s) in {len(chunks)} chunk(s)...")
+        return chunks
+
+    def _plan_evaluation_sample(
+        self,
+        candidate_text: str,
+        sample_size: Optional[int],
+        confidence: Optional[float],
+    ) -> Optional[SamplingPlan]:
+        """Stratified sample of the candidate's cases, or ``None`` when sampling saves nothing."""
+
+        settings = self.evaluation_sampling
+        confidence = float(confidence or settings.get('confidence', 0.95))
+        if not 0 < confidence < 1:
+            raise ValueError(f"confidence must be between 0 and 1, got {confidence}")
+        modules = parse_candidate_modules(candidate_text)
+        population = sum(len(module.cases) for module in modules)
+        size = int(sample_size or settings.get('sample_size') or 0)
+        if size <= 0:
+            size = required_sample_size(population, confidence, float(settings.get('margin', 0.05)))
+        if population == 0 or size >= population:
+            self._notify('info', f"Sampling would cover all {population} case(s); evaluating the full suite.")
+            return None
+        plan = plan_stratified_sample(
+            modules,
+            size,
+            replicates=int(settings.get('replicates', 4)),
+            confidence=confidence,
+            seed=settings.get('seed'),
+        )
+        self._notify(
+            'info',
+            f"Evaluating a stratified sample of {plan.sampled_cases}/{population} case(s) "
+            f"across {len(modules)} module(s) in {len(plan.replicates)} replicate(s)...",
+        )
+        return plan
+
     def _resolve_mode_config(self, mode: str) -> TestcaseModeConfig:
         raw = self.testcase_modes.get(mode) or self.testcase_modes.get('default')
         if not raw:
@@ -346,9 +756,14 @@ class TerminalChatbotCore:
             planner_prompt=planner_prompt or '请列出需要覆盖的模块。',
             builder_prompt=builder_prompt,
             system_prompt=raw.get('system_prompt'),
-            context_limit=int(raw.get('context_limit', 20000)),
+            # context_limit is the pre-token-budget name of this setting.
+            context_tokens=int(raw.get('context_tokens') or raw.get('context_limit', 12000)),
             metadata=metadata,
             layout=layout_key or 'detailed',
+            builder_context=str(raw.get('builder_context', 'full')).lower(),
+            retrieval_top_k=int(raw.get('retrieval_top_k', 6)),
+            builder_context_tokens=int(raw.get('builder_context_tokens', 4000)),
+            max_modules=int(raw.get('max_modules') or 0),
         )
 
     def _build_metric_configs(self) -> List[EvaluationMetric]:
@@ -363,15 +778,21 @@ class TerminalChatbotCore:
                     prompt=prompt,
                     system_prompt=raw.get('system_prompt'),
                     metadata=raw.get('metadata', {}),
+                    scope=str(raw.get('scope', 'suite')).lower(),
                 )
             )
         return metrics
 
-    def _format_evaluation_report_json(self, results: List[EvaluationResult]) -> str:
+    def _format_evaluation_report_json(
+        self,
+        results: List[EvaluationResult],
+        evaluation_metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
         payload = {
             "metadata": {
                 "generated_at": datetime.utcnow().isoformat(),
                 "config_hash": self.config_hash,
+                "evaluation": evaluation_metadata or {},
             },
             "results": [],
         }
@@ -389,6 +810,11 @@ class TerminalChatbotCore:
         return json.dumps(payload, ensure_ascii=False, indent=2)
 
     def _write_output(self, subdir: str, desired_path: Optional[str], content: str, suffix: str) -> str:
+        path = self._resolve_output_path(subdir, desired_path, suffix)
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def _resolve_output_path(self, subdir: str, desired_path: Optional[str], suffix: str) -> Path:
         if subdir == 'testcases':
             base_dir = self.testcase_output_dir
         elif subdir == 'evaluations':
@@ -404,10 +830,22 @@ class TerminalChatbotCore:
             path.parent.mkdir(parents=True, exist_ok=True)
         else:
             timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            path = base_dir / f'{timestamp}_{suffix}'
-
-        path.write_text(content, encoding='utf-8')
-        return str(path)
+            path = self._claim_output_path(base_dir, f'{timestamp}_{suffix}')
+        return path
+
+    @classmethod
+    def _claim_output_path(cls, base_dir: Path, name: str) -> Path:
+        """Reserve ``base_dir/name`` for this process, adding ``-N`` when parallel sessions collide."""
+
+        stem, dot, extension = name.partition('.')
+        with cls._output_paths_lock:
+            path = base_dir / name
+            attempt = 1
+            while path in cls._claimed_output_paths or path.exists():
+                path = base_dir / f"{stem}-{attempt}{dot}{extension}"
+                attempt += 1
+            cls._claimed_output_paths.add(path)
+        return path
 
     def _load_latest_testcase_cache(self) -> Optional[str]:
         path = getattr(self, 'latest_testcase_cache_path', None)
@@ -432,31 +870,125 @@ class TerminalChatbotCore:
         except OSError as exc:
             self._notify('warning', f"Failed to persist latest testcase cache: {exc}")
 
-    def _render_testcase_document(self, document: TestcaseDocument, mode: str, output_format: str) -> Tuple[str, str]:
-        """Render testcase document into the desired format."""
+    def _open_generation_checkpoint(
+        self,
+        mode: str,
+        resume: Optional[str],
+        incremental: bool = False,
+        base_run: Optional[str] = None,
+        mode_conf: Optional[TestcaseModeConfig] = None,
+    ) -> Optional[GenerationCheckpoint]:
+        """Start (or resume) the checkpoint of a generation run; ``None`` when disabled."""
+
+        if self.generation_runs_dir is None:
+            if resume or base_run:
+                raise ValueError("Generation checkpoints are disabled (paths.generation_runs is empty).")
+            if incremental:
+                self._notify('warning', "Incremental generation needs paths.generation_runs; running a full generation.")
+            return None
 
-        normalized = (output_format or 'markdown').lower()
-        generated_at = datetime.utcnow().isoformat()
+        context_hash = segments_fingerprint(self.loaded_segments)
+        chunks = split_chunks(self.loaded_segments)
+        previous = None
+        unchanged = False
+        if incremental and not resume:
+            previous = GenerationCheckpoint.find_previous(self.generation_runs_dir, mode, self.config_hash, base_run)
+            if previous is None:
+                self._notify('info', f"No earlier complete run for mode {mode}; running a full generation.")
+            elif previous.manifest.get('context_hash') == context_hash:
+                # Seed a new run rather than reopening the previous one, so it stays the last good run.
+                unchanged = True
+                self._notify('info', f"Documents unchanged since run {previous.run_id}; reusing all of its modules.")
+
+        if resume:
+            checkpoint = GenerationCheckpoint.resume(
+                self.generation_runs_dir,
+                resume,
+                mode,
+                context_hash,
+                self.config_hash,
+                chunks,
+            )
+            plans = checkpoint.load_plans() or []
+            self._notify(
+                'info',
+                f"Resuming run {checkpoint.run_id}: {checkpoint.completed_modules()}/{len(plans)} module(s) already built.",
+            )
+            return checkpoint
+
+        checkpoint = GenerationCheckpoint.start(self.generation_runs_dir, mode, context_hash, self.config_hash, chunks)
+        self._notify('info', f"Generation run {checkpoint.run_id} (checkpoints in {checkpoint.run_dir})")
+        if previous is not None:
+            outcome = checkpoint.seed_from(
+                previous,
+                self.incremental_max_change_ratio,
+                retrieved_texts=None if unchanged else self._retrieved_texts(previous, mode_conf),
+            )
+            if outcome is None:
+                self._notify('info', f"Too much changed since run {previous.run_id} to reuse it; running a full generation.")
+            else:
+                self._notify(
+                    'info',
+                    f"Incremental run based on {outcome.base_run_id}: {outcome.added_chunks} chunk(s) added, "
+                    f"{outcome.removed_chunks} removed; rebuilding {len(outcome.rebuild)} module(s), "
+                    f"reusing {len(outcome.reused)}.",
+                )
+                if outcome.uncovered_chunks:
+                    self._notify(
+                        'warning',
+                        f"{outcome.uncovered_chunks} new chunk(s) match no planned module; "
+                        f"run /generate_cases mode={mode} incremental=false to re-plan.",
+                    )
+        return checkpoint
+
+    def _retrieved_texts(
+        self,
+        previous: GenerationCheckpoint,
+        mode_conf: Optional[TestcaseModeConfig],
+    ) -> Optional[Dict[int, List[str]]]:
+        """What each retrieval-built module of ``previous`` would be given now, by module index."""
+
+        retrieved_modules = previous.manifest.get('retrieved_modules') or []
+        if not retrieved_modules or mode_conf is None or mode_conf.builder_context != 'retrieval':
+            return None
+        if self.vector_store is None:
+            return None
+        plans = previous.load_plans() or []
+        texts: Dict[int, List[str]] = {}
+        for index in retrieved_modules:
+            if 1 <= index <= len(plans):
+                selected = self.testcase_generator.retrieve_module_chunks(self.vector_store, plans[index - 1], mode_conf)
+                texts[index] = [content for _, _, content in selected]
+        return texts
+
+    def _open_testcase_writer(
+        self,
+        mode: str,
+        mode_conf: TestcaseModeConfig,
+        output_format: str,
+        output_path: Optional[str],
+    ) -> TestcaseStreamWriter:
+        """Create and open the incremental writer for one generation run."""
+
+        normalized = 'markdown' if output_format == 'md' else output_format
+        if normalized not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported testcase output format: {output_format}")
         metadata = {
-            "generated_at": generated_at,
+            "generated_at": datetime.utcnow().isoformat(),
             "config_hash": self.config_hash,
             "mode": mode,
         }
-
-        if normalized in {'md', 'markdown'}:
-            header = (
-                f"> generated_at: {generated_at}\n"
-                f"> config_hash: {self.config_hash}\n"
-            )
-            body = document.to_markdown(self.testcase_generator.layouts)
-            return header + "\n" + body, f'{mode}.md'
-        if normalized == 'json':
-            payload = {
-                "metadata": metadata,
-                "document": document.to_dict(),
-            }
-            return json.dumps(payload, ensure_ascii=False, indent=2), f'{mode}.json'
-        raise ValueError(f"Unsupported testcase output format: {output_format}")
+        suffix = {'markdown': 'md'}.get(normalized, normalized)
+        path = self._resolve_output_path('testcases', output_path, f'{mode}.{suffix}')
+        writer = create_testcase_writer(
+            normalized,
+            path,
+            mode,
+            metadata,
+            mode_conf.metadata,
+            layouts=self.testcase_generator.layouts,
+        )
+        return writer.open()
 
     @staticmethod
     def _calculate_case_health(candidate_text: str) -> float:
@@ -2,13 +2,20 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from langchain.schema import HumanMessage, SystemMessage
 
 from chatbot.content_processor import ContentSegment
+from chatbot.generation_checkpoint import GenerationCheckpoint
+from utils.llm_tracer import LLMTracer
+from utils.token_counter import TokenCounter
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -17,9 +24,13 @@ class TestcaseModeConfig:
     planner_prompt: str
     builder_prompt: str
     system_prompt: Optional[str]
-    context_limit: int
+    context_tokens: int  # token budget of the shared document context
     metadata: Dict[str, str]
     layout: str = "detailed"
+    builder_context: str = "full"  # "full" (shared document context) or "retrieval" (per-module top-k chunks)
+    retrieval_top_k: int = 6
+    builder_context_tokens: int = 4000
+    max_modules: int = 0  # cap on planned modules (0 = no cap)
 
 
 @dataclass
@@ -62,14 +73,54 @@ class TestcaseModule:
     cases: List[TestcaseCase] = field(default_factory=list)
     fallback_content: Optional[str] = None
 
+    def to_markdown(self, index: int, layouts: Dict[str, 'TestcaseLayout']) -> str:
+        lines = [f"\n## 模块 {index}: {self.name}"]
+        if self.goal:
+            lines.append(f"> 模块目标：{self.goal}")
+
+        layout = layouts.get(self.layout)
+        if self.cases and layout:
+            for case_index, case in enumerate(self.cases, start=1):
+                lines.append(f"### 用例 {case_index}: {case.title}")
+                for field in layout.fields:
+                    if field.key == 'title':
+                        continue
+                    value = case.field_values.get(field.key)
+                    if value:
+                        lines.append(f"- {field.label}: {value}")
+                if case.raw_text:
+                    lines.append(case.raw_text)
+        elif self.fallback_content:
+            lines.append(self.fallback_content)
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "layout": self.layout,
+            "goal": self.goal,
+            "fallback_content": self.fallback_content,
+            "cases": [
+                {
+                    "title": case.title,
+                    "field_values": case.field_values,
+                    "raw_text": case.raw_text,
+                }
+                for case in self.cases
+            ],
+        }
+
 
 @dataclass
 class TestcaseDocument:
+    """Generated suite; ``modules`` is empty when they were streamed to ``on_module``."""
+
     mode: str
     modules: List[TestcaseModule]
     metadata: Dict[str, Any] = field(default_factory=dict)
     planner_notes: List[str] = field(default_factory=list)
     plan_summary: List[TestPlanSection] = field(default_factory=list)
+    module_count: int = 0
 
     def to_markdown(self, layouts: Dict[str, TestcaseLayout]) -> str:
         lines = [f"# 测试用例（模式：{self.mode}）"]
@@ -83,53 +134,17 @@ class TestcaseDocument:
                     lines.append(f"- {item}")
 
         for index, module in enumerate(self.modules, start=1):
-            lines.append(f"\n## 模块 {index}: {module.name}")
-            if module.goal:
-                lines.append(f"> 模块目标：{module.goal}")
-
-            layout = layouts.get(module.layout)
-            if module.cases and layout:
-                for case_index, case in enumerate(module.cases, start=1):
-                    lines.append(f"### 用例 {case_index}: {case.title}")
-                    for field in layout.fields:
-                        if field.key == 'title':
-                            continue
-                        value = case.field_values.get(field.key)
-                        if value:
-                            lines.append(f"- {field.label}: {value}")
-                    if case.raw_text:
-                        lines.append(case.raw_text)
-            elif module.fallback_content:
-                lines.append(module.fallback_content)
+            lines.append(module.to_markdown(index, layouts))
 
         return "\n".join(lines).strip() + "\n"
 
     def to_dict(self) -> Dict[str, Any]:
-        modules_payload: List[Dict[str, Any]] = []
-        for module in self.modules:
-            modules_payload.append(
-                {
-                    "name": module.name,
-                    "layout": module.layout,
-                    "goal": module.goal,
-                    "fallback_content": module.fallback_content,
-                    "cases": [
-                        {
-                            "title": case.title,
-                            "field_values": case.field_values,
-                            "raw_text": case.raw_text,
-                        }
-                        for case in module.cases
-                    ],
-                }
-            )
-
         return {
             "mode": self.mode,
             "metadata": self.metadata,
             "planner_notes": self.planner_notes,
             "plan_summary": [section.as_dict() for section in self.plan_summary],
-            "modules": modules_payload,
+            "modules": [module.to_dict() for module in self.modules],
         }
 
     def to_json(self) -> str:
@@ -139,9 +154,23 @@ class TestcaseDocument:
 class TestcaseGenerator:
     """Runs a two-stage plan→build pipeline for PRD-based test cases."""
 
-    def __init__(self, llm, memory_manager, layout_config: Optional[Dict[str, Any]] = None):
+    def __init__(
+        self,
+        llm,
+        memory_manager,
+        layout_config: Optional[Dict[str, Any]] = None,
+        tracer: Optional[LLMTracer] = None,
+        token_counter: Optional[TokenCounter] = None,
+        stage_llms: Optional[Dict[str, Any]] = None,
+        stage_token_counters: Optional[Dict[str, TokenCounter]] = None,
+    ):
         self.llm = llm
+        # Per-stage overrides ('planner', 'builder') from model routing, with the routed model's tokenizer.
+        self.stage_llms = stage_llms or {}
+        self.stage_token_counters = stage_token_counters or {}
         self.memory = memory_manager
+        self.tracer = tracer or LLMTracer()
+        self.token_counter = token_counter or TokenCounter()
         self.layouts = self._load_layouts(layout_config or {})
         if not self.layouts:
             self.layouts = self._load_layouts(
@@ -167,26 +196,79 @@ class TestcaseGenerator:
                 }
             )
 
-    def generate(self, segments: List[ContentSegment], mode: TestcaseModeConfig) -> TestcaseDocument:
-        context = self._build_context(segments, mode.context_limit)
-        plans = self._plan_modules(context, mode)
+    def generate(
+        self,
+        segments: List[ContentSegment],
+        mode: TestcaseModeConfig,
+        on_module: Optional[Callable[[int, TestcaseModule], None]] = None,
+        checkpoint: Optional[GenerationCheckpoint] = None,
+        vector_store=None,
+        planner_context: Optional[str] = None,
+    ) -> TestcaseDocument:
+        """Plan modules, then build each one.
+
+        ``on_module`` is called with the 1-based index and the module as soon
+        as each module is built, so callers can persist results incrementally;
+        the modules are then not kept in the returned document, so memory
+        stays flat however large the suite grows.
+        With a ``checkpoint``, planner and builder outputs are saved as they
+        arrive and outputs already saved by an earlier attempt are reused.
+        When the mode uses ``builder_context: retrieval`` and a
+        ``vector_store`` is given, each builder prompt gets the chunks most
+        similar to its module instead of the shared document context.
+        ``planner_context`` (e.g. document summaries) replaces the shared
+        context in the planner prompt.
+        """
+
+        context = self._build_context(segments, mode.context_tokens)
+        plans = checkpoint.load_plans() if checkpoint else None
+        if plans:
+            self.tracer.record(stage='planner', latency=0.0, cache="hit")
+        else:
+            if planner_context:
+                planner_context = self._counter('planner').truncate(planner_context, mode.context_tokens)
+            plans = self._plan_modules(planner_context or context, mode)
+            if checkpoint:
+                checkpoint.save_plans(plans)
         layout = self.layouts.get(mode.layout) or next(iter(self.layouts.values()))
         modules: List[TestcaseModule] = []
-
-        for plan in plans:
-            raw_output = self._build_cases(context, plan, mode, layout)
+        module_names: List[str] = []
+
+        for index, plan in enumerate(plans, start=1):
+            raw_output = checkpoint.load_module(index, plan) if checkpoint else None
+            if raw_output is None:
+                module_context = context
+                retrieved: Optional[List[str]] = None
+                if mode.builder_context == 'retrieval' and vector_store is not None:
+                    selected = self.retrieve_module_chunks(vector_store, plan, mode)
+                    if selected:
+                        module_context = self._format_retrieved(selected)
+                        retrieved = [content for _, _, content in selected]
+                raw_output = self._build_cases(module_context, plan, mode, layout)
+                if checkpoint:
+                    checkpoint.save_module(index, plan, raw_output, context_texts=retrieved)
+            else:
+                self.tracer.record(stage='builder', latency=0.0, module=plan, cache="hit")
             module_obj = self._parse_module_output(plan, raw_output, layout)
-            modules.append(module_obj)
-
-        summary_text = f"Generated {len(modules)} modules for mode {mode.name} (version {mode.metadata.get('version', 'n/a')})."
-        self.memory.add_document_summary(summary_text)
+            module_names.append(module_obj.name)
+            if on_module:
+                on_module(len(module_names), module_obj)
+            else:
+                modules.append(module_obj)
+
+        summary_text = (
+            f"Generated {len(module_names)} modules for mode {mode.name} "
+            f"(version {mode.metadata.get('version', 'n/a')})."
+        )
+        self.memory.add_generation_note(summary_text)
 
         return TestcaseDocument(
             mode=mode.name,
             modules=modules,
             metadata=mode.metadata,
             planner_notes=plans,
-            plan_summary=self._build_plan_summary(mode, layout, modules),
+            plan_summary=self._build_plan_summary(mode, layout, module_names),
+            module_count=len(module_names),
         )
 
     # ------------------------------------------------------------------
@@ -224,6 +306,9 @@ class TestcaseGenerator:
             )
         return layouts
 
+    def _counter(self, stage: str) -> TokenCounter:
+        return self.stage_token_counters.get(stage, self.token_counter)
+
     @staticmethod
     def _format_template(template: str, **kwargs) -> str:
         """Safely substitute {key} placeholders without touching其他花括号."""
@@ -233,14 +318,61 @@ class TestcaseGenerator:
             result = result.replace(f'{{{key}}}', str(value))
         return result
 
+    def retrieve_module_chunks(self, vector_store, plan: str, mode: TestcaseModeConfig) -> List[Tuple[str, Any, str]]:
+        """Top-k ``(source, chunk, content)`` for the module (name and goal as the query), within the token budget."""
+
+        try:
+            documents = vector_store.similarity_search(plan, k=max(1, mode.retrieval_top_k))
+        except Exception as exc:
+            logger.warning("Retrieval for module %s failed: %s", plan, exc)
+            return []
+
+        selected = []
+        seen = set()
+        used_tokens = 0
+        for rank, document in enumerate(documents):
+            content = document.page_content.strip()
+            if not content or content in seen:
+                continue
+            tokens = self._counter('builder').count(content)
+            if selected and used_tokens + tokens > mode.builder_context_tokens:
+                break
+            seen.add(content)
+            used_tokens += tokens
+            metadata = document.metadata or {}
+            selected.append((metadata.get('source', ''), metadata.get('chunk', rank), content))
+
+        # Keep document order so neighbouring chunks read naturally.
+        selected.sort(key=lambda item: (str(item[0]), item[1] if isinstance(item[1], int) else 0))
+        return selected
+
+    @staticmethod
+    def _format_retrieved(selected: List[Tuple[str, Any, str]]) -> str:
+        return "\n\n".join(f"### {source}#{chunk}\n{content}" for source, chunk, content in selected)
+
     def _plan_modules(self, context: str, mode: TestcaseModeConfig) -> List[str]:
-        prompt = self._format_template(mode.planner_prompt, context=context, mode=mode.name)
+        prompt = self._format_template(
+            mode.planner_prompt,
+            context=context,
+            mode=mode.name,
+            max_modules=mode.max_modules or '',
+        )
         messages = [
             SystemMessage(content=mode.system_prompt or "你是测试规划专家。"),
             HumanMessage(content=prompt),
         ]
-        response = self.llm.invoke(messages).content.strip()
+        self._counter('planner').check((message.content for message in messages), 'Planner')
+        llm = self.stage_llms.get('planner', self.llm)
+        response = llm.invoke(messages, self.tracer.config('planner')).content.strip()
         plans = [line.strip("- ") for line in response.splitlines() if line.strip()]
+        if mode.max_modules and len(plans) > mode.max_modules:
+            logger.warning(
+                "Planner returned %d modules for mode %s; keeping the first %d (max_modules).",
+                len(plans),
+                mode.name,
+                mode.max_modules,
+            )
+            plans = plans[:mode.max_modules]
         return plans or ["通用功能"]
 
     def _build_cases(
@@ -262,7 +394,9 @@ class TestcaseGenerator:
             SystemMessage(content=mode.system_prompt or "你是测试用例专家。"),
             HumanMessage(content=prompt),
         ]
-        response = self.llm.invoke(messages).content.strip()
+        self._counter('builder').check((message.content for message in messages), f"Builder ({plan})")
+        llm = self.stage_llms.get('builder', self.llm)
+        response = llm.invoke(messages, self.tracer.config('builder', module=plan)).content.strip()
         return response
 
     def _parse_module_output(self, module_name: str, raw_response: str, layout: TestcaseLayout) -> TestcaseModule:
@@ -311,7 +445,7 @@ class TestcaseGenerator:
         self,
         mode: TestcaseModeConfig,
         layout: TestcaseLayout,
-        modules: List[TestcaseModule],
+        module_names: List[str],
     ) -> List[TestPlanSection]:
         sections = layout.plan_sections or [
             TestPlanSection(
@@ -322,7 +456,7 @@ class TestcaseGenerator:
                 ],
             )
         ]
-        module_list = ", ".join(module.name for module in modules[:5])
+        module_list = ", ".join(module_names[:5])
         result: List[TestPlanSection] = []
         for section in sections:
             checklist = [
@@ -337,16 +471,63 @@ class TestcaseGenerator:
         return result
 
     def _build_context(self, segments: List[ContentSegment], limit: int) -> str:
-        chunks: List[str] = []
+        """Shared document context within ``limit`` tokens.
+
+        Segments loaded more than once (identical content) are included
+        once. The budget is then filled by priority: the memory overview
+        entries first (capped at a fifth of the budget), then
+        every segment from its beginning, split fairly so short documents
+        fit whole and long ones share what is left. Truncation happens at
+        paragraph boundaries.
+        """
+
+        # The shared context is sent with every builder call (and to the planner without summaries).
+        counter = self._counter('builder')
+        unique: List[ContentSegment] = []
+        seen_hashes = set()
         for segment in segments:
-            snippet = segment.content
-            if len(snippet) > 4000:
-                snippet = snippet[-4000:]
-            chunks.append(f"### {segment.type}:{segment.source}\n{snippet}")
-        text = "\n\n".join(chunks)
-        if len(text) > limit:
-            text = text[-limit:]
-        doc_summary = self.memory.get_document_overview()
-        if doc_summary:
-            text = doc_summary + "\n\n" + text
-        return text
+            digest = hashlib.sha256(segment.content.encode('utf-8')).hexdigest()
+            if digest in seen_hashes:
+                continue
+            seen_hashes.add(digest)
+            unique.append(segment)
+
+        overview = counter.truncate("\n\n".join(self.memory.document_summaries[-20:]), limit // 5)
+
+        # Each block also costs its header and the blank-line separator.
+        separator_tokens = counter.count("\n\n")
+        blocks = [(f"### {segment.type}:{segment.source}\n", segment.content) for segment in unique]
+        remaining = max(0, limit - counter.count(overview) - separator_tokens)
+        sizes = [counter.count(header) + counter.count(content) + separator_tokens for header, content in blocks]
+        shares = self._fair_shares(sizes, remaining)
+        parts = [overview] if overview else []
+        contributions = {'overview': counter.count(overview)} if overview else {}
+        for (header, content), share in zip(blocks, shares):
+            body_budget = share - counter.count(header) - separator_tokens
+            if body_budget <= 0:
+                continue
+            body = counter.truncate(content, body_budget)
+            if not body:
+                continue
+            parts.append(header + body)
+            contributions[header[4:].strip()] = counter.count(header + body)
+
+        logger.info(
+            "Generation context: %s; skipped %d duplicate segment(s)",
+            ", ".join(f"{name}={tokens} tokens" for name, tokens in contributions.items()) or "empty",
+            len(segments) - len(unique),
+        )
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def _fair_shares(sizes: List[int], budget: int) -> List[int]:
+        """Split ``budget`` so items below the fair share keep their full size."""
+
+        shares = [0] * len(sizes)
+        pending = sorted(range(len(sizes)), key=lambda index: sizes[index])
+        while pending:
+            fair = budget // len(pending)
+            index = pending.pop(0)
+            shares[index] = min(sizes[index], fair)
+            budget -= shares[index]
+        return shares
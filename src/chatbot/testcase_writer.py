@@ -0,0 +1,194 @@
+"""Incremental writers that persist generated test case modules as they complete."""
+
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from chatbot.testcase_generator import TestcaseLayout, TestcaseModule, TestPlanSection
+
+STREAM_FORMATS = {'jsonl', 'json', 'markdown'}
+
+
+class TestcaseStreamWriter(ABC):
+    """Base writer: ``open`` once, ``write_module`` per module, ``close`` at the end.
+
+    Every module is flushed to disk immediately so other tools can read
+    partial results while generation is still running.
+    """
+
+    def __init__(self, path: Path, mode: str, metadata: Dict[str, Any], document_metadata: Dict[str, Any]):
+        self.path = Path(path)
+        self.mode = mode
+        self.metadata = metadata
+        self.document_metadata = document_metadata
+        self.modules_written = 0
+        self._handle = None
+
+    def open(self) -> 'TestcaseStreamWriter':
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = self.path.open('w', encoding='utf-8')
+        self._write_header()
+        self._handle.flush()
+        return self
+
+    def write_module(self, index: int, module: TestcaseModule) -> None:
+        self._write_module(index, module)
+        self.modules_written += 1
+        self._handle.flush()
+
+    def close(self, planner_notes: List[str], plan_summary: List[TestPlanSection]) -> None:
+        if self._handle is None:
+            return
+        try:
+            self._write_footer(planner_notes, plan_summary)
+        finally:
+            self._handle.close()
+            self._handle = None
+
+    def abort(self) -> None:
+        """Close the file after a failure, keeping whatever was already written."""
+
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    @abstractmethod
+    def _write_header(self) -> None:
+        ...
+
+    @abstractmethod
+    def _write_module(self, index: int, module: TestcaseModule) -> None:
+        ...
+
+    @abstractmethod
+    def _write_footer(self, planner_notes: List[str], plan_summary: List[TestPlanSection]) -> None:
+        ...
+
+
+class JsonlTestcaseWriter(TestcaseStreamWriter):
+    """One JSON object per line: a header, one line per module, then a summary."""
+
+    def _line(self, payload: Dict[str, Any]) -> None:
+        self._handle.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+    def _write_header(self) -> None:
+        self._line(
+            {
+                "type": "header",
+                "metadata": self.metadata,
+                "mode": self.mode,
+                "document_metadata": self.document_metadata,
+            }
+        )
+
+    def _write_module(self, index: int, module: TestcaseModule) -> None:
+        self._line({"type": "module", "index": index, **module.to_dict()})
+
+    def _write_footer(self, planner_notes: List[str], plan_summary: List[TestPlanSection]) -> None:
+        self._line(
+            {
+                "type": "summary",
+                "modules": self.modules_written,
+                "planner_notes": planner_notes,
+                "plan_summary": [section.as_dict() for section in plan_summary],
+            }
+        )
+
+
+def _indented_json(value: Any, level: int) -> str:
+    return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + "  " * level)
+
+
+class JsonTestcaseWriter(TestcaseStreamWriter):
+    """Pretty JSON in the usual ``{"metadata", "document"}`` shape.
+
+    The closing brackets are rewritten after every module, so the file is a
+    complete, valid JSON document at every point of the run; ``complete``
+    flips to true once the summary has been written.
+    """
+
+    def _write_header(self) -> None:
+        self._handle.write(
+            "{\n"
+            f'  "metadata": {_indented_json(self.metadata, 1)},\n'
+            '  "document": {\n'
+            f'    "mode": {json.dumps(self.mode, ensure_ascii=False)},\n'
+            f'    "metadata": {_indented_json(self.document_metadata, 2)},\n'
+            '    "complete": '
+        )
+        self._complete_offset = self._handle.tell()
+        self._handle.write('false,\n    "modules": [')
+        self._modules_offset = self._handle.tell()
+        self._write_tail("")
+
+    def _write_tail(self, extra: str) -> None:
+        self._handle.seek(self._modules_offset)
+        self._handle.write(f"\n    ]{extra}\n  }}\n}}\n")
+        self._handle.truncate()
+
+    def _write_module(self, index: int, module: TestcaseModule) -> None:
+        separator = "," if self.modules_written else ""
+        self._handle.seek(self._modules_offset)
+        self._handle.write(f"{separator}\n      {_indented_json(module.to_dict(), 3)}")
+        self._modules_offset = self._handle.tell()
+        self._write_tail("")
+
+    def _write_footer(self, planner_notes: List[str], plan_summary: List[TestPlanSection]) -> None:
+        self._write_tail(
+            f',\n    "planner_notes": {_indented_json(planner_notes, 2)},'
+            f'\n    "plan_summary": {_indented_json([section.as_dict() for section in plan_summary], 2)}'
+        )
+        # "true " keeps the same length as "false" so nothing after it moves.
+        self._handle.seek(self._complete_offset)
+        self._handle.write("true ")
+
+
+class MarkdownTestcaseWriter(TestcaseStreamWriter):
+    """Markdown report; the plan summary goes last because it depends on all modules."""
+
+    def __init__(self, *args, layouts: Optional[Dict[str, TestcaseLayout]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.layouts = layouts or {}
+
+    def _write_header(self) -> None:
+        lines = [f"> {key}: {value}" for key, value in self.metadata.items() if key in {'generated_at', 'config_hash'}]
+        lines.append("")
+        lines.append(f"# 测试用例（模式：{self.mode}）")
+        if self.document_metadata:
+            lines.append(f"> Metadata: {self.document_metadata}")
+        self._handle.write("\n".join(lines) + "\n")
+
+    def _write_module(self, index: int, module: TestcaseModule) -> None:
+        self._handle.write(module.to_markdown(index, self.layouts) + "\n")
+
+    def _write_footer(self, planner_notes: List[str], plan_summary: List[TestPlanSection]) -> None:
+        if not plan_summary:
+            return
+        lines = ["\n## 测试方案摘要"]
+        for section in plan_summary:
+            lines.append(f"### {section.title}")
+            for item in section.checklist:
+                lines.append(f"- {item}")
+        self._handle.write("\n".join(lines) + "\n")
+
+
+def create_testcase_writer(
+    output_format: str,
+    path: Path,
+    mode: str,
+    metadata: Dict[str, Any],
+    document_metadata: Dict[str, Any],
+    layouts: Optional[Dict[str, TestcaseLayout]] = None,
+) -> TestcaseStreamWriter:
+    normalized = (output_format or 'json').lower()
+    if normalized in {'md', 'markdown'}:
+        return MarkdownTestcaseWriter(path, mode, metadata, document_metadata, layouts=layouts)
+    if normalized == 'json':
+        return JsonTestcaseWriter(path, mode, metadata, document_metadata)
+    if normalized == 'jsonl':
+        return JsonlTestcaseWriter(path, mode, metadata, document_metadata)
+    raise ValueError(f"Unsupported testcase output format: {output_format}")
+
@@ -62,6 +62,9 @@ class CommandHandler:
             if command == "save":
                 self.save_history(args)
                 return True, None
+            if command == "stats":
+                self.show_stats(args)
+                return True, None
             if command in self.custom_commands:
                 payload = self.execute_custom_command(command, args)
                 return True, payload
@@ -90,9 +93,10 @@ class CommandHandler:
             ("history", "Show conversation history", "/history"),
             ("read", "Read and index local files", "/read <path> [more_paths]"),
             ("read_link", "Fetch Feishu doc by link/id", "/read_link <url_or_id>"),
-            ("generate_cases", "Generate test cases", "/generate_cases mode=default output=... format=json thoughts=false plan=false"),
-            ("evaluate_cases", "Evaluate generated cases", "/evaluate_cases <baseline> <candidate> [output]"),
+            ("generate_cases", "Generate test cases", "/generate_cases mode=default output=... format=json thoughts=false plan=false resume=<run_id> incremental=true base=<run_id>"),
+            ("evaluate_cases", "Evaluate generated cases", "/evaluate_cases <baseline> <candidate> [output] strategy=auto|full|map_reduce|sample sample_size=N confidence=0.95"),
             ("save", "Save conversation history", "/save [filename]"),
+            ("stats", "Show LLM latency/token stats per stage", "/stats [session]"),
         ]
 
         for name, desc, usage in builtin_commands:
@@ -184,6 +188,9 @@ class CommandHandler:
                 output_format=options['format'],
                 show_thoughts=options['show_thoughts'],
                 show_plan_summary=options['show_plan'],
+                resume=options['resume'],
+                incremental=options['incremental'],
+                base_run=options['base'],
             )
             if options['show_thoughts'] and plan_notes:
                 body = "\n".join(f"{idx}. {plan}" for idx, plan in enumerate(plan_notes, start=1))
@@ -215,9 +222,14 @@ class CommandHandler:
             self.console.print(f"[red]Failed to generate test cases: {exc}[/red]")
 
     def evaluate_cases(self, args: List[str]) -> None:
-        baseline = args[0] if args else None
-        candidate = args[1] if len(args) > 1 else None
-        output = args[2] if len(args) > 2 else None
+        options = {
+            key.strip().lower(): value.strip()
+            for key, value in (arg.split('=', 1) for arg in args if '=' in arg)
+        }
+        args = [arg for arg in args if '=' not in arg]
+        baseline = options.get('baseline') or (args[0] if args else None)
+        candidate = options.get('candidate') or (args[1] if len(args) > 1 else None)
+        output = options.get('output') or (args[2] if len(args) > 2 else None)
         if len(args) > 3:
             self.console.print("[yellow]Warning: 多余参数将被忽略。[/yellow]")
         try:
@@ -225,6 +237,9 @@ class CommandHandler:
                 baseline_path=baseline,
                 candidate_path=candidate,
                 output_path=output,
+                strategy=options.get('strategy') or None,
+                sample_size=int(options['sample_size']) if options.get('sample_size') else None,
+                confidence=float(options['confidence']) if options.get('confidence') else None,
             )
             # After saving report, print concise scores per section and total
             try:
@@ -261,6 +276,78 @@ class CommandHandler:
         except Exception as exc:
             self.console.print(f"[red]Failed to evaluate cases: {exc}[/red]")
 
+    def show_stats(self, args: List[str]) -> None:
+        session_only = bool(args) and args[0].lower() == "session"
+        stats = self.chatbot_core.get_trace_stats(session_only=session_only)
+        if not stats:
+            self.console.print("[yellow]No LLM traces recorded yet (check paths.trace_log).[/yellow]")
+            self._show_connection_stats()
+            return
+
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Stage", style="yellow")
+        table.add_column("Calls", justify="right")
+        table.add_column("Errors", justify="right")
+        table.add_column("Cache hits", justify="right")
+        table.add_column("p50 (s)", justify="right")
+        table.add_column("p95 (s)", justify="right")
+        table.add_column("Total (s)", justify="right")
+        table.add_column("Prompt tok", justify="right")
+        table.add_column("Completion tok", justify="right")
+
+        def _fmt(value: Optional[float]) -> str:
+            return f"{value:.2f}" if value is not None else "-"
+
+        for stage, item in sorted(stats.items(), key=lambda entry: entry[1]['total_latency'], reverse=True):
+            table.add_row(
+                stage,
+                str(item['calls']),
+                str(item['errors']),
+                str(item['cache_hits']),
+                _fmt(item['p50']),
+                _fmt(item['p95']),
+                _fmt(item['total_latency']),
+                str(item['prompt_tokens']),
+                str(item['completion_tokens']),
+            )
+
+        scope = "current session" if session_only else "all sessions"
+        self.console.print(f"\n[bold cyan]LLM call statistics ({scope}):[/bold cyan]")
+        self.console.print(table)
+        self._show_connection_stats()
+
+    def _show_connection_stats(self) -> None:
+        stats = self.chatbot_core.get_connection_stats()
+        if not stats:
+            return
+        ratio = stats['reuse_ratio']
+        line = (
+            f"HTTP: {stats['requests']} request(s) over {stats['connections_opened']} new connection(s), "
+            f"{stats['tls_handshakes']} TLS handshake(s), reuse "
+            f"{f'{ratio:.0%}' if ratio is not None else '-'}, {stats['errors']} transport error(s)"
+        )
+        if stats['http2_requests']:
+            line += f", {stats['http2_requests']} over HTTP/2"
+        if stats['hedge_eligible']:
+            line += (
+                f"; hedged {stats['hedged']} of {stats['hedge_eligible']} eligible request(s) "
+                f"({stats['hedge_wins']} won by the duplicate, {stats['hedge_capped']} skipped by the cap)"
+            )
+        downloads = stats.get('downloads')
+        if downloads and downloads['requests']:
+            line += (
+                f"; downloads: {downloads['requests']} request(s) over "
+                f"{downloads['connections_opened']} connection(s)"
+            )
+        self.console.print(f"[dim]{line}[/dim]")
+        for base_url, endpoints in (stats.get('endpoints') or {}).items():
+            for item in endpoints:
+                self.console.print(
+                    f"[dim]  {base_url} → {item['endpoint']} (weight {item['weight']}): {item['state']}, "
+                    f"{item['requests']} request(s), {item['failures']} failure(s), "
+                    f"{item['rate_limited']} rate-limited, circuit opened {item['opened']}x[/dim]"
+                )
+
     def save_history(self, args: List[str]) -> None:
         history = self.chatbot_core.get_conversation_history()
         if not history:
@@ -322,6 +409,9 @@ class CommandHandler:
             'show_thoughts': False,
             'format': self.default_case_format,
             'show_plan': False,
+            'resume': None,
+            'incremental': None,
+            'base': None,
         }
         positional: List[str] = []
 
@@ -340,6 +430,12 @@ class CommandHandler:
                     options['show_plan'] = self._parse_bool(value)
                 elif key == 'format' and value:
                     options['format'] = value.lower()
+                elif key == 'resume' and value:
+                    options['resume'] = value
+                elif key == 'incremental':
+                    options['incremental'] = self._parse_bool(value)
+                elif key == 'base' and value:
+                    options['base'] = value
                 else:
                     positional.append(arg)
             else:
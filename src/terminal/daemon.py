@@ -0,0 +1,347 @@
+"""Long-running daemon that keeps the chatbot warm and serves scripts over HTTP."""
+
+from __future__ import annotations
+
+import io
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib import error as urlerror
+from urllib import request as urlrequest
+
+from rich.console import Console
+
+from terminal.script_runner import HandlerFactory, ScriptRunner, route_console
+
+# Endpoints that map one-to-one onto slash commands; chat goes through ``ask``.
+COMMAND_ENDPOINTS = {'read', 'read_link', 'generate_cases', 'evaluate_cases'}
+
+SessionFactory = Callable[[Console], Tuple[Any, HandlerFactory]]
+
+
+@dataclass
+class DaemonSession:
+    """One client session with its own chatbot history."""
+
+    session_id: str
+    chatbot: Any
+    build_handler: HandlerFactory
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    last_used: float = field(default_factory=time.monotonic)
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class ChatDaemon:
+    """Owns the client sessions and executes script lines against them.
+
+    Sessions share the warm models, HTTP clients and caches of the process
+    but keep isolated conversation histories; each session loads and indexes
+    its own documents with ``/read``. Requests for the same session are
+    serialized; different sessions run concurrently.
+
+    Sessions idle for longer than ``session_ttl`` seconds are dropped, and at
+    most ``max_sessions`` are kept open (0 disables either limit).
+    """
+
+    def __init__(
+        self,
+        build_session: SessionFactory,
+        log_path: Optional[Path] = None,
+        stream_options: Optional[Dict[str, Any]] = None,
+        step_parallelism: int = 4,
+        width: int = 100,
+        session_ttl: float = 0.0,
+        max_sessions: int = 0,
+    ):
+        self.build_session = build_session
+        self.log_path = Path(log_path) if log_path else None
+        self.stream_options = stream_options
+        self.step_parallelism = step_parallelism
+        self.width = width
+        self.session_ttl = max(0.0, float(session_ttl or 0))
+        self.max_sessions = max(0, int(max_sessions or 0))
+        self._sessions: Dict[str, DaemonSession] = {}
+        self._reserved = 0  # sessions being built, counted against max_sessions
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def create_session(self) -> DaemonSession:
+        """Open a session; raises ``RuntimeError`` when ``max_sessions`` are in use."""
+
+        # Reserve the slot before building the chatbot so concurrent creations cannot overshoot the cap.
+        with self._lock:
+            self._evict_expired()
+            if self.max_sessions and len(self._sessions) + self._reserved >= self.max_sessions:
+                raise RuntimeError(self._capacity_message())
+            self._reserved += 1
+        try:
+            chatbot, build_handler = self.build_session(self._new_console(io.StringIO()))
+        except BaseException:
+            with self._lock:
+                self._reserved -= 1
+            raise
+        session = DaemonSession(uuid.uuid4().hex[:12], chatbot, build_handler)
+        with self._lock:
+            self._reserved -= 1
+            self._sessions[session.session_id] = session
+        return session
+
+    def get_session(self, session_id: str) -> Optional[DaemonSession]:
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.touch()
+            return session
+
+    def close_session(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.chatbot.close()
+        return True
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._evict_expired()
+            return [
+                {
+                    'session': session.session_id,
+                    'created_at': session.created_at,
+                    'idle_seconds': round(session.idle_seconds(), 1),
+                    'history': len(session.chatbot.conversation),
+                }
+                for session in self._sessions.values()
+            ]
+
+    def run(self, session: DaemonSession, script: str, width: Optional[int] = None) -> Dict[str, Any]:
+        """Execute script text (one or more lines) in ``session``.
+
+        ``width`` lets the client have output rendered for its own terminal.
+        """
+
+        output = io.StringIO()
+        log = io.StringIO()
+        request_console = self._new_console(output, width)
+        with session.lock, route_console(request_console):
+            runner = ScriptRunner(
+                session.chatbot,
+                session.build_handler,
+                request_console,
+                log,
+                stream_options=self.stream_options,
+                max_workers=self.step_parallelism,
+            )
+            status = runner.run_lines(script.splitlines())
+            session.touch()
+
+        self._write_log(session.session_id, log.getvalue())
+        return {'session': session.session_id, 'status': status, 'output': output.getvalue()}
+
+    def _capacity_message(self) -> str:
+        return f"Session limit reached ({self.max_sessions}); close an idle session first."
+
+    def _evict_expired(self) -> None:
+        """Drop sessions idle past ``session_ttl``; caller holds ``self._lock``."""
+
+        if not self.session_ttl:
+            return
+        expired = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if session.idle_seconds() > self.session_ttl and not session.lock.locked()
+        ]
+        for session_id in expired:
+            self._sessions.pop(session_id).chatbot.close()
+
+    def _new_console(self, buffer: io.StringIO, width: Optional[int] = None) -> Console:
+        return Console(file=buffer, force_terminal=False, color_system=None, width=width or self.width)
+
+    def _write_log(self, session_id: str, text: str) -> None:
+        if not self.log_path or not text:
+            return
+        with self._log_lock:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.log_path.open('a', encoding='utf-8') as handle:
+                handle.write(f"[{datetime.now().isoformat()}] SESSION {session_id}\n{text}")
+
+
+class _DaemonRequestHandler(BaseHTTPRequestHandler):
+    """JSON-over-HTTP routing for :class:`ChatDaemon`.
+
+    Routes:
+        GET    /health
+        GET    /sessions
+        POST   /sessions                        -> {"session": id}
+        DELETE /sessions/<id>
+        POST   /sessions/<id>/run               {"script": "...", "width": 100}
+        POST   /sessions/<id>/ask               {"prompt": "..."}
+        POST   /sessions/<id>/<command>         {"args": "..."} for read, read_link,
+                                                generate_cases and evaluate_cases
+    """
+
+    daemon: ChatDaemon
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        parts = self._path_parts()
+        if parts == ['health']:
+            self._send(200, {'status': 'ok', 'sessions': len(self.daemon.list_sessions())})
+        elif parts == ['sessions']:
+            self._send(200, {'sessions': self.daemon.list_sessions()})
+        else:
+            self._send(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        parts = self._path_parts()
+        if len(parts) == 2 and parts[0] == 'sessions':
+            if self.daemon.close_session(parts[1]):
+                self._send(200, {'session': parts[1], 'closed': True})
+            else:
+                self._send(404, {'error': f"Unknown session: {parts[1]}"})
+        else:
+            self._send(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self) -> None:  # noqa: N802
+        parts = self._path_parts()
+        try:
+            payload = self._read_json()
+        except ValueError as exc:
+            self._send(400, {'error': str(exc)})
+            return
+
+        if parts == ['sessions']:
+            try:
+                session = self.daemon.create_session()
+            except RuntimeError as exc:
+                self._send(503, {'error': str(exc)})
+                return
+            self._send(200, {'session': session.session_id})
+            return
+
+        if len(parts) != 3 or parts[0] != 'sessions':
+            self._send(404, {'error': f"Unknown endpoint: {self.path}"})
+            return
+
+        session = self.daemon.get_session(parts[1])
+        if session is None:
+            self._send(404, {'error': f"Unknown session: {parts[1]}"})
+            return
+
+        action = parts[2]
+        if action == 'run':
+            script = str(payload.get('script') or '')
+        elif action == 'ask':
+            script = str(payload.get('prompt') or '').replace('\n', ' ')
+        elif action in COMMAND_ENDPOINTS:
+            script = f"/{action} {payload.get('args') or ''}".strip()
+        else:
+            self._send(404, {'error': f"Unknown action: {action}"})
+            return
+
+        if not script.strip():
+            self._send(400, {'error': 'Nothing to execute.'})
+            return
+
+        try:
+            width = int(payload['width']) if payload.get('width') else None
+            self._send(200, self.daemon.run(session, script, width=width))
+        except Exception as exc:  # pragma: no cover - runtime feedback
+            self._send(500, {'session': session.session_id, 'status': 'error', 'error': str(exc)})
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - stdlib signature
+        return
+
+    def _path_parts(self) -> List[str]:
+        return [part for part in self.path.split('?', 1)[0].split('/') if part]
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ValueError(f"Invalid JSON body: {exc}") from exc
+        if not isinstance(payload, dict):
+            raise ValueError("JSON body must be an object.")
+        return payload
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(daemon: ChatDaemon, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Bind a threaded HTTP server that dispatches to ``daemon``."""
+
+    handler = type('DaemonRequestHandler', (_DaemonRequestHandler,), {'daemon': daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class DaemonClient:
+    """Thin client that submits script lines to a running daemon."""
+
+    def __init__(self, base_url: str, timeout: float = 600.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session_id: Optional[str] = None
+
+    def health(self) -> Dict[str, Any]:
+        return self._request('GET', '/health')
+
+    def open_session(self) -> str:
+        self.session_id = self._request('POST', '/sessions')['session']
+        return self.session_id
+
+    def close_session(self) -> None:
+        if self.session_id:
+            self._request('DELETE', f'/sessions/{self.session_id}')
+            self.session_id = None
+
+    def run(self, script: str, width: Optional[int] = None) -> Dict[str, Any]:
+        if not self.session_id:
+            self.open_session()
+        payload: Dict[str, Any] = {'script': script}
+        if width:
+            payload['width'] = width
+        return self._request('POST', f'/sessions/{self.session_id}/run', payload)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+        req = urlrequest.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urlrequest.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urlerror.HTTPError as exc:
+            try:
+                detail = json.loads(exc.read().decode('utf-8')).get('error')
+            except (ValueError, AttributeError):
+                detail = exc.reason
+            raise RuntimeError(f"Daemon returned {exc.code}: {detail}") from exc
+        except urlerror.URLError as exc:
+            raise RuntimeError(f"Cannot reach daemon at {self.base_url}: {exc.reason}") from exc
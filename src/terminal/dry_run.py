@@ -0,0 +1,469 @@
+"""Offline cost and latency estimate of command scripts (``cli.py --dry-run``).
+
+The script is parsed exactly like :class:`ScriptRunner` would and local
+files are ingested without any model call. Each step is then translated
+into the model calls it would make per trace stage (planner, builder,
+review, image_analyze, ...) using the configured testcase modes, evaluation
+metrics and summary cache. Token volume and wall time come from the
+per-stage averages and latency percentiles of earlier runs in the trace
+log; stages without history fall back to local prompt-size estimates and
+have no latency.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+from chatbot.content_processor import ContentProcessor, ContentSegment
+from chatbot.document_summarizer import DocumentSummarizer
+from chatbot.evaluation_engine import BASELINE_PLACEHOLDER, chunk_candidate, parse_candidate_modules
+from chatbot.evaluation_sampling import plan_stratified_sample, required_sample_size
+from terminal.command_handler import CommandHandler
+from terminal.script_runner import ScriptStep, parse_script
+from utils.llm_tracer import aggregate_traces, load_traces
+from utils.token_counter import TokenCounter
+
+VISION_STAGES = {'image_analyze', 'image_classify'}
+
+# Calls a stage triggers only sometimes, estimated from their historical
+# ratio to the stage that triggers them.
+FOLLOWUP_STAGES = {
+    'infer_level': 'review',
+    'condense': 'ask',
+    'history_summary': 'ask',
+}
+
+# Built-in commands that never call a model.
+LOCAL_COMMANDS = {'help', 'clear', 'history', 'save', 'stats', 'exit', 'quit'}
+
+# Planned modules when there is neither trace history nor a heading structure to go by.
+DEFAULT_MODULE_GUESS = 5
+# Builder completion tokens per module when the trace log has no builder history.
+DEFAULT_BUILDER_COMPLETION_TOKENS = 1500
+
+_HEADING = re.compile(r'^\s{0,3}#{1,2}\s+\S', re.MULTILINE)
+
+
+@dataclass
+class StageProfile:
+    """Historical per-call averages of one trace stage."""
+
+    calls: int = 0
+    prompt_tokens: Optional[float] = None
+    completion_tokens: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
+
+@dataclass
+class StepEstimate:
+    line_no: int
+    text: str
+    calls: Dict[str, float] = field(default_factory=dict)
+    prompt_tokens: Dict[str, float] = field(default_factory=dict)  # per call, local estimate
+    parallelism: Dict[str, int] = field(default_factory=dict)
+    notes: List[str] = field(default_factory=list)
+
+    def add(self, stage: str, calls: float, prompt_tokens: Optional[int] = None, parallelism: int = 1) -> None:
+        if calls <= 0:
+            return
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+        if prompt_tokens is not None:
+            self.prompt_tokens[stage] = prompt_tokens
+        self.parallelism[stage] = max(self.parallelism.get(stage, 1), parallelism)
+
+
+@dataclass
+class ScriptEstimate:
+    script: Path
+    stages: List[List[StepEstimate]] = field(default_factory=list)
+    profiles: Dict[str, StageProfile] = field(default_factory=dict)
+    stopped_at: Optional[int] = None
+
+    @property
+    def steps(self) -> List[StepEstimate]:
+        return [step for stage in self.stages for step in stage]
+
+    def calls(self, step: StepEstimate, vision: bool) -> float:
+        return sum(count for stage, count in step.calls.items() if (stage in VISION_STAGES) == vision)
+
+    def tokens(self, step: StepEstimate) -> Tuple[float, float]:
+        prompt = completion = 0.0
+        for stage, count in step.calls.items():
+            profile = self.profiles.get(stage) or StageProfile()
+            per_call = profile.prompt_tokens if profile.prompt_tokens is not None else step.prompt_tokens.get(stage)
+            prompt += count * (per_call or 0)
+            completion += count * (profile.completion_tokens or 0)
+        return prompt, completion
+
+    def wall_time(self, step: StepEstimate, key: str) -> float:
+        """Seconds for ``step`` at the ``p50`` or ``p95`` latency of each stage."""
+
+        total = 0.0
+        for stage, count in step.calls.items():
+            latency = getattr(self.profiles.get(stage) or StageProfile(), key)
+            if latency is not None:
+                total += math.ceil(count / step.parallelism.get(stage, 1)) * latency
+        return total
+
+    def stage_wall_time(self, stage: List[StepEstimate], key: str) -> float:
+        # Steps of one stage run concurrently, so the slowest one sets the pace.
+        return max((self.wall_time(step, key) for step in stage), default=0.0)
+
+    def missing_history(self) -> List[str]:
+        stages = {stage for step in self.steps for stage in step.calls}
+        return sorted(stage for stage in stages if (self.profiles.get(stage) or StageProfile()).p50 is None)
+
+
+class DryRunEstimator:
+    """Estimates the model calls, tokens and wall time of command scripts."""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        model_name: Optional[str] = None,
+        trace_log_path: Optional[str] = None,
+    ):
+        self.config = config
+        self.testcase_modes = config.get('testcase_modes') or {}
+        self.custom_commands = config.get('commands') or {}
+        self.evaluation_metrics = [item for item in config.get('evaluation_metrics') or [] if item.get('prompt')]
+        self.evaluation_config = config.get('evaluation') or {}
+        self.review_metrics = self.evaluation_config.get('review_metrics') or []
+        self.image_prompts = config.get('image_prompts') or {}
+        paths = config.get('paths') or {}
+        self.latest_testcase_cache = Path(paths.get('latest_testcase_cache') or './output/latest_testcase.json')
+        self.token_counter = TokenCounter.from_config(model_name, config.get('tokens'))
+        self.summarizer = DocumentSummarizer.from_config(
+            None,
+            config.get('summaries'),
+            cache_dir=paths.get('summary_cache', './output/cache/summaries'),
+        )
+        self.content_processor = ContentProcessor(status_callback=lambda level, message: None)
+        self.profiles = self._load_profiles(trace_log_path)
+        self._handler = CommandHandler(None, Console(quiet=True), custom_commands=self.custom_commands)
+
+    @staticmethod
+    def _load_profiles(trace_log_path: Optional[str]) -> Dict[str, StageProfile]:
+        if not trace_log_path or not Path(trace_log_path).expanduser().exists():
+            return {}
+        profiles: Dict[str, StageProfile] = {}
+        for stage, stats in aggregate_traces(load_traces(Path(trace_log_path).expanduser())).items():
+            # Cache hits carry no tokens; average tokens over real calls only.
+            succeeded = stats['calls'] - stats['errors'] - stats['cache_hits']
+            profiles[stage] = StageProfile(
+                calls=stats['calls'],
+                prompt_tokens=stats['prompt_tokens'] / succeeded if succeeded else None,
+                completion_tokens=stats['completion_tokens'] / succeeded if succeeded else None,
+                p50=stats['p50'],
+                p95=stats['p95'],
+            )
+        return profiles
+
+    def estimate(self, script_file: Path) -> ScriptEstimate:
+        estimate = ScriptEstimate(script=script_file, profiles=self.profiles)
+        state: Dict[str, Any] = {
+            'segments': [],
+            'remote_documents': 0,
+            'chat_turns': 0,
+            'generated': False,
+            'generated_modules': 0.0,
+        }
+        with script_file.expanduser().open('r', encoding='utf-8') as handle:
+            stages = parse_script(handle)
+
+        for stage in stages:
+            steps = [self._estimate_step(step, state) for step in stage.steps]
+            estimate.stages.append(steps)
+            stop = next((step for step in stage.steps if step.command in {'exit', 'quit'}), None)
+            if stop is not None:
+                estimate.stopped_at = stop.line_no
+                break
+
+        for step in estimate.steps:
+            self._add_followups(step)
+        return estimate
+
+    # ------------------------------------------------------------------
+    # Per-command estimates
+    # ------------------------------------------------------------------
+
+    def _estimate_step(self, step: ScriptStep, state: Dict[str, Any]) -> StepEstimate:
+        result = StepEstimate(line_no=step.line_no, text=step.text)
+        command = step.command
+        args = step.text.split()[1:]
+        if command is None or command in self.custom_commands:
+            result.add('ask', 1)
+            state['chat_turns'] += 1
+        elif command == 'read':
+            self._estimate_read(args, state, result)
+        elif command == 'read_link':
+            state['remote_documents'] += 1
+            result.notes.append("Feishu content is fetched at run time; its summary calls are not estimated.")
+        elif command == 'generate_cases':
+            self._estimate_generation(args, state, result)
+        elif command == 'evaluate_cases':
+            self._estimate_evaluation(args, state, result)
+        elif command not in LOCAL_COMMANDS:
+            result.notes.append(f"Unknown command /{command}; no model calls assumed.")
+        return result
+
+    def _estimate_read(self, args: List[str], state: Dict[str, Any], result: StepEstimate) -> None:
+        classify = bool(self.image_prompts.get('types') and self.image_prompts.get('classifier'))
+        for arg in args:
+            path = Path(arg).expanduser()
+            if not path.is_file():
+                result.notes.append(f"{path} not found; skipped.")
+                continue
+            extension = path.suffix.lower().lstrip('.')
+            if extension in ContentProcessor.SUPPORTED_IMAGE_FORMATS:
+                result.add('image_analyze', 1)
+                result.add('image_classify', 1 if classify else 0)
+                state['remote_documents'] += 1
+            elif extension in ContentProcessor.SUPPORTED_DOCUMENT_FORMATS:
+                result.add('image_analyze', 1)
+                state['remote_documents'] += 1
+            else:
+                for segment in self.content_processor.process_local_files([str(path)]):
+                    state['segments'].append(segment)
+                    self._estimate_summary(segment, result)
+
+    def _estimate_summary(self, segment: ContentSegment, result: StepEstimate) -> None:
+        if self.summarizer is None:
+            return
+        planned = self.summarizer.planned_calls(segment)
+        section_tokens = self.token_counter.count(segment.content[:self.summarizer.section_chars])
+        result.add('summary_map', planned.get('summary_map', 0), section_tokens, parallelism=self.summarizer.max_workers)
+        result.add('summary_reduce', planned.get('summary_reduce', 0))
+
+    def _estimate_generation(self, args: List[str], state: Dict[str, Any], result: StepEstimate) -> None:
+        options = self._handler._parse_generate_args(args)
+        raw = self.testcase_modes.get(options['mode']) or self.testcase_modes.get('default')
+        if not raw:
+            result.notes.append(f"Unknown testcase mode {options['mode']}; the command would fail.")
+            return
+
+        context_tokens = int(raw.get('context_tokens') or raw.get('context_limit', 12000))
+        document_tokens = sum(self.token_counter.count(segment.content) for segment in state['segments'])
+        shared_tokens = min(context_tokens, document_tokens)
+        planner_prompt = raw.get('planner_prompt') or raw.get('prompt') or ''
+        builder_prompt = raw.get('builder_prompt') or raw.get('prompt') or ''
+        if str(raw.get('builder_context', 'full')).lower() == 'retrieval':
+            builder_tokens = min(shared_tokens, int(raw.get('builder_context_tokens', 4000)))
+        else:
+            builder_tokens = shared_tokens
+
+        modules = self._estimate_modules(state, int(raw.get('max_modules') or 0), result)
+        result.add('planner', 1, shared_tokens + self.token_counter.count(planner_prompt))
+        result.add('builder', modules, builder_tokens + self.token_counter.count(builder_prompt))
+        if state['remote_documents']:
+            result.notes.append(
+                f"{state['remote_documents']} image/remote document(s) are only analysed at run time; "
+                "their text is not in the prompt estimate."
+            )
+        if options['resume'] or options['incremental'] or options['base']:
+            result.notes.append("Resumed or incremental runs reuse modules; builder calls are an upper bound.")
+        state['generated'] = True
+        state['generated_modules'] = modules
+
+    def _estimate_modules(self, state: Dict[str, Any], cap: int, result: StepEstimate) -> float:
+        planner = self.profiles.get('planner')
+        builder = self.profiles.get('builder')
+        if planner and planner.calls and builder and builder.calls:
+            modules = builder.calls / planner.calls
+            source = "trace history"
+        else:
+            headings = sum(len(_HEADING.findall(segment.content)) for segment in state['segments'])
+            modules = headings or DEFAULT_MODULE_GUESS
+            source = "document headings" if headings else "default guess"
+        if cap and modules > cap:
+            modules, source = cap, "max_modules"
+        result.notes.append(f"~{modules:.1f} module(s) planned ({source}).")
+        return modules
+
+    def _estimate_evaluation(self, args: List[str], state: Dict[str, Any], result: StepEstimate) -> None:
+        options = {
+            key.strip().lower(): value.strip()
+            for key, value in (arg.split('=', 1) for arg in args if '=' in arg)
+        }
+        positional = [arg for arg in args if '=' not in arg]
+        baseline = options.get('baseline') or (positional[0] if positional else None)
+        candidate = options.get('candidate') or (positional[1] if len(positional) > 1 else None)
+        if candidate is None and not state['generated'] and self.latest_testcase_cache.exists():
+            candidate = self.latest_testcase_cache.read_text(encoding='utf-8').strip() or None
+
+        baseline_text = self._read_text(baseline) or BASELINE_PLACEHOLDER
+        candidate_text = self._read_text(candidate)
+        sampled = False
+        if candidate_text is not None:
+            chunks, sampled = self._evaluation_chunks(candidate_text, options, result)
+            if not chunks:
+                return
+            candidate_tokens = self.token_counter.count(candidate_text)
+        elif state['generated']:
+            candidate_tokens = self._generated_candidate_tokens(state, result)
+            chunks = 1
+        else:
+            # Like the real command, a missing candidate falls back to the baseline text.
+            candidate_tokens = self.token_counter.count(baseline_text)
+            chunks = 1
+
+        prompt_tokens = min(
+            self.token_counter.prompt_budget,
+            self.token_counter.count(baseline_text) + candidate_tokens // chunks,
+        )
+        workers = int(self.evaluation_config.get('max_workers', 4)) if chunks > 1 or sampled else 1
+        if sampled:
+            # Samples are scored with case_quality plus case-level metrics only.
+            case_metrics = 1 + sum(1 for item in self.evaluation_metrics if item.get('scope') == 'case')
+            result.add('metric', case_metrics * chunks, prompt_tokens, parallelism=workers)
+            return
+        result.add('review', len(self.review_metrics) * chunks, prompt_tokens, parallelism=workers)
+        result.add('metric', len(self.evaluation_metrics) * chunks, prompt_tokens, parallelism=workers)
+
+    def _generated_candidate_tokens(self, state: Dict[str, Any], result: StepEstimate) -> int:
+        """Size of a suite generated earlier in the script: builder output per module x modules."""
+
+        builder = self.profiles.get('builder')
+        if builder and builder.completion_tokens:
+            per_module, source = builder.completion_tokens, "builder trace history"
+        else:
+            per_module, source = DEFAULT_BUILDER_COMPLETION_TOKENS, "default guess"
+        tokens = int(per_module * state['generated_modules'])
+        result.notes.append(
+            f"Candidate is produced at run time; ~{tokens} token(s) from {state['generated_modules']:.1f} "
+            f"module(s) x {per_module:.0f} ({source}), scored in one chunk."
+        )
+        return tokens
+
+    def _evaluation_chunks(
+        self,
+        candidate_text: str,
+        options: Dict[str, str],
+        result: StepEstimate,
+    ) -> Tuple[int, bool]:
+        """Number of scoring chunks and whether they are sampled replicates."""
+
+        strategy = (options.get('strategy') or self.evaluation_config.get('strategy') or 'auto').lower()
+        modules = parse_candidate_modules(candidate_text)
+        if strategy == 'sample':
+            sampling = self.evaluation_config.get('sampling') or {}
+            confidence = float(options.get('confidence') or sampling.get('confidence', 0.95))
+            population = sum(len(module.cases) for module in modules)
+            size = int(options.get('sample_size') or sampling.get('sample_size') or 0)
+            if size <= 0:
+                size = required_sample_size(population, confidence, float(sampling.get('margin', 0.05)))
+            if 0 < size < population:
+                try:
+                    plan = plan_stratified_sample(modules, size, replicates=int(sampling.get('replicates', 4)))
+                except ValueError as exc:
+                    result.notes.append(f"{exc}; the command would fail.")
+                    return 0, True
+                result.notes.append(f"Sampling {plan.sampled_cases}/{population} case(s).")
+                return len(plan.replicates), True
+            strategy = 'auto'
+        if strategy == 'full':
+            return 1, False
+        chunk_chars = int(self.evaluation_config.get('chunk_chars', 12000))
+        fits_window = self.token_counter.count(candidate_text) <= self.token_counter.prompt_budget // 2
+        if strategy == 'auto' and len(candidate_text) <= chunk_chars and fits_window:
+            return 1, False
+        return max(1, len(chunk_candidate(modules, chunk_chars))), False
+
+    def _add_followups(self, step: StepEstimate) -> None:
+        for stage, trigger in FOLLOWUP_STAGES.items():
+            trigger_profile = self.profiles.get(trigger)
+            profile = self.profiles.get(stage)
+            if step.calls.get(trigger) and profile and trigger_profile and trigger_profile.calls:
+                step.add(stage, step.calls[trigger] * profile.calls / trigger_profile.calls)
+
+    @staticmethod
+    def _read_text(path: Optional[str]) -> Optional[str]:
+        if not path:
+            return None
+        try:
+            return Path(path).expanduser().read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            return None
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.1f}s"
+
+
+def render_estimate(estimate: ScriptEstimate, console: Console) -> None:
+    """Print the per-step table, stage totals and caveats of one script."""
+
+    table = Table(show_header=True, header_style="bold magenta", title=f"Dry run: {estimate.script}")
+    table.add_column("Line", style="dim", justify="right")
+    table.add_column("Step", style="yellow")
+    table.add_column("LLM calls", justify="right")
+    table.add_column("Vision calls", justify="right")
+    table.add_column("Prompt tok", justify="right")
+    table.add_column("Completion tok", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p95", justify="right")
+
+    totals = {'llm': 0.0, 'vision': 0.0, 'prompt': 0.0, 'completion': 0.0}
+    by_stage: Dict[str, float] = {}
+    for step in estimate.steps:
+        prompt, completion = estimate.tokens(step)
+        llm_calls = estimate.calls(step, vision=False)
+        vision_calls = estimate.calls(step, vision=True)
+        totals['llm'] += llm_calls
+        totals['vision'] += vision_calls
+        totals['prompt'] += prompt
+        totals['completion'] += completion
+        for stage, count in step.calls.items():
+            by_stage[stage] = by_stage.get(stage, 0) + count
+        table.add_row(
+            str(step.line_no),
+            step.text,
+            f"{llm_calls:.0f}",
+            f"{vision_calls:.0f}",
+            f"{prompt:,.0f}",
+            f"{completion:,.0f}",
+            _format_seconds(estimate.wall_time(step, 'p50')),
+            _format_seconds(estimate.wall_time(step, 'p95')),
+        )
+
+    wall_p50 = sum(estimate.stage_wall_time(stage, 'p50') for stage in estimate.stages)
+    wall_p95 = sum(estimate.stage_wall_time(stage, 'p95') for stage in estimate.stages)
+    table.add_row(
+        "",
+        "[bold]Total[/bold]",
+        f"{totals['llm']:.0f}",
+        f"{totals['vision']:.0f}",
+        f"{totals['prompt']:,.0f}",
+        f"{totals['completion']:,.0f}",
+        _format_seconds(wall_p50),
+        _format_seconds(wall_p95),
+    )
+    console.print(table)
+
+    if by_stage:
+        console.print(
+            "[dim]Calls per stage: "
+            + ", ".join(f"{stage} {count:.1f}" for stage, count in sorted(by_stage.items()))
+            + "[/dim]"
+        )
+    for step in estimate.steps:
+        for note in step.notes:
+            console.print(f"[dim]line {step.line_no}: {note}[/dim]")
+    missing = estimate.missing_history()
+    if missing:
+        console.print(
+            f"[yellow]No trace history for {', '.join(missing)}: their latency is not in the wall time and "
+            "their tokens are local prompt estimates without completions (see paths.trace_log).[/yellow]"
+        )
+    if estimate.stopped_at is not None:
+        console.print(f"[dim]Script exits at line {estimate.stopped_at}; later lines are not estimated.[/dim]")
@@ -0,0 +1,283 @@
+"""Script execution with dependency-aware parallel stages."""
+
+from __future__ import annotations
+
+import io
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from rich.console import Console
+
+from terminal.stream_handler import TerminalStreamHandler
+
+SCRIPT_SUFFIXES = {'.tcl', '.txt'}
+
+# Commands that only add documents to the session and do not depend on each
+# other; consecutive ones may run concurrently.
+INGEST_COMMANDS = {'read', 'read_link'}
+
+HandlerFactory = Callable[[Console], Any]
+
+_routing = threading.local()
+
+
+def active_console(default: Console) -> Console:
+    """Console that output from the current thread should go to."""
+
+    return getattr(_routing, 'console', None) or default
+
+
+@contextmanager
+def route_console(console: Console) -> Iterator[Console]:
+    """Redirect status output produced on this thread to ``console``."""
+
+    previous = getattr(_routing, 'console', None)
+    _routing.console = console
+    try:
+        yield console
+    finally:
+        _routing.console = previous
+
+
+@dataclass
+class ScriptStep:
+    line_no: int
+    text: str
+
+    @property
+    def command(self) -> Optional[str]:
+        if not self.text.startswith('/'):
+            return None
+        return self.text.split()[0][1:]
+
+    @property
+    def is_ingest(self) -> bool:
+        return self.command in INGEST_COMMANDS
+
+
+@dataclass
+class ScriptStage:
+    """Steps that may run concurrently; stages run strictly in order."""
+
+    steps: List[ScriptStep] = field(default_factory=list)
+    explicit: bool = False
+
+
+def parse_script(lines: Iterable[str]) -> List[ScriptStage]:
+    """Group script lines into stages.
+
+    Consecutive ingestion commands (``/read``, ``/read_link``) form one
+    concurrent stage; every other command or chat line is a barrier that runs
+    alone after everything before it has finished. Lines inside an explicit
+    ``parallel { ... }`` block always form a single concurrent stage, in which
+    chat lines and other non-ingestion commands still run one at a time.
+    """
+
+    stages: List[ScriptStage] = []
+    block: Optional[ScriptStage] = None
+
+    for line_no, raw_line in enumerate(lines, start=1):
+        line = raw_line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if block is None and line.replace(' ', '') == 'parallel{':
+            block = ScriptStage(explicit=True)
+            continue
+        if block is not None:
+            if line == '}':
+                if block.steps:
+                    stages.append(block)
+                block = None
+            else:
+                block.steps.append(ScriptStep(line_no, line))
+            continue
+
+        step = ScriptStep(line_no, line)
+        previous = stages[-1] if stages else None
+        if (
+            step.is_ingest
+            and previous is not None
+            and not previous.explicit
+            and all(item.is_ingest for item in previous.steps)
+        ):
+            previous.steps.append(step)
+        else:
+            stages.append(ScriptStage(steps=[step]))
+
+    if block is not None and block.steps:
+        stages.append(block)
+    return stages
+
+
+def handle_chat_message(
+    chatbot,
+    console: Console,
+    prompt: str,
+    use_rag: Optional[bool] = None,
+    stream_options: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Send a prompt to the chatbot and stream the response."""
+
+    console.print(f"[bold blue]You:[/bold blue] {prompt}")
+    stream_handler = TerminalStreamHandler(console, **(stream_options or {}))
+
+    try:
+        response_text = chatbot.ask(prompt, stream_handler=stream_handler, use_rag=use_rag)
+        if not stream_handler.get_full_response() and response_text:
+            console.print(response_text)
+    except Exception as exc:  # pragma: no cover - runtime feedback
+        console.print(f"[red]Failed to generate response: {exc}[/red]")
+
+
+class ScriptRunner:
+    """Runs a command script against one chat session.
+
+    Independent steps run concurrently; their console output and log lines
+    are buffered and emitted in script order so logs stay deterministic.
+    """
+
+    def __init__(
+        self,
+        chatbot,
+        build_handler: HandlerFactory,
+        console: Console,
+        log: TextIO,
+        stream_options: Optional[Dict[str, Any]] = None,
+        max_workers: int = 4,
+    ):
+        self.chatbot = chatbot
+        self.build_handler = build_handler
+        self.console = console
+        self.log = log
+        self.stream_options = stream_options
+        self.max_workers = max(1, max_workers)
+        self._handler = build_handler(console)
+
+    def run(self, script_file: Path) -> None:
+        script_file = script_file.expanduser()
+        if not script_file.exists():
+            self.console.print(f"[red]Script file not found: {script_file}[/red]")
+            return
+
+        if script_file.suffix.lower() not in SCRIPT_SUFFIXES:
+            self.console.print(f"[red]Unsupported script extension {script_file.suffix}. Use .tcl or .txt.[/red]")
+            return
+
+        with script_file.open('r', encoding='utf-8') as handle:
+            self.run_lines(handle)
+
+    def run_lines(self, lines: Iterable[str]) -> str:
+        """Execute script lines and return the final status (ok, exit or error)."""
+
+        started = time.perf_counter()
+        for stage in parse_script(lines):
+            if len(stage.steps) == 1 or self.max_workers == 1:
+                # Serial steps stop at the first failure or /exit, like a plain script would.
+                outcomes = []
+                for step in stage.steps:
+                    outcome = self._run_step(step, self.console, self._handler)
+                    self.log.write(outcome['log'])
+                    outcomes.append(outcome)
+                    if outcome['status'] in ('error', 'exit'):
+                        break
+            else:
+                outcomes = self._run_parallel(stage)
+
+            if any(outcome['status'] == 'error' for outcome in outcomes):
+                return 'error'
+            if any(outcome['status'] == 'exit' for outcome in outcomes):
+                self.log.write(f"[{datetime.now().isoformat()}] INFO: script requested exit.\n\n")
+                return 'exit'
+
+        self.log.write(
+            f"[{datetime.now().isoformat()}] INFO: script completed in {time.perf_counter() - started:.2f}s.\n\n"
+        )
+        return 'ok'
+
+    def _run_parallel(self, stage: ScriptStage) -> List[Dict[str, Any]]:
+        sequencer = self.chatbot.new_ingest_sequencer()
+        stage_started = time.perf_counter()
+
+        def _buffered(position: int, step: ScriptStep) -> Dict[str, Any]:
+            output = io.StringIO()
+            step_console = Console(
+                file=output,
+                force_terminal=self.console.is_terminal,
+                color_system=self.console.color_system,
+                width=self.console.width,
+            )
+            with route_console(step_console), self.chatbot.ingest_slot(sequencer, position):
+                outcome = self._run_step(step, step_console, self.build_handler(step_console))
+            outcome['output'] = output.getvalue()
+            return outcome
+
+        def _in_order(items: List[Tuple[int, ScriptStep]]) -> List[Dict[str, Any]]:
+            return [_buffered(position, step) for position, step in items]
+
+        # Chat lines and commands other than ingestion change the session (history,
+        # generated files), so they run one after another in script order on a
+        # single worker while the ingestion steps of the stage run alongside them.
+        stateful = [(position, step) for position, step in enumerate(stage.steps) if not step.is_ingest]
+        ingest = [(position, step) for position, step in enumerate(stage.steps) if step.is_ingest]
+        workers = min(self.max_workers, len(ingest) + (1 if stateful else 0))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="script-step") as executor:
+            chain = executor.submit(_in_order, stateful) if stateful else None
+            futures = {position: executor.submit(_buffered, position, step) for position, step in ingest}
+            results = dict(zip((position for position, _ in stateful), chain.result() if chain else []))
+            results.update((position, future.result()) for position, future in futures.items())
+        outcomes = [results[position] for position in range(len(stage.steps))]
+
+        lines = ", ".join(str(step.line_no) for step in stage.steps)
+        self.log.write(
+            f"[{datetime.now().isoformat()}] STAGE: {len(stage.steps)} steps in parallel "
+            f"(lines {lines}) finished in {time.perf_counter() - stage_started:.2f}s.\n"
+        )
+        for outcome in outcomes:
+            self.console.file.write(outcome['output'])
+            self.log.write(outcome['log'])
+        self.console.file.flush()
+        return outcomes
+
+    def _run_step(self, step: ScriptStep, console: Console, command_handler) -> Dict[str, Any]:
+        log = io.StringIO()
+        timestamp = datetime.now().isoformat()
+        started = time.perf_counter()
+        status = 'ok'
+        log.write(f"[{timestamp}] CMD#{step.line_no}: {step.text}\n")
+        try:
+            console.print(f"[dim]script > {step.text}[/dim]")
+            if step.command is not None:
+                should_continue, payload = command_handler.process(step.text)
+                log.write(f"[{timestamp}] RESULT: command executed ({time.perf_counter() - started:.2f}s).\n")
+                if payload and payload.get('prompt'):
+                    handle_chat_message(
+                        self.chatbot,
+                        console,
+                        payload['prompt'],
+                        use_rag=payload.get('use_rag'),
+                        stream_options=self.stream_options,
+                    )
+                    log.write(
+                        f"[{timestamp}] RESULT: custom command prompt sent ({time.perf_counter() - started:.2f}s).\n"
+                    )
+                if not should_continue:
+                    status = 'exit'
+            else:
+                handle_chat_message(self.chatbot, console, step.text, stream_options=self.stream_options)
+                log.write(f"[{timestamp}] RESULT: chat executed ({time.perf_counter() - started:.2f}s).\n")
+        except Exception as exc:  # pragma: no cover - script mode
+            status = 'error'
+            console.print(f"[red]Script command failed (line {step.line_no}): {exc}[/red]")
+            log.write(f"[{timestamp}] ERROR: {exc}\n")
+            log.write(traceback.format_exc())
+
+        log.write("\n")
+        return {'status': status, 'log': log.getvalue(), 'output': ''}
@@ -1,23 +1,57 @@
 """Terminal stream handler for real-time response display using rich text."""
 
+import time
+from typing import Any, Dict, List, Optional
+
 from langchain.callbacks.base import BaseCallbackHandler
 from rich.console import Console
 
 
 class TerminalStreamHandler(BaseCallbackHandler):
-    """Handles streaming of model responses to terminal with rich formatting."""
-
-    def __init__(self, console: Console, initial_text: str = ""):
+    """Handles streaming of model responses to terminal with rich formatting.
+
+    Tokens are buffered and rendered once per ``flush_interval`` instead of
+    once per token, and basic throughput metrics are collected per LLM call.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        initial_text: str = "",
+        flush_interval: float = 0.05,
+        show_metrics: bool = True,
+    ):
         """Initialize terminal stream handler.
 
         Args:
             console: Rich console for formatted output
             initial_text: Initial text to display
+            flush_interval: Minimum seconds between two console renders
+            show_metrics: Print a metrics footer after each answer
         """
         self.console = console
-        self.full_response = initial_text
+        self.flush_interval = flush_interval
+        self.show_metrics = show_metrics
+        self._parts: List[str] = [initial_text] if initial_text else []
+        self._pending: List[str] = []
+        self._last_flush = time.perf_counter()
         self.in_code_block = False
-        self.code_content = ""
+        self._code_parts: List[str] = []
+        self._reset_metrics()
+
+    @property
+    def full_response(self) -> str:
+        return "".join(self._parts)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs) -> None:
+        """Reset per-call metrics when a completion starts."""
+
+        self._reset_metrics()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], **kwargs) -> None:
+        """Reset per-call metrics when a chat completion starts."""
+
+        self._reset_metrics()
 
     def on_llm_new_token(self, token: str, **kwargs) -> None:
         """Handle new token from LLM.
@@ -26,25 +60,31 @@ class TerminalStreamHandler(BaseCallbackHandler):
             token: New token from the model
             **kwargs: Additional keyword arguments
         """
-        self.full_response += token
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.token_count += 1
+        self._parts.append(token)
 
         if "```" in token:
             parts = token.split("```")
             for index, part in enumerate(parts):
                 if self.in_code_block:
-                    self.code_content += part
-                else:
-                    if part:
-                        self.console.print(part, end="", markup=False)
+                    self._code_parts.append(part)
+                elif part:
+                    self._pending.append(part)
 
                 if index < len(parts) - 1:
                     self._toggle_code_block()
             return
 
         if self.in_code_block:
-            self.code_content += token
-        else:
-            self.console.print(token, end="", markup=False)
+            self._code_parts.append(token)
+            return
+
+        self._pending.append(token)
+        if now - self._last_flush >= self.flush_interval:
+            self._flush()
 
     def on_llm_end(self, response, **kwargs) -> None:
         """Handle end of LLM response.
@@ -53,9 +93,14 @@ class TerminalStreamHandler(BaseCallbackHandler):
             response: Final response from the model
             **kwargs: Additional keyword arguments
         """
+        self._flush()
+        self.finished_at = time.perf_counter()
         # Print final newline if not already printed
-        if self.full_response and not self.full_response.endswith("\n"):
+        last_part = next((part for part in reversed(self._parts) if part), "")
+        if last_part and not last_part.endswith("\n"):
             self.console.print()
+        if self.show_metrics and self.token_count:
+            self.console.print(f"[dim]{self.format_metrics()}[/dim]")
 
     def on_llm_error(self, error: Exception, **kwargs) -> None:
         """Handle LLM errors.
@@ -64,6 +109,7 @@ class TerminalStreamHandler(BaseCallbackHandler):
             error: Exception that occurred
             **kwargs: Additional keyword arguments
         """
+        self._flush()
         self.console.print(f"\n[bold red]Error:[/bold red] {str(error)}")
 
     def get_full_response(self) -> str:
@@ -74,16 +120,63 @@ class TerminalStreamHandler(BaseCallbackHandler):
         """
         return self.full_response
 
+    def get_metrics(self) -> Dict[str, Optional[float]]:
+        """Return time to first token, token count and throughput of the last call."""
+
+        end = self.finished_at or time.perf_counter()
+        ttft = self.first_token_at - self.started_at if self.first_token_at is not None else None
+        generation_time = end - self.first_token_at if self.first_token_at is not None else None
+        tokens_per_second = None
+        if generation_time and self.token_count > 1:
+            tokens_per_second = (self.token_count - 1) / generation_time
+        return {
+            "time_to_first_token": ttft,
+            "total_tokens": self.token_count,
+            "tokens_per_second": tokens_per_second,
+            "total_time": end - self.started_at,
+        }
+
+    def format_metrics(self) -> str:
+        metrics = self.get_metrics()
+        ttft = metrics["time_to_first_token"]
+        rate = metrics["tokens_per_second"]
+        parts = [
+            f"TTFT {ttft:.2f}s" if ttft is not None else "TTFT n/a",
+            f"{metrics['total_tokens']} tokens",
+        ]
+        if rate is not None:
+            parts.append(f"{rate:.1f} tok/s")
+        parts.append(f"total {metrics['total_time']:.2f}s")
+        return " · ".join(parts)
+
+    def _reset_metrics(self) -> None:
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.token_count = 0
+
+    def _flush(self) -> None:
+        """Render buffered plain text in a single console call."""
+
+        self._last_flush = time.perf_counter()
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        self.console.print(text, end="", markup=False)
+
     def _toggle_code_block(self) -> None:
         """Toggle code block state and render buffered code when closing."""
 
         if not self.in_code_block:
+            self._flush()
             self.in_code_block = True
-            self.code_content = ""
+            self._code_parts = []
             return
 
         self.in_code_block = False
-        if self.code_content.strip():
+        code_content = "".join(self._code_parts)
+        if code_content.strip():
             self.console.print("\n[bold blue]Code:[/bold blue]")
-            self.console.print(self.code_content, style="bold white on black")
-        self.code_content = ""
+            self.console.print(code_content, style="bold white on black")
+        self._code_parts = []
@@ -0,0 +1,357 @@
+"""One pooled HTTP client shared by every model, vision and download request.
+
+``ChatOpenAI`` and the vision ``OpenAI`` client would otherwise each open
+their own connection pool, paying extra TCP/TLS handshakes and bypassing
+any shared limit on concurrent connections. :func:`build_http_client`
+returns a single keep-alive ``httpx.Client`` (optionally HTTP/2) whose
+transport counts requests, new connections and TLS handshakes, so the
+connection reuse rate can be inspected with ``/stats``. Requests can be
+balanced over several endpoints and keys (:mod:`utils.load_balancer`) and
+slow deterministic calls can optionally be hedged (:class:`HedgingTransport`).
+The same pool limits are applied to the ``requests`` session that
+huggingface_hub uses to download embedding models.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from utils.llm_tracer import percentile
+from utils.load_balancer import EndpointPool, LoadBalancingTransport
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Thread-safe counters of HTTP requests and the connections they used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            'requests': 0,
+            'connections_opened': 0,
+            'tls_handshakes': 0,
+            'http2_requests': 0,
+            'errors': 0,
+            'hedge_eligible': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'hedge_capped': 0,
+        }
+        self._sections: Dict[str, Callable[[], Any]] = {}
+
+    def add(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def add_section(self, name: str, provider: Callable[[], Any]) -> None:
+        """Include ``provider()`` under ``name`` in every snapshot (e.g. per-endpoint health)."""
+
+        self._sections[name] = provider
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        requests = stats['requests']
+        stats['reused'] = max(0, requests - stats['connections_opened'])
+        stats['reuse_ratio'] = round(stats['reused'] / requests, 3) if requests else None
+        for name, provider in self._sections.items():
+            stats[name] = provider()
+        return stats
+
+
+def _download_pool_stats(session) -> Dict[str, int]:
+    """Requests and connections of the urllib3 pools behind a ``requests`` session."""
+
+    totals = {'requests': 0, 'connections_opened': 0}
+    for adapter in session.adapters.values():
+        pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+        if pools is None:
+            continue
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            totals['requests'] += getattr(pool, 'num_requests', 0)
+            totals['connections_opened'] += getattr(pool, 'num_connections', 0)
+    return totals
+
+
+class StatsTransport(httpx.BaseTransport):
+    """Pooled ``httpx.HTTPTransport`` that reports connection usage to :class:`ConnectionStats`.
+
+    New connections and TLS handshakes are observed through the httpcore
+    ``trace`` request extension, so any trace callback already set on a
+    request keeps working.
+    """
+
+    def __init__(self, stats: ConnectionStats, **transport_options):
+        self.stats = stats
+        self._transport = httpx.HTTPTransport(**transport_options)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        previous = request.extensions.get('trace')
+
+        def _trace(event: str, info: Dict[str, Any]) -> None:
+            if event == 'connection.connect_tcp.complete':
+                self.stats.add('connections_opened')
+            elif event == 'connection.start_tls.complete':
+                self.stats.add('tls_handshakes')
+            elif event == 'http2.send_request_headers.started':
+                self.stats.add('http2_requests')
+            if previous is not None:
+                previous(event, info)
+
+        request.extensions['trace'] = _trace
+        self.stats.add('requests')
+        try:
+            return self._transport.handle_request(request)
+        except httpx.TransportError:
+            self.stats.add('errors')
+            raise
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+def _close_response(future: Future) -> None:
+    if future.exception() is None:
+        future.result()[0].close()
+
+
+class HedgingTransport(httpx.BaseTransport):
+    """Sends a duplicate of a slow deterministic request; the first response wins.
+
+    Only temperature-0 chat completions are hedged, since either copy gives
+    the same answer. Once the time to response headers exceeds the
+    ``percentile`` of recent header latencies for the same host, model and
+    streaming flag (and at least ``min_delay`` seconds), one duplicate is
+    sent. The losing response is closed as soon as it arrives, which ends
+    its stream. Hedges are capped at ``max_ratio`` of eligible requests and
+    counted in :class:`ConnectionStats`.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        stats: ConnectionStats,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        min_delay: float = 1.0,
+        max_ratio: float = 0.1,
+        window: int = 200,
+        max_workers: int = 32,
+    ):
+        self._transport = transport
+        self.stats = stats
+        self.percentile = percentile
+        self.min_samples = max(1, min_samples)
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self._history: Dict[Tuple[Any, ...], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        self._eligible = 0
+        self._hedged = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http-hedge")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._hedge_key(request)
+        if key is None:
+            return self._transport.handle_request(request)
+        self.stats.add('hedge_eligible')
+        with self._lock:
+            self._eligible += 1
+        delay = self._hedge_delay(key)
+        if delay is None:
+            return self._record(key, *self._send(request))
+
+        primary = self._executor.submit(self._send, request)
+        try:
+            return self._record(key, *primary.result(timeout=delay))
+        except FutureTimeoutError:
+            pass
+        if not self._reserve_hedge():
+            self.stats.add('hedge_capped')
+            return self._record(key, *primary.result())
+
+        self.stats.add('hedged')
+        duplicate = self._executor.submit(self._send, self._clone(request))
+        pending = {primary, duplicate}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for other in (pending | done) - {future}:
+                    other.add_done_callback(_close_response)
+                if future is duplicate:
+                    self.stats.add('hedge_wins')
+                return self._record(key, *future.result())
+        raise error
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self._transport.close()
+
+    def _send(self, request: httpx.Request) -> Tuple[httpx.Response, float]:
+        started = time.perf_counter()
+        response = self._transport.handle_request(request)
+        return response, time.perf_counter() - started
+
+    def _record(self, key: Tuple[Any, ...], response: httpx.Response, latency: float) -> httpx.Response:
+        # Only responses actually used count; a discarded slow copy would skew the threshold.
+        if response.status_code == 200:
+            with self._lock:
+                self._history[key].append(latency)
+        return response
+
+    @staticmethod
+    def _hedge_key(request: httpx.Request) -> Optional[Tuple[Any, ...]]:
+        if request.method != 'POST' or not request.url.path.endswith('/chat/completions'):
+            return None
+        try:
+            payload = json.loads(request.read().decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+        if not isinstance(payload, dict) or payload.get('temperature') != 0 or (payload.get('n') or 1) != 1:
+            return None
+        return request.url.host, payload.get('model'), bool(payload.get('stream'))
+
+    def _hedge_delay(self, key: Tuple[Any, ...]) -> Optional[float]:
+        with self._lock:
+            samples = list(self._history[key])
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(samples, self.percentile))
+
+    def _reserve_hedge(self) -> bool:
+        with self._lock:
+            if self._hedged + 1 > self.max_ratio * self._eligible:
+                return False
+            self._hedged += 1
+            return True
+
+    @staticmethod
+    def _clone(request: httpx.Request) -> httpx.Request:
+        return httpx.Request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            content=request.read(),
+            extensions=dict(request.extensions),
+        )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_timeout(config: Optional[Dict[str, Any]]) -> httpx.Timeout:
+    config = config or {}
+    return httpx.Timeout(
+        float(config.get('timeout', 600)),
+        connect=float(config.get('connect_timeout', 10)),
+        pool=float(config.get('pool_timeout', 30)),
+    )
+
+
+def build_http_transport(
+    config: Optional[Dict[str, Any]],
+    stats: Optional[ConnectionStats] = None,
+    routes: Optional[Dict[str, EndpointPool]] = None,
+) -> httpx.BaseTransport:
+    """Pooled transport from the ``http`` config section.
+
+    ``routes`` maps logical base URLs to endpoint pools that requests are
+    balanced over; ``http.hedging.enabled`` adds request hedging on top.
+    """
+
+    config = config or {}
+    stats = stats or ConnectionStats()
+    http2 = bool(config.get('http2', False))
+    if http2 and not _http2_available():
+        logger.warning("http.http2 is enabled but the 'h2' package is not installed; using HTTP/1.1.")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=int(config.get('max_connections', 20)),
+        max_keepalive_connections=int(config.get('max_keepalive_connections', 10)),
+        keepalive_expiry=float(config.get('keepalive_expiry', 30)),
+    )
+    transport: httpx.BaseTransport = StatsTransport(
+        stats,
+        http2=http2,
+        limits=limits,
+        retries=int(config.get('connect_retries', 0)),
+    )
+    if routes:
+        balancer = LoadBalancingTransport(transport, routes)
+        stats.add_section('endpoints', balancer.snapshot)
+        transport = balancer
+    hedging = config.get('hedging') or {}
+    if not hedging.get('enabled', False):
+        return transport
+    return HedgingTransport(
+        transport,
+        stats,
+        percentile=float(hedging.get('percentile', 95)),
+        min_samples=int(hedging.get('min_samples', 20)),
+        min_delay=float(hedging.get('min_delay', 1.0)),
+        max_ratio=float(hedging.get('max_ratio', 0.1)),
+        window=int(hedging.get('window', 200)),
+        max_workers=2 * int(config.get('max_connections', 20)),
+    )
+
+
+def build_http_client(
+    config: Optional[Dict[str, Any]],
+    transport: Optional[httpx.BaseTransport] = None,
+) -> httpx.Client:
+    """Shared ``httpx.Client`` over ``transport`` (a pooled transport by default)."""
+
+    return httpx.Client(
+        transport=transport or build_http_transport(config),
+        timeout=build_timeout(config),
+    )
+
+
+def configure_download_session(config: Optional[Dict[str, Any]], stats: Optional[ConnectionStats] = None) -> bool:
+    """Route huggingface_hub downloads (embedding models) through one pooled ``requests`` session.
+
+    Returns ``False`` when huggingface_hub or requests is not installed.
+    """
+
+    try:
+        import requests
+        from huggingface_hub import configure_http_backend
+        from requests.adapters import HTTPAdapter
+    except ImportError:
+        return False
+
+    config = config or {}
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=int(config.get('max_keepalive_connections', 10)),
+        pool_maxsize=int(config.get('max_connections', 20)),
+        max_retries=int(config.get('connect_retries', 0)),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    configure_http_backend(backend_factory=lambda: session)
+    if stats is not None:
+        stats.add_section('downloads', lambda: _download_pool_stats(session))
+    return True
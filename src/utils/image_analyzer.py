@@ -2,28 +2,97 @@
 
 import base64
 import logging
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from openai import OpenAI
 
+from utils.llm_tracer import LLMTracer
+from utils.model_router import ModelRouter
+
 logger = logging.getLogger(__name__)
 
 
 class ImageAnalyzer:
     """Analyzes images using multimodal AI models."""
 
-    def __init__(self, api_key: str, base_url: str, model_name: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model_name: str,
+        tracer: Optional[LLMTracer] = None,
+        http_client=None,
+        model_router: Optional[ModelRouter] = None,
+    ):
         """Initialize image analyzer.
 
         Args:
             api_key: API key for the multimodal model.
             base_url: Base URL for the API.
             model_name: Name of the multimodal model.
+            tracer: Optional tracer recording latency and token usage per call.
+            http_client: Optional ``httpx.Client`` used for all API requests.
+            model_router: Optional per-stage routing of ``image_classify``
+                and ``image_analyze`` to other models or endpoints.
         """
         self.api_key = api_key
         self.base_url = base_url
         self.model_name = model_name
-        self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.tracer = tracer or LLMTracer()
+        self.model_router = model_router
+        self._http_client = http_client
+        self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
+        self._routed_clients: Dict[Tuple[str, str], OpenAI] = {}
+        self._routed_lock = threading.Lock()
+
+    def _client_for(self, stage: str) -> Tuple[OpenAI, str]:
+        """Client and model for ``stage``, following the model router when one is set."""
+
+        if self.model_router is None or self.model_router.is_default(stage):
+            return self._client, self.model_name
+        route = self.model_router.route(stage)
+        with self._routed_lock:
+            key = (route.base_url, route.api_key)
+            if key not in self._routed_clients:
+                self._routed_clients[key] = OpenAI(
+                    api_key=route.api_key,
+                    base_url=route.base_url,
+                    http_client=self._http_client,
+                )
+            return self._routed_clients[key], route.model
+
+    def _create_completion(self, stage: str, module: Optional[str], messages: List[dict]):
+        """Call the chat completions API and record a trace entry."""
+
+        client, model_name = self._client_for(stage)
+        started = time.perf_counter()
+        try:
+            completion = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+            )
+        except Exception as exc:
+            self.tracer.record(
+                stage=stage,
+                module=module,
+                model=model_name,
+                latency=time.perf_counter() - started,
+                error=str(exc),
+            )
+            raise
+
+        usage = getattr(completion, 'usage', None)
+        self.tracer.record(
+            stage=stage,
+            module=module,
+            model=getattr(completion, 'model', None) or model_name,
+            latency=time.perf_counter() - started,
+            prompt_tokens=getattr(usage, 'prompt_tokens', None),
+            completion_tokens=getattr(usage, 'completion_tokens', None),
+        )
+        return completion
 
     def encode_image(self, image_file) -> Optional[str]:
         """Encode image file to base64 string.
@@ -64,9 +133,10 @@ class ImageAnalyzer:
 
             image_url = f"data:image/{image_type};base64,{base64_image}"
 
-            completion = self._client.chat.completions.create(
-                model=self.model_name,
-                messages=[
+            completion = self._create_completion(
+                'image_analyze',
+                getattr(image_file, 'name', None),
+                [
                     {
                         "role": "system",
                         "content": "你是 Kimi，多模态分析助手。",
@@ -111,9 +181,10 @@ class ImageAnalyzer:
                 return candidate_keys[0] if candidate_keys else None
 
             image_url = f"data:image/{image_type};base64,{base64_image}"
-            completion = self._client.chat.completions.create(
-                model=self.model_name,
-                messages=[
+            completion = self._create_completion(
+                'image_classify',
+                getattr(image_file, 'name', None),
+                [
                     {
                         "role": "system",
                         "content": "你是一名图像分类助手，只能回答候选类别中的一个 key。",
@@ -0,0 +1,316 @@
+"""Record/replay of LLM and vision HTTP traffic via an httpx transport.
+
+In ``record`` mode every request made through the shared ``httpx.Client`` is
+forwarded to the real endpoint and the response (including each streamed
+SSE chunk and its timing) is appended to a JSONL cassette. In ``replay``
+mode responses are served from the cassette without touching the network,
+with their original, compressed or no timing.
+
+Replay matches requests by method, path and body. Prompts that embed
+run-specific text (timestamps in generated files, for example) fall back to
+the next unused recording for the same endpoint, model and streaming flag,
+in recorded order, unless ``strict`` is set.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+from utils.llm_tracer import mark_cache_hit
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = {"off", "record", "replay"}
+REPLAY_TIMINGS = {"original", "compressed", "none"}
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def request_key(method: str, url: httpx.URL, body: bytes) -> str:
+    """Stable identity of a request: method, path and canonical JSON body."""
+
+    try:
+        canonical = json.dumps(json.loads(body.decode('utf-8')), sort_keys=True, ensure_ascii=False)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        canonical = body.decode('latin-1')
+    digest = hashlib.sha256(f"{method.upper()} {url.path}\n{canonical}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _describe_body(body: bytes) -> Dict[str, Any]:
+    """Small human-readable summary of a request body (images are not stored)."""
+
+    try:
+        payload = json.loads(body.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return {"bytes": len(body)}
+    messages = payload.get('messages') or []
+    last = messages[-1].get('content') if messages else ''
+    if isinstance(last, list):
+        last = " ".join(part.get('text', '') for part in last if isinstance(part, dict))
+    return {
+        "model": payload.get('model'),
+        "stream": bool(payload.get('stream')),
+        "messages": len(messages),
+        "last_message": str(last)[:200],
+    }
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes chunks through while capturing them with their arrival offsets."""
+
+    def __init__(self, inner: httpx.SyncByteStream, started: float, on_close):
+        self._inner = inner
+        self._started = started
+        self._on_close = on_close
+        self._chunks: List[List[Any]] = []
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._inner:
+            self._chunks.append([round(time.perf_counter() - self._started, 4), chunk])
+            yield chunk
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._inner.close()
+        finally:
+            self._on_close(self._chunks)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Yields recorded chunks, sleeping between them according to the timing mode."""
+
+    def __init__(self, chunks: List[List[Any]], header_offset: float, scale: float):
+        self._chunks = chunks
+        self._header_offset = header_offset
+        self._scale = scale
+
+    def __iter__(self) -> Iterator[bytes]:
+        previous = self._header_offset
+        for offset, data in self._chunks:
+            if self._scale:
+                time.sleep(max(0.0, offset - previous) * self._scale)
+            previous = offset
+            yield base64.b64decode(data)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records to or replays from a JSONL cassette.
+
+    Args:
+        path: Cassette file; appended to in record mode, read in replay mode.
+        mode: ``record`` or ``replay``.
+        timing: Replay pacing: ``original`` (recorded delays), ``compressed``
+            (delays divided by ``speedup``) or ``none``.
+        speedup: Divisor applied to recorded delays with ``compressed`` timing.
+        strict: In replay mode, fail on requests without an exact match
+            instead of falling back to recorded order.
+        transport: Underlying transport for record mode.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        timing: str = "compressed",
+        speedup: float = 10.0,
+        strict: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        if mode not in {"record", "replay"}:
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        if timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unsupported replay timing: {timing}")
+        self.path = Path(path).expanduser()
+        self.mode = mode
+        self.timing = timing
+        self.speedup = max(1.0, float(speedup or 1.0))
+        self.strict = strict
+        self._transport = transport or httpx.HTTPTransport()
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        self._used: set = set()
+        if mode == "replay":
+            self._load()
+
+    @property
+    def scale(self) -> float:
+        if self.timing == "original":
+            return 1.0
+        if self.timing == "compressed":
+            return 1.0 / self.speedup
+        return 0.0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        key = request_key(request.method, request.url, body)
+        if self.mode == "replay":
+            return self._replay(request, key, body)
+        return self._record(request, key, body)
+
+    def close(self) -> None:
+        self._transport.close()
+
+    # ------------------------------------------------------------------
+    # Record
+    # ------------------------------------------------------------------
+
+    def _record(self, request: httpx.Request, key: str, body: bytes) -> httpx.Response:
+        # Ask for an uncompressed body so recorded chunks replay byte-for-byte.
+        request.headers['Accept-Encoding'] = 'identity'
+        started = time.perf_counter()
+        response = self._transport.handle_request(request)
+        header_offset = round(time.perf_counter() - started, 4)
+
+        def _store(chunks: List[List[Any]]) -> None:
+            entry = {
+                "key": key,
+                "recorded_at": datetime.now().isoformat(),
+                "request": {
+                    "method": request.method,
+                    "url": str(request.url.copy_with(query=None)),
+                    "summary": _describe_body(body),
+                },
+                "response": {
+                    "status": response.status_code,
+                    "headers": [
+                        [name, value]
+                        for name, value in response.headers.multi_items()
+                        if name.lower() not in {'content-length', 'transfer-encoding', 'content-encoding', 'connection'}
+                    ],
+                    "header_offset": header_offset,
+                    "chunks": [[offset, base64.b64encode(data).decode('ascii')] for offset, data in chunks],
+                },
+            }
+            line = json.dumps(entry, ensure_ascii=False)
+            with self._lock:
+                try:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    with self.path.open('a', encoding='utf-8') as handle:
+                        handle.write(line + "\n")
+                except OSError as exc:
+                    logger.warning("Failed to write cassette %s: %s", self.path, exc)
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, _store),
+            extensions=response.extensions,
+        )
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with self.path.open('r', encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._by_key[entry['key']].append(len(self._entries))
+                self._entries.append(entry)
+
+    def _match(self, request: httpx.Request, key: str, body: bytes) -> Optional[Dict[str, Any]]:
+        queue = self._by_key.get(key)
+        if queue:
+            # Keep the last response so repeated identical calls keep working.
+            index = queue.popleft() if len(queue) > 1 else queue[0]
+            self._used.add(index)
+            return self._entries[index]
+        if self.strict:
+            return None
+
+        summary = _describe_body(body)
+        path = request.url.path
+        for index, entry in enumerate(self._entries):
+            if index in self._used:
+                continue
+            recorded = entry['request']
+            recorded_summary = recorded.get('summary') or {}
+            if (
+                httpx.URL(recorded['url']).path == path
+                and recorded_summary.get('model') == summary.get('model')
+                and recorded_summary.get('stream') == summary.get('stream')
+            ):
+                self._used.add(index)
+                if index in self._by_key[entry['key']]:
+                    self._by_key[entry['key']].remove(index)
+                logger.info("Cassette: no exact match for %s, replaying recording #%d in order", path, index)
+                return entry
+        return None
+
+    def _replay(self, request: httpx.Request, key: str, body: bytes) -> httpx.Response:
+        with self._lock:
+            entry = self._match(request, key, body)
+        if entry is None:
+            message = (
+                f"No recorded response for {request.method} {request.url.path} in {self.path}; "
+                "re-record the cassette after changing prompts or configuration."
+            )
+            logger.error(message)
+            raise CassetteMissError(message)
+
+        recorded = entry['response']
+        mark_cache_hit()
+        scale = self.scale
+        if scale:
+            time.sleep(float(recorded.get('header_offset') or 0.0) * scale)
+        return httpx.Response(
+            status_code=recorded['status'],
+            headers=recorded.get('headers') or [],
+            stream=_ReplayStream(recorded.get('chunks') or [], float(recorded.get('header_offset') or 0.0), scale),
+        )
+
+
+def build_cassette_client(
+    config: Optional[Dict[str, Any]],
+    timeout: Union[float, httpx.Timeout] = 600.0,
+    transport: Optional[httpx.BaseTransport] = None,
+) -> Optional[httpx.Client]:
+    """Create an ``httpx.Client`` backed by a cassette, or ``None`` when disabled.
+
+    ``transport`` carries the real requests in record mode (e.g. the shared
+    connection pool).
+    """
+
+    config = config or {}
+    mode = (config.get('mode') or 'off').lower()
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unsupported cassette mode: {mode}")
+    if mode == 'off':
+        return None
+    path = config.get('path') or './output/cassettes/session.jsonl'
+    transport = CassetteTransport(
+        path,
+        mode=mode,
+        timing=(config.get('timing') or 'compressed').lower(),
+        speedup=float(config.get('speedup', 10) or 10),
+        strict=bool(config.get('strict', False)),
+        transport=transport,
+    )
+    return httpx.Client(transport=transport, timeout=timeout)
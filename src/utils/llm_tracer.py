@@ -0,0 +1,240 @@
+"""Per-call tracing of LLM and vision requests into a JSONL file."""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+from utils.token_counter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Set by cache layers below the model client (e.g. cassette replay); consumed by
+# the next trace record made on the same thread.
+_cache_marks = threading.local()
+
+
+def mark_cache_hit() -> None:
+    """Flag the call in progress on this thread as served from a cache."""
+
+    _cache_marks.hit = True
+
+
+def _consume_cache_mark() -> bool:
+    hit = getattr(_cache_marks, 'hit', False)
+    _cache_marks.hit = False
+    return hit
+
+
+class LLMTracer:
+    """Records stage, latency, token usage and cache status for every model call.
+
+    A tracer without a path is a no-op, so components can always call it.
+    """
+
+    def __init__(self, path: Optional[str] = None, session_id: Optional[str] = None):
+        self.path = Path(path).expanduser() if path else None
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def config(
+        self,
+        stage: str,
+        module: Optional[str] = None,
+        callbacks: Optional[List[Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Build a LangChain invoke config carrying a tracing callback for one stage."""
+
+        handlers = list(callbacks or [])
+        if self.enabled:
+            handlers.append(_TraceCallback(self, stage, module))
+        return {'callbacks': handlers} if handlers else None
+
+    def record(
+        self,
+        stage: str,
+        latency: float,
+        module: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        usage_estimated: bool = False,
+        cache: str = "miss",
+        error: Optional[str] = None,
+    ) -> None:
+        if _consume_cache_mark() and not error:
+            cache = "hit"
+        if not self.enabled:
+            return
+
+        entry = {
+            "ts": datetime.utcnow().isoformat(),
+            "session": self.session_id,
+            "stage": stage,
+            "module": module,
+            "model": model,
+            "latency": round(latency, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "usage_estimated": usage_estimated,
+            "cache": cache,
+            "error": error,
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open('a', encoding='utf-8') as handle:
+                    handle.write(line + "\n")
+            except OSError as exc:
+                logger.warning("Failed to write LLM trace %s: %s", self.path, exc)
+
+    def load(self, session_only: bool = False) -> List[Dict[str, Any]]:
+        """Read trace records from disk, optionally only for this session."""
+
+        if not self.path or not self.path.exists():
+            return []
+        records = load_traces(self.path)
+        if session_only:
+            records = [record for record in records if record.get('session') == self.session_id]
+        return records
+
+
+def load_traces(path: Path) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    with Path(path).open('r', encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values`` (pct in 0..100)."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def aggregate_traces(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Aggregate trace records into per-stage latency percentiles and token totals.
+
+    Cache hits count as calls but are left out of the latency percentiles.
+    """
+
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        grouped.setdefault(record.get('stage') or 'unknown', []).append(record)
+
+    stats: Dict[str, Dict[str, Any]] = {}
+    for stage, items in grouped.items():
+        latencies = [
+            float(item.get('latency') or 0)
+            for item in items
+            if not item.get('error') and item.get('cache') != 'hit'
+        ]
+        stats[stage] = {
+            "calls": len(items),
+            "errors": sum(1 for item in items if item.get('error')),
+            "cache_hits": sum(1 for item in items if item.get('cache') == 'hit'),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "total_latency": sum(latencies),
+            "prompt_tokens": sum(int(item.get('prompt_tokens') or 0) for item in items),
+            "completion_tokens": sum(int(item.get('completion_tokens') or 0) for item in items),
+        }
+    return stats
+
+
+class _TraceCallback(BaseCallbackHandler):
+    """LangChain callback that reports one traced call per run to the tracer."""
+
+    def __init__(self, tracer: LLMTracer, stage: str, module: Optional[str]):
+        self.tracer = tracer
+        self.stage = stage
+        self.module = module
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs) -> None:
+        prompt_text = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._start(serialized, prompt_text, run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs) -> None:
+        self._start(serialized, "\n".join(prompts), run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+
+        prompt_tokens, completion_tokens = self._extract_usage(response)
+        estimated = prompt_tokens is None
+        if estimated:
+            text = "".join(
+                generation.text for generations in response.generations for generation in generations
+            )
+            prompt_tokens = estimate_tokens(run['prompt'])
+            completion_tokens = estimate_tokens(text)
+
+        llm_output = response.llm_output or {}
+        self.tracer.record(
+            stage=self.stage,
+            module=self.module,
+            model=llm_output.get('model_name') or run['model'],
+            latency=time.perf_counter() - run['started'],
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            usage_estimated=estimated,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        self.tracer.record(
+            stage=self.stage,
+            module=self.module,
+            model=run['model'],
+            latency=time.perf_counter() - run['started'],
+            error=str(error),
+        )
+
+    def _start(self, serialized: Dict[str, Any], prompt_text: str, run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get('invocation_params') or {}
+        model = params.get('model_name') or params.get('model') or (serialized or {}).get('kwargs', {}).get('model_name')
+        self._runs[run_id] = {'started': time.perf_counter(), 'prompt': prompt_text, 'model': model}
+
+    @staticmethod
+    def _extract_usage(response) -> tuple:
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if usage.get('prompt_tokens') is not None:
+            return usage.get('prompt_tokens'), usage.get('completion_tokens')
+
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if metadata:
+                    return metadata.get('input_tokens'), metadata.get('output_tokens')
+        return None, None
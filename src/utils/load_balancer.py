@@ -0,0 +1,207 @@
+"""Weighted load balancing of model requests over several endpoints and API keys.
+
+Clients keep talking to one logical base URL; :class:`LoadBalancingTransport`
+rewrites every request under it to one endpoint of the pool (its own base
+URL and ``Authorization`` key), chosen by smooth weighted round-robin among
+healthy endpoints. Each endpoint has a circuit breaker: consecutive
+connection errors or 5xx responses open it for a cooldown, a 429 opens it
+for the ``Retry-After`` period, and after the cooldown one trial request
+decides whether it closes again. Failed attempts fail over to the next
+endpoint before the response reaches the caller.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Responses that count against an endpoint (bad key, rate limit, server error) and fail over.
+FAILOVER_STATUS = {401, 403, 429, 500, 502, 503, 504}
+
+
+@dataclass(eq=False)
+class Endpoint:
+    base_url: str
+    api_key: str
+    weight: int = 1
+    # Circuit breaker and balancing state.
+    state: str = "closed"  # closed / open / half_open
+    failures: int = 0
+    open_until: float = 0.0
+    trial_in_flight: bool = False
+    current_weight: int = 0
+    stats: Dict[str, int] = field(default_factory=lambda: {'requests': 0, 'failures': 0, 'rate_limited': 0, 'opened': 0})
+
+    @property
+    def label(self) -> str:
+        """Base URL plus the last characters of the key, safe to print."""
+
+        return f"{self.base_url} (key …{self.api_key[-4:]})" if self.api_key else self.base_url
+
+
+def parse_endpoints(raw: Optional[List[Dict[str, Any]]], default_api_key: Optional[str] = None) -> List[Endpoint]:
+    """Endpoints from an ``app.endpoints`` style list; a missing key falls back to ``default_api_key``."""
+
+    endpoints = []
+    for item in raw or []:
+        if not isinstance(item, dict) or not item.get('base_url'):
+            continue
+        api_key = item.get('api_key') or default_api_key
+        if not api_key:
+            raise ValueError(f"Endpoint {item['base_url']} has no api_key")
+        endpoints.append(
+            Endpoint(
+                base_url=str(item['base_url']).rstrip('/'),
+                api_key=str(api_key),
+                weight=max(1, int(item.get('weight', 1))),
+            )
+        )
+    return endpoints
+
+
+class EndpointPool:
+    """Healthy-endpoint selection with per-endpoint circuit breakers."""
+
+    def __init__(self, endpoints: List[Endpoint], failure_threshold: int = 3, cooldown: float = 30.0):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: List[Endpoint]) -> Endpoint:
+        """Next endpoint by smooth weighted round-robin, skipping open circuits and ``exclude``.
+
+        When every circuit is open the one that reopens first is used, so
+        requests degrade to retries instead of failing outright.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for endpoint in self.endpoints:
+                if endpoint in exclude:
+                    continue
+                if endpoint.state == 'open' and now >= endpoint.open_until:
+                    endpoint.state = 'half_open'
+                if endpoint.state == 'closed' or (endpoint.state == 'half_open' and not endpoint.trial_in_flight):
+                    candidates.append(endpoint)
+            if not candidates:
+                remaining = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+                chosen = min(remaining, key=lambda endpoint: endpoint.open_until)
+            else:
+                total = sum(endpoint.weight for endpoint in candidates)
+                for endpoint in candidates:
+                    endpoint.current_weight += endpoint.weight
+                chosen = max(candidates, key=lambda endpoint: endpoint.current_weight)
+                chosen.current_weight -= total
+            if chosen.state == 'half_open':
+                chosen.trial_in_flight = True
+            chosen.stats['requests'] += 1
+            return chosen
+
+    def record_success(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            if endpoint.state != 'closed':
+                logger.info("Endpoint %s recovered; closing its circuit.", endpoint.label)
+            endpoint.state = 'closed'
+            endpoint.failures = 0
+            endpoint.trial_in_flight = False
+
+    def record_failure(self, endpoint: Endpoint, reason: str, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            endpoint.stats['failures'] += 1
+            endpoint.failures += 1
+            endpoint.trial_in_flight = False
+            if retry_after is not None:
+                endpoint.stats['rate_limited'] += 1
+            if retry_after is None and endpoint.state == 'closed' and endpoint.failures < self.failure_threshold:
+                return
+            endpoint.state = 'open'
+            endpoint.open_until = time.monotonic() + (retry_after if retry_after is not None else self.cooldown)
+            endpoint.stats['opened'] += 1
+        logger.warning("Endpoint %s unavailable (%s); circuit open.", endpoint.label, reason)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"endpoint": endpoint.label, "weight": endpoint.weight, "state": endpoint.state, **endpoint.stats}
+                for endpoint in self.endpoints
+            ]
+
+
+class LoadBalancingTransport(httpx.BaseTransport):
+    """Routes requests under each logical base URL to an :class:`EndpointPool`.
+
+    Requests outside every logical base URL pass through unchanged.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, routes: Dict[str, EndpointPool]):
+        self._transport = transport
+        self.routes = {base_url.rstrip('/'): pool for base_url, pool in routes.items()}
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        match = next((base for base in self.routes if url.startswith(base + '/') or url == base), None)
+        if match is None:
+            return self._transport.handle_request(request)
+
+        pool = self.routes[match]
+        body = request.read()
+        tried: List[Endpoint] = []
+        response: Optional[httpx.Response] = None
+        for attempt in range(len(pool.endpoints)):
+            if response is not None:
+                response.close()
+                response = None
+            endpoint = pool.acquire(tried)
+            tried.append(endpoint)
+            try:
+                response = self._transport.handle_request(self._rewrite(request, body, match, endpoint))
+            except httpx.TransportError as exc:
+                pool.record_failure(endpoint, type(exc).__name__)
+                if attempt == len(pool.endpoints) - 1:
+                    raise
+                continue
+
+            if response.status_code not in FAILOVER_STATUS:
+                pool.record_success(endpoint)
+                return response
+            retry_after = _retry_after(response, pool.cooldown) if response.status_code == 429 else None
+            pool.record_failure(endpoint, f"HTTP {response.status_code}", retry_after)
+        # Every endpoint failed this request: surface the last error response.
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {base_url: pool.snapshot() for base_url, pool in self.routes.items()}
+
+    @staticmethod
+    def _rewrite(request: httpx.Request, body: bytes, base_url: str, endpoint: Endpoint) -> httpx.Request:
+        headers = httpx.Headers(request.headers)
+        headers.pop('host', None)
+        headers['Authorization'] = f"Bearer {endpoint.api_key}"
+        return httpx.Request(
+            request.method,
+            endpoint.base_url + str(request.url)[len(base_url):],
+            headers=headers,
+            content=body,
+            extensions=dict(request.extensions),
+        )
+
+
+def _retry_after(response: httpx.Response, default: float) -> float:
+    try:
+        return max(0.0, float(response.headers.get('retry-after', default)))
+    except ValueError:
+        return default
@@ -0,0 +1,104 @@
+"""Per-stage model and endpoint routing from the ``routing`` config section.
+
+Lightweight stages (``infer_level``, ``image_classify``, ``condense`` ...)
+can run on a faster or cheaper model while heavy stages such as
+``builder`` keep the default. A stage without a route uses the default
+chat model, or the default vision model for the image stages.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ROUTED_STAGES = (
+    'planner',
+    'builder',
+    'review',
+    'infer_level',
+    'image_classify',
+    'image_analyze',
+    'chat',
+    'condense',
+)
+IMAGE_STAGES = ('image_classify', 'image_analyze')
+
+# Traced stages that follow the route of a routed stage.
+STAGE_ALIASES = {
+    'ask': 'chat',
+    'metric': 'review',
+    'history_summary': 'condense',
+}
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    model: str
+    base_url: str
+    api_key: str
+
+
+class ModelRouter:
+    """Resolves the :class:`ModelRoute` of each pipeline stage."""
+
+    def __init__(
+        self,
+        default: ModelRoute,
+        image_default: Optional[ModelRoute] = None,
+        routes: Optional[Dict[str, ModelRoute]] = None,
+    ):
+        self.default = default
+        self.image_default = image_default or default
+        self.routes = dict(routes or {})
+
+    def route(self, stage: Optional[str]) -> ModelRoute:
+        stage = STAGE_ALIASES.get(stage or '', stage)
+        if stage in self.routes:
+            return self.routes[stage]
+        return self.image_default if stage in IMAGE_STAGES else self.default
+
+    def is_default(self, stage: Optional[str]) -> bool:
+        stage = STAGE_ALIASES.get(stage or '', stage)
+        return stage not in self.routes
+
+    def describe(self) -> Dict[str, str]:
+        """``stage -> model @ base_url`` for every routed stage, for status output."""
+
+        return {stage: f"{route.model} @ {route.base_url}" for stage, route in self.routes.items()}
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Optional[Dict[str, Any]],
+        default: ModelRoute,
+        image_default: Optional[ModelRoute] = None,
+    ) -> 'ModelRouter':
+        """Build a router from ``routing: {stage: {model, base_url, api_key}}``.
+
+        ``base_url`` and ``api_key`` fall back to the stage's default route;
+        a stage may also be given as a bare model name.
+        """
+
+        image_default = image_default or default
+        routes: Dict[str, ModelRoute] = {}
+        for stage, raw in (config or {}).items():
+            if stage not in ROUTED_STAGES:
+                logger.warning("Ignoring routing for unknown stage %s (known: %s).", stage, ", ".join(ROUTED_STAGES))
+                continue
+            if isinstance(raw, str):
+                raw = {'model': raw}
+            if not isinstance(raw, dict) or not any(raw.get(key) for key in ('model', 'base_url')):
+                continue
+            fallback = image_default if stage in IMAGE_STAGES else default
+            base_url = str(raw.get('base_url') or fallback.base_url).rstrip('/')
+            # A different endpoint without its own key reuses the default key.
+            api_key = raw.get('api_key') or fallback.api_key
+            routes[stage] = ModelRoute(
+                model=str(raw.get('model') or fallback.model),
+                base_url=base_url,
+                api_key=str(api_key),
+            )
+        return cls(default, image_default, routes)
@@ -0,0 +1,396 @@
+"""Local OpenAI-compatible stub server for offline runs and benchmarks.
+
+Speaks the ``/v1/chat/completions`` API used by ``ChatOpenAI`` and
+``ImageAnalyzer`` (including SSE streaming) and answers with rule-generated
+planner, builder, review and vision replies. Latency, token rate, server
+errors and 429 rate limiting can be injected.
+
+Run standalone with ``python -m utils.stub_openai_server --port 8799`` (from
+``src/``) or start it in-process via ``cli.py --stub``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.token_counter import estimate_tokens
+
+DEFAULT_STUB_MODEL = "stub-model"
+
+
+@dataclass
+class StubBehavior:
+    """Knobs that shape how the stub answers.
+
+    Attributes:
+        latency: Seconds to wait before the first byte of every response.
+        token_rate: Streamed tokens per second; 0 streams as fast as possible.
+        chunk_chars: Characters per streamed chunk (one chunk ≈ one token).
+        error_rate: Probability of answering with HTTP 500.
+        rate_limit_rate: Probability of answering with HTTP 429.
+        retry_after: ``Retry-After`` seconds sent with injected 429s.
+        straggler_rate: Probability of an extra first-byte delay (provider queueing).
+        straggler_latency: Seconds added to straggler responses.
+        seed: Seed for the error/429 dice so runs are reproducible.
+        responses: Canned replies; the first entry whose ``match`` substring
+            occurs in the last user message wins over the built-in rules.
+    """
+
+    latency: float = 0.0
+    token_rate: float = 0.0
+    chunk_chars: int = 4
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    straggler_rate: float = 0.0
+    straggler_latency: float = 0.0
+    seed: Optional[int] = None
+    responses: List[Dict[str, str]] = field(default_factory=list)
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> 'StubBehavior':
+        config = config or {}
+        responses = list(config.get('responses') or [])
+        responses_file = config.get('responses_file')
+        if responses_file:
+            responses.extend(load_canned_responses(responses_file))
+        return cls(
+            latency=float(config.get('latency', 0.0) or 0.0),
+            token_rate=float(config.get('token_rate', 0.0) or 0.0),
+            chunk_chars=max(1, int(config.get('chunk_chars', 4) or 4)),
+            error_rate=float(config.get('error_rate', 0.0) or 0.0),
+            rate_limit_rate=float(config.get('rate_limit_rate', 0.0) or 0.0),
+            retry_after=float(config.get('retry_after', 1.0) or 0.0),
+            straggler_rate=float(config.get('straggler_rate', 0.0) or 0.0),
+            straggler_latency=float(config.get('straggler_latency', 0.0) or 0.0),
+            seed=config.get('seed'),
+            responses=responses,
+        )
+
+
+def load_canned_responses(path: str) -> List[Dict[str, str]]:
+    """Load ``[{"match": ..., "reply": ...}]`` entries from a JSON or YAML file."""
+
+    file_path = Path(path).expanduser()
+    text = file_path.read_text(encoding='utf-8')
+    if file_path.suffix.lower() in {'.yaml', '.yml'}:
+        import yaml
+
+        payload = yaml.safe_load(text) or []
+    else:
+        payload = json.loads(text)
+    return [item for item in payload if isinstance(item, dict) and 'reply' in item]
+
+
+# ----------------------------------------------------------------------
+# Rule-generated replies
+# ----------------------------------------------------------------------
+
+def _message_text(message: Dict[str, Any]) -> Tuple[str, bool]:
+    """Return the text of a message and whether it carries an image part."""
+
+    content = message.get('content')
+    if isinstance(content, list):
+        texts = [part.get('text', '') for part in content if isinstance(part, dict)]
+        has_image = any(isinstance(part, dict) and part.get('type') == 'image_url' for part in content)
+        return "\n".join(texts), has_image
+    return str(content or ''), False
+
+
+def _stable_int(text: str, modulo: int) -> int:
+    return int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16) % modulo
+
+
+def _planner_reply(prompt: str) -> str:
+    match = re.search(r'(\d+)\s*(?:-\s*\d+)?\s*个', prompt)
+    count = int(match.group(1)) if match else 3
+    headings: List[str] = []
+    for line in prompt.splitlines():
+        stripped = line.strip()
+        if not stripped.startswith('#') or re.match(r'^###\s+\w+:', stripped):
+            continue
+        title = stripped.lstrip('#').strip()
+        if title and title not in headings:
+            headings.append(title[:30])
+    modules = headings[:count]
+    while len(modules) < count:
+        modules.append(f"功能模块{len(modules) + 1}")
+    return "\n".join(f"- {name}" for name in modules)
+
+
+def _builder_reply(prompt: str) -> str:
+    module_match = re.search(r'「(.+?)」', prompt)
+    module = module_match.group(1) if module_match else "通用模块"
+    keys = [key for key in re.findall(r'key=(\w+)', prompt) if key != 'title'] or ['steps', 'expected']
+    count = 1 if '冒烟' in prompt else 3
+    cases = []
+    for index in range(1, count + 1):
+        case = {"title": f"{module} 场景 {index}"}
+        for key in keys:
+            case[key] = f"{module} 的{key}（场景 {index}）"
+        cases.append(case)
+    return json.dumps({"module_goal": f"验证{module}的核心功能", "cases": cases}, ensure_ascii=False)
+
+
+def _review_reply(prompt: str) -> str:
+    score = 60 + _stable_int(prompt, 40)
+    return json.dumps(
+        {
+            "score": score,
+            "summary": "覆盖主流程，异常与性能场景较少。",
+            "risks": ["缺少异常输入用例", "未覆盖并发场景"],
+        },
+        ensure_ascii=False,
+    )
+
+
+def _classifier_reply(prompt: str) -> str:
+    match = re.search(r'候选类别[^：:]*[：:]\s*([^\n。]+)', prompt)
+    if match:
+        for token in re.split(r'[\s,，、/]+', match.group(1)):
+            if re.fullmatch(r'[a-z_]+', token):
+                return token
+    return "image"
+
+
+def generate_reply(messages: List[Dict[str, Any]], behavior: Optional[StubBehavior] = None) -> str:
+    """Produce a deterministic reply for a chat-completions request."""
+
+    system_text = "\n".join(_message_text(m)[0] for m in messages if m.get('role') == 'system')
+    user_messages = [m for m in messages if m.get('role') != 'system'] or messages
+    prompt, has_image = _message_text(user_messages[-1]) if user_messages else ("", False)
+
+    for entry in (behavior.responses if behavior else []):
+        if str(entry.get('match', '')) in prompt:
+            return str(entry['reply'])
+
+    if has_image:
+        if '分类' in system_text:
+            return _classifier_reply(prompt)
+        return "图片包含若干模块与连线：入口、处理节点与结果输出。潜在风险：异常分支未标注。"
+    if '"level"' in prompt:
+        return json.dumps({"level": 1 + _stable_int(prompt, 8)})
+    if 'module_goal' in prompt:
+        return _builder_reply(prompt)
+    if 'score' in prompt:
+        return _review_reply(prompt)
+    if '模块' in prompt and ('列出' in prompt or '挑选' in prompt):
+        return _planner_reply(prompt)
+    last_line = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+    return f"stub reply: {last_line[:80]}"
+
+
+# ----------------------------------------------------------------------
+# HTTP server
+# ----------------------------------------------------------------------
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    behavior: StubBehavior
+    rng: random.Random
+    rng_lock: threading.Lock
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": DEFAULT_STUB_MODEL, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "not_found"}})
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "not_found"}})
+            return
+        try:
+            body = json.loads(raw.decode('utf-8') or '{}')
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            self._send_json(400, {"error": {"message": f"Invalid JSON: {exc}", "type": "invalid_request_error"}})
+            return
+
+        behavior = self.behavior
+        if behavior.latency:
+            time.sleep(behavior.latency)
+
+        with self.rng_lock:
+            roll = self.rng.random()
+            # Only draw for stragglers when enabled, so seeded fault sequences match runs without them.
+            straggler = behavior.straggler_rate > 0 and self.rng.random() < behavior.straggler_rate
+        if straggler and behavior.straggler_latency:
+            time.sleep(behavior.straggler_latency)
+        if roll < behavior.rate_limit_rate:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (injected).", "type": "rate_limit_error"}},
+                headers={'Retry-After': f"{behavior.retry_after:g}"},
+            )
+            return
+        if roll < behavior.rate_limit_rate + behavior.error_rate:
+            self._send_json(500, {"error": {"message": "Internal error (injected).", "type": "server_error"}})
+            return
+
+        messages = body.get('messages') or []
+        model = body.get('model') or DEFAULT_STUB_MODEL
+        reply = generate_reply(messages, behavior)
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(_message_text(m)[0]) + 4 for m in messages),
+            "completion_tokens": estimate_tokens(reply),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if body.get('stream'):
+            include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+            self._stream(completion_id, model, reply, usage if include_usage else None)
+            return
+
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - stdlib signature
+        return
+
+    def _stream(self, completion_id: str, model: str, reply: str, usage: Optional[Dict[str, int]]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # Chunked framing keeps the connection open for reuse, like real endpoints.
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def _write(data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        def _chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> None:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                **extra,
+            }
+            _write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        step = self.behavior.chunk_chars
+        delay = 1.0 / self.behavior.token_rate if self.behavior.token_rate > 0 else 0.0
+        _chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(reply), step):
+            if delay:
+                time.sleep(delay)
+            _chunk({"content": reply[start:start + step]})
+        _chunk({}, "stop")
+        if usage is not None:
+            _chunk(None, usage=usage)
+        _write(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_stub_server(
+    behavior: Optional[StubBehavior] = None,
+    host: str = "127.0.0.1",
+    port: int = 8799,
+) -> ThreadingHTTPServer:
+    """Bind a stub server; ``port=0`` picks a free port."""
+
+    behavior = behavior or StubBehavior()
+    handler = type(
+        'StubRequestHandler',
+        (_StubRequestHandler,),
+        {'behavior': behavior, 'rng': random.Random(behavior.seed), 'rng_lock': threading.Lock()},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(
+    behavior: Optional[StubBehavior] = None,
+    host: str = "127.0.0.1",
+    port: int = 8799,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a stub server on a background thread and return it with its base URL."""
+
+    server = create_stub_server(behavior, host, port)
+    thread = threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte.")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Streamed tokens per second (0 = unlimited).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of HTTP 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of HTTP 429.")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Probability of an extra first-byte delay.")
+    parser.add_argument("--straggler-latency", type=float, default=0.0, help="Seconds added to straggler responses.")
+    parser.add_argument("--seed", type=int, help="Seed for error injection.")
+    parser.add_argument("--responses", help="JSON/YAML file of canned {match, reply} entries.")
+    args = parser.parse_args()
+
+    behavior = StubBehavior.from_config(
+        {
+            'latency': args.latency,
+            'token_rate': args.token_rate,
+            'error_rate': args.error_rate,
+            'rate_limit_rate': args.rate_limit_rate,
+            'straggler_rate': args.straggler_rate,
+            'straggler_latency': args.straggler_latency,
+            'seed': args.seed,
+            'responses_file': args.responses,
+        }
+    )
+    server = create_stub_server(behavior, args.host, args.port)
+    print(f"Stub OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Lightweight token estimation helpers for prompt budgeting."""
+
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count of mixed Chinese/English text.
+
+    CJK characters are counted as one token each; everything else is
+    approximated at four characters per token.
+    """
+
+    if not text:
+        return 0
+
+    cjk = sum(1 for char in text if _is_cjk(char))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_messages_tokens(contents: Iterable[str]) -> int:
+    """Estimate tokens for a sequence of message contents, including framing."""
+
+    return sum(estimate_tokens(content) + 4 for content in contents)
+
+
+# Context windows (tokens) by model-name prefix; the longest matching prefix wins.
+MODEL_CONTEXT_WINDOWS = {
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+    "moonshot-v1-auto": 131072,
+    "kimi-k2-0711": 131072,
+    "kimi-k2-0905": 262144,
+    "kimi-k2-turbo": 262144,
+    "kimi-latest": 131072,
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+}
+DEFAULT_CONTEXT_WINDOW = 131072
+
+_ENCODINGS: Dict[str, Any] = {}
+_ENCODING_LOCK = threading.Lock()
+
+
+def _load_encoding(model_name: Optional[str], tokenizer: str):
+    """tiktoken encoding for the model, or ``None`` to fall back to estimation.
+
+    ``tokenizer`` is ``auto`` (tiktoken's encoding for the model name, when
+    it knows the model), ``estimate`` or an explicit tiktoken encoding name.
+    tiktoken is optional; failures (missing package, offline download) are
+    remembered so they are only attempted once.
+    """
+
+    if tokenizer == 'estimate':
+        return None
+    key = f"{tokenizer}:{model_name if tokenizer == 'auto' else ''}"
+    with _ENCODING_LOCK:
+        if key in _ENCODINGS:
+            return _ENCODINGS[key]
+        encoding = None
+        try:
+            import tiktoken
+
+            if tokenizer == 'auto':
+                encoding = tiktoken.encoding_for_model(model_name or '')
+            else:
+                encoding = tiktoken.get_encoding(tokenizer)
+        except KeyError:
+            encoding = None  # model unknown to tiktoken (e.g. Kimi)
+        except Exception as exc:
+            logger.info("tiktoken unavailable for %s (%s); estimating tokens instead.", model_name or tokenizer, exc)
+        _ENCODINGS[key] = encoding
+        return encoding
+
+
+class TokenCounter:
+    """Counts, budgets and truncates text in the configured model's tokens.
+
+    Uses tiktoken when it has an encoding for the model (or an explicit
+    ``tokenizer`` is configured) and :func:`estimate_tokens` otherwise.
+    :meth:`check` is the pre-flight test run before a prompt is sent: it
+    warns when the prompt would not fit the model window minus the tokens
+    reserved for the answer.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        context_window: Optional[int] = None,
+        reserve_output_tokens: int = 4096,
+        tokenizer: str = 'auto',
+        on_warning: Optional[Callable[[str], None]] = None,
+    ):
+        self.model_name = model_name
+        self.tokenizer = tokenizer or 'auto'
+        self.context_window = int(context_window or self._window_for(model_name))
+        self.reserve_output_tokens = max(0, int(reserve_output_tokens))
+        self.on_warning = on_warning
+        self._encoding = _load_encoding(model_name, self.tokenizer)
+
+    @classmethod
+    def from_config(cls, model_name: Optional[str], config: Optional[Dict[str, Any]]) -> 'TokenCounter':
+        config = config or {}
+        return cls(
+            model_name,
+            context_window=config.get('context_window') or None,
+            reserve_output_tokens=int(config.get('reserve_output_tokens', 4096)),
+            tokenizer=config.get('tokenizer') or 'auto',
+        )
+
+    def with_warning(self, on_warning: Callable[[str], None]) -> 'TokenCounter':
+        """Copy that reports oversized prompts through ``on_warning``."""
+
+        counter = copy.copy(self)
+        counter.on_warning = on_warning
+        return counter
+
+    @staticmethod
+    def _window_for(model_name: Optional[str]) -> int:
+        name = (model_name or '').lower()
+        matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if name.startswith(prefix)]
+        return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    @property
+    def prompt_budget(self) -> int:
+        """Tokens a prompt may use while leaving room for the answer."""
+
+        return max(1, self.context_window - self.reserve_output_tokens)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def count_messages(self, contents: Iterable[str]) -> int:
+        return sum(self.count(content) + 4 for content in contents)
+
+    def check(self, contents: Iterable[str], label: str) -> int:
+        """Pre-flight size check of a prompt; warns when it exceeds :attr:`prompt_budget`."""
+
+        tokens = self.count_messages(contents)
+        if tokens > self.prompt_budget:
+            message = (
+                f"{label} prompt is ~{tokens} tokens, over the {self.prompt_budget}-token budget of "
+                f"{self.model_name or 'the model'} ({self.context_window} window, "
+                f"{self.reserve_output_tokens} reserved for the answer); the request may fail."
+            )
+            if self.on_warning:
+                self.on_warning(message)
+            else:
+                logger.warning(message)
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int, keep: str = 'head') -> str:
+        """Longest prefix (or suffix with ``keep='tail'``) within ``max_tokens``.
+
+        Cuts at paragraph boundaries, then line boundaries, and only splits
+        inside a line when a single line is larger than the budget.
+        """
+
+        if max_tokens <= 0 or not text:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        for separator in ("\n\n", "\n"):
+            pieces = text.split(separator)
+            if keep == 'tail':
+                pieces.reverse()
+            kept: List[str] = []
+            used = 0
+            for piece in pieces:
+                cost = self.count(piece) + (self.count(separator) if kept else 0)
+                if used + cost > max_tokens:
+                    break
+                kept.append(piece)
+                used += cost
+            if kept:
+                if keep == 'tail':
+                    kept.reverse()
+                return separator.join(kept)
+        # A single line longer than the budget: binary search on characters.
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = text[-middle:] if keep == 'tail' else text[:middle]
+            if self.count(candidate) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[-low:] if keep == 'tail' and low else text[:low]
@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from langchain.schema import AIMessage  # noqa: E402
+
+from chatbot.chatbot_core import _BasicConversationChain, _FastRetrievalChain  # noqa: E402
+from utils.token_counter import TokenCounter  # noqa: E402
+
+
+class _EchoLLM:
+    def invoke(self, messages, config=None):
+        return AIMessage(content="答" * 40)
+
+
+class _FailingLLM:
+    def invoke(self, messages, config=None):
+        raise RuntimeError("summary model unavailable")
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "登录失败为什么会锁定账户？",
+        "订单查询支持哪些筛选条件？",
+        "How do I reset this password?",
+        "Tell me more about the refund flow",
+    ],
+)
+def test_standalone_questions_skip_condensing(question):
+    assert _FastRetrievalChain.is_self_contained(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "它支持哪些登录方式？",
+        "那退款申请呢？",
+        "为什么？",
+        "上述规则适用于会员吗",
+        "What about refunds?",
+        "It supports SMS login?",
+        "Why is that so?",
+    ],
+)
+def test_follow_up_questions_need_history(question):
+    assert not _FastRetrievalChain.is_self_contained(question)
+
+
+def test_repeated_summary_failures_drop_oldest_pending_turns():
+    chain = _BasicConversationChain(
+        _EchoLLM(),
+        history_token_budget=200,
+        history_recent_turns=1,
+        token_counter=TokenCounter(tokenizer='estimate'),
+        summary_llm=_FailingLLM(),
+        history_summary_max_failures=2,
+    )
+    for turn in range(8):
+        chain.invoke({"input": f"问题{turn} " + "问" * 40})
+        if chain._summary_future is not None:
+            chain._summary_future.result()
+
+    history_tokens = chain.token_counter.count_messages(
+        message.content for message in chain._history_messages()
+    )
+    assert chain.summary == ""
+    assert chain._summary_cursor > 0
+    assert history_tokens <= chain.history_token_budget
+
+
+def test_close_stops_the_summary_worker():
+    chain = _BasicConversationChain(
+        _EchoLLM(),
+        history_token_budget=200,
+        history_recent_turns=1,
+        token_counter=TokenCounter(tokenizer='estimate'),
+        summary_llm=_EchoLLM(),
+    )
+    for turn in range(4):
+        chain.invoke({"input": f"问题{turn} " + "问" * 40})
+        if chain._summary_future is not None:
+            chain._summary_future.result()
+    executor = chain._executor
+    assert executor is not None and chain.summary
+
+    chain.close()
+    future = chain._summary_future
+    for turn in range(4, 8):
+        chain.invoke({"input": f"问题{turn} " + "问" * 40})
+
+    assert chain._executor is None and executor._shutdown
+    assert chain._summary_future is future
@@ -0,0 +1,137 @@
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from terminal.daemon import ChatDaemon, DaemonClient, create_server  # noqa: E402
+
+
+class _Chatbot:
+    def __init__(self):
+        self.conversation = []
+        self.closed = False
+
+    def new_ingest_sequencer(self):
+        return object()
+
+    @contextmanager
+    def ingest_slot(self, sequencer, position):
+        yield
+
+    def ask(self, prompt, stream_handler=None, use_rag=None):
+        self.conversation.append(prompt)
+        return f"answer to {prompt}"
+
+    def close(self):
+        self.closed = True
+
+
+class _Handler:
+    def process(self, text):
+        return text != '/exit', None
+
+
+class _Factory:
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.chatbots = []
+
+    def __call__(self, console):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        chatbot = _Chatbot()
+        self.chatbots.append(chatbot)
+        return chatbot, lambda handler_console: _Handler()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def _serve(daemon):
+        server = create_server(daemon, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield _serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_session_create_run_and_delete(serve):
+    factory = _Factory()
+    base_url = serve(ChatDaemon(factory))
+    client = DaemonClient(base_url, timeout=10)
+
+    session_id = client.open_session()
+    result = client.run("你好\n第二个问题")
+
+    assert result['session'] == session_id and result['status'] == 'ok'
+    assert "answer to 你好" in result['output'] and "answer to 第二个问题" in result['output']
+    listed = client._request('GET', '/sessions')['sessions']
+    assert [(item['session'], item['history']) for item in listed] == [(session_id, 2)]
+
+    client.close_session()
+
+    assert factory.chatbots[0].closed
+    assert client.health() == {'status': 'ok', 'sessions': 0}
+
+
+def test_unknown_session_is_not_found(serve):
+    client = DaemonClient(serve(ChatDaemon(_Factory())), timeout=10)
+    client.session_id = "missing"
+
+    with pytest.raises(RuntimeError, match="Daemon returned 404: Unknown session: missing"):
+        client.run("你好")
+    with pytest.raises(RuntimeError, match="Daemon returned 404"):
+        client.close_session()
+
+
+def test_session_limit_returns_service_unavailable(serve):
+    base_url = serve(ChatDaemon(_Factory(), max_sessions=1))
+    DaemonClient(base_url, timeout=10).open_session()
+
+    with pytest.raises(RuntimeError, match="Daemon returned 503: Session limit reached"):
+        DaemonClient(base_url, timeout=10).open_session()
+
+
+def test_idle_sessions_expire_unless_a_request_holds_them():
+    factory = _Factory()
+    daemon = ChatDaemon(factory, session_ttl=60)
+    idle, busy, fresh = (daemon.create_session() for _ in range(3))
+    idle.last_used -= 120
+    busy.last_used -= 120
+
+    with busy.lock:
+        remaining = {item['session'] for item in daemon.list_sessions()}
+        closed = [chatbot.closed for chatbot in factory.chatbots]
+
+    assert remaining == {busy.session_id, fresh.session_id}
+    assert closed == [True, False, False]
+    # Once the request finishes, the idle session is evicted as well.
+    assert daemon.get_session(busy.session_id) is None
+    assert daemon.get_session(fresh.session_id) is fresh
+
+
+def test_sessions_being_built_count_against_the_limit():
+    gate = threading.Event()
+    daemon = ChatDaemon(_Factory(gate=gate), max_sessions=1)
+    created = []
+    builder = threading.Thread(target=lambda: created.append(daemon.create_session()))
+    builder.start()
+    try:
+        while not daemon._reserved:
+            threading.Event().wait(0.01)
+        with pytest.raises(RuntimeError, match="Session limit reached"):
+            daemon.create_session()
+    finally:
+        gate.set()
+        builder.join(timeout=5)
+
+    assert len(created) == 1 and len(daemon.list_sessions()) == 1
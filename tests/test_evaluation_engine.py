@@ -0,0 +1,91 @@
+import json
+import sys
+from pathlib import Path
+
+from langchain.schema import AIMessage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from chatbot.evaluation_engine import (  # noqa: E402
+    CandidateChunk,
+    EvaluationEngine,
+    EvaluationMetric,
+    EvaluationResult,
+    ReviewMetricConfig,
+    chunk_candidate,
+    parse_candidate_modules,
+)
+from chatbot.memory_manager import MemoryManager  # noqa: E402
+
+
+def _suggestion(text, deduction):
+    return {"id": "S1", "text": text, "deduction": deduction}
+
+
+def test_review_metric_score_matches_merged_deductions():
+    metric = ReviewMetricConfig(name="coverage", prompt="{baseline}{candidate}")
+    chunks = [CandidateChunk("a", ["登录"], 3), CandidateChunk("b", ["支付"], 1)]
+    results = [
+        EvaluationResult("coverage", 85.0, "r1", [_suggestion("缺少异常场景", 5), _suggestion("步骤不清晰", 10)],
+                         {"count": 2, "total_deduction": 15}),
+        EvaluationResult("coverage", 93.0, "r2", [_suggestion("缺少异常场景", 5), _suggestion("无预期结果", 2)],
+                         {"count": 2, "total_deduction": 7}),
+    ]
+
+    merged = EvaluationEngine._reduce_chunk_results(metric, chunks, results)
+
+    # Duplicate suggestions are merged once; the deduction is the case-weighted chunk mean.
+    assert merged.penalty_summary["count"] == 3
+    assert merged.penalty_summary["merged_deduction"] == 17
+    assert merged.penalty_summary["total_deduction"] == 13
+    assert merged.score == 100 - merged.penalty_summary["total_deduction"]
+
+
+class _ReviewerLLM:
+    """Reviews any suite the same way: two issues tagged with the first module it sees."""
+
+    def invoke(self, messages, config=None):
+        prompt = messages[-1].content
+        module = next(line for line in prompt.splitlines() if line.startswith("## "))[3:]
+        return AIMessage(content=json.dumps({
+            "summary": "ok",
+            "suggestions": [
+                {"text": f"{module} 缺少异常场景", "level": 5, "deduction": 5},
+                {"text": f"{module} 步骤不清晰", "level": 7, "deduction": 3},
+            ],
+        }, ensure_ascii=False))
+
+
+def test_review_score_does_not_depend_on_chunk_count():
+    suite = "\n\n".join(
+        f"## 模块{index}\n" + "\n".join(f"### 用例{index}-{case}\n步骤：操作\n预期：成功" for case in range(3))
+        for index in range(4)
+    )
+    modules = parse_candidate_modules(suite)
+    engine = EvaluationEngine(_ReviewerLLM(), MemoryManager(), review_metrics=[
+        {"name": "coverage", "prompt": "{baseline}\n{candidate}"},
+    ])
+    metric = engine.review_metrics[0]
+
+    full = engine._review_metric(metric, "需求", suite)
+    scores = []
+    for chunk_chars in (10 ** 6, len(suite) // 2, 1):
+        chunks = chunk_candidate(modules, chunk_chars)
+        scores.append((len(chunks), engine._evaluate_chunked("需求", chunks, [])[0].score))
+
+    assert [count for count, _ in scores] == [1, 2, 4]
+    assert all(score == full.score for _, score in scores)
+
+
+def test_plain_metric_is_case_weighted_without_deduction_total():
+    metric = EvaluationMetric(name="clarity", prompt="{baseline}{candidate}", system_prompt=None, metadata={})
+    chunks = [CandidateChunk("a", ["登录"], 3), CandidateChunk("b", ["支付"], 1)]
+    results = [
+        EvaluationResult("clarity", 80.0, "r1", []),
+        EvaluationResult("clarity", 40.0, "r2", []),
+    ]
+
+    merged = EvaluationEngine._reduce_chunk_results(metric, chunks, results)
+
+    assert merged.score == 70.0
+    assert "total_deduction" not in merged.penalty_summary
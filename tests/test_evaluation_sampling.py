@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from chatbot.evaluation_engine import CandidateModule  # noqa: E402
+from chatbot.evaluation_sampling import _t_quantile, plan_stratified_sample  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "df, probability, expected",
+    [
+        (1, 0.975, 12.706),
+        (1, 0.95, 6.314),
+        (2, 0.975, 4.303),
+        (3, 0.975, 3.182),
+        (5, 0.995, 4.032),
+        (10, 0.975, 2.228),
+        (29, 0.975, 2.045),
+        (30, 0.975, 2.042),
+        (120, 0.975, 1.980),
+    ],
+)
+def test_t_quantile_matches_table_values(df, probability, expected):
+    assert _t_quantile(probability, df) == pytest.approx(expected, abs=1e-3)
+
+
+def test_plan_rejects_fewer_than_two_replicates():
+    modules = [CandidateModule("登录", "", [f"### 用例{i}" for i in range(10)])]
+    with pytest.raises(ValueError):
+        plan_stratified_sample(modules, 5, replicates=1)
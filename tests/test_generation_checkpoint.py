@@ -0,0 +1,127 @@
+import multiprocessing
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+from chatbot.content_processor import ContentSegment  # noqa: E402
+from chatbot.generation_checkpoint import GenerationCheckpoint, segments_fingerprint, split_chunks  # noqa: E402
+
+PRD = "# 商城\n\n## 用户登录\n手机号登录，失败5次锁定。\n\n## 购物车结算\n优惠券与满减不可叠加。\n"
+PLANS = ["用户登录：验证登录与锁定", "购物车结算：验证优惠规则"]
+
+
+def _claim(root, run_id, barrier, results):
+    sys.path.insert(0, str(SRC))
+    barrier.wait()
+    try:
+        GenerationCheckpoint.resume(Path(root), run_id, "default", "ctx", "cfg")
+        results.put("won")
+    except ValueError:
+        results.put("lost")
+
+
+def _open_run(tmp_path):
+    checkpoint = GenerationCheckpoint.start(tmp_path, "default", "ctx", "cfg")
+    checkpoint.release()
+    return checkpoint.run_id
+
+
+def test_only_one_process_claims_a_run(tmp_path):
+    run_id = _open_run(tmp_path)
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(4)
+    results = context.Queue()
+    workers = [
+        context.Process(target=_claim, args=(str(tmp_path), run_id, barrier, results))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    outcomes = sorted(results.get(timeout=5) for _ in workers)
+    assert outcomes == ["lost", "lost", "lost", "won"]
+
+
+def test_stale_lock_of_dead_process_is_taken_over(tmp_path):
+    run_id = _open_run(tmp_path)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (tmp_path / run_id / "run.lock").write_text(str(dead.pid), encoding="utf-8")
+
+    checkpoint = GenerationCheckpoint.resume(tmp_path, run_id, "default", "ctx", "cfg")
+
+    assert (tmp_path / run_id / "run.lock").read_text(encoding="utf-8").strip() != str(dead.pid)
+    checkpoint.release()
+    assert not (tmp_path / run_id / "run.lock").exists()
+
+
+def test_lock_of_live_process_is_respected(tmp_path):
+    run_id = _open_run(tmp_path)
+    live = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        (tmp_path / run_id / "run.lock").write_text(str(live.pid), encoding="utf-8")
+        with pytest.raises(ValueError, match="in use by process"):
+            GenerationCheckpoint.resume(tmp_path, run_id, "default", "ctx", "cfg")
+    finally:
+        live.kill()
+        live.wait()
+
+
+def _complete_run(root, text, retrieved=None):
+    segments = [ContentSegment("text", "prd.md", text)]
+    chunks = split_chunks(segments)
+    checkpoint = GenerationCheckpoint.start(root, "default", segments_fingerprint(segments), "cfg", chunks)
+    checkpoint.save_plans(PLANS)
+    for index, plan in enumerate(PLANS, start=1):
+        context = None if retrieved is None else [retrieved[index]]
+        checkpoint.save_module(index, plan, f"module {index}", context_texts=context)
+    checkpoint.mark_complete("out.json")
+    return checkpoint
+
+
+def _seed(root, text, retrieved=None):
+    segments = [ContentSegment("text", "prd.md", text)]
+    previous = GenerationCheckpoint.find_previous(root, "default", "cfg")
+    checkpoint = GenerationCheckpoint.start(
+        root, "default", segments_fingerprint(segments), "cfg", split_chunks(segments)
+    )
+    return previous, checkpoint, checkpoint.seed_from(previous, max_change_ratio=1.0, retrieved_texts=retrieved)
+
+
+def test_unchanged_documents_seed_a_new_run_and_keep_the_previous_one(tmp_path):
+    first = _complete_run(tmp_path, PRD)
+
+    previous, checkpoint, outcome = _seed(tmp_path, PRD)
+
+    assert previous.run_id == first.run_id
+    assert checkpoint.run_id != first.run_id
+    assert outcome.reused == [1, 2] and outcome.rebuild == []
+    # The new run fails (never completes): the previous run is still the latest good one.
+    checkpoint.release()
+    assert GenerationCheckpoint.find_previous(tmp_path, "default", "cfg").run_id == first.run_id
+
+
+def test_any_change_rebuilds_full_context_modules(tmp_path):
+    _complete_run(tmp_path, PRD)
+
+    _, _, outcome = _seed(tmp_path, PRD.replace("不可叠加", "可以叠加"))
+
+    assert outcome.reused == [] and outcome.rebuild == [1, 2]
+
+
+def test_retrieval_modules_rebuild_only_when_their_chunks_change(tmp_path):
+    login = "## 用户登录\n手机号登录，失败5次锁定。"
+    cart = "## 购物车结算\n优惠券与满减不可叠加。"
+    _complete_run(tmp_path, PRD, retrieved={1: login, 2: cart})
+    edited_cart = cart.replace("不可叠加", "可以叠加")
+
+    _, _, outcome = _seed(tmp_path, PRD.replace(cart, edited_cart), retrieved={1: [login], 2: [edited_cart]})
+
+    assert outcome.reused == [1] and outcome.rebuild == [2]
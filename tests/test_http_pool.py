@@ -0,0 +1,147 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.http_pool import ConnectionStats, HedgingTransport  # noqa: E402
+
+URL = "http://llm.test/v1/chat/completions"
+DETERMINISTIC = {"model": "m", "temperature": 0, "messages": []}
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    def __init__(self, name):
+        self.name = name
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield b'{"ok": true}'
+
+    def close(self):
+        self.closed.set()
+
+
+class _Upstream:
+    """MockTransport handler whose n-th call sleeps ``delays[n]`` seconds."""
+
+    def __init__(self, delays=()):
+        self.delays = list(delays)
+        self.streams = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            index = len(self.streams)
+            stream = _TrackedStream(f"call-{index}")
+            self.streams.append(stream)
+        time.sleep(self.delays[index] if index < len(self.delays) else 0)
+        return httpx.Response(200, stream=stream, headers={"x-call": stream.name})
+
+    @property
+    def calls(self):
+        return len(self.streams)
+
+
+def _transport(upstream, **options):
+    stats = ConnectionStats()
+    options = {"min_samples": 2, "min_delay": 0.1, "max_ratio": 1.0, **options}
+    hedging = HedgingTransport(httpx.MockTransport(upstream), stats, **options)
+    return httpx.Client(transport=hedging), stats
+
+
+def _warm_up(client, count=2):
+    for _ in range(count):
+        client.post(URL, json=DETERMINISTIC)
+
+
+def test_slow_request_is_hedged_and_the_losing_response_closed():
+    upstream = _Upstream(delays=[0, 0, 1.0, 0])
+    client, stats = _transport(upstream)
+    _warm_up(client)
+
+    started = time.perf_counter()
+    response = client.post(URL, json=DETERMINISTIC)
+
+    assert response.headers["x-call"] == "call-3"
+    assert time.perf_counter() - started < 0.8
+    assert upstream.calls == 4
+    assert upstream.streams[2].closed.wait(timeout=5)
+    snapshot = stats.snapshot()
+    assert (snapshot["hedge_eligible"], snapshot["hedged"], snapshot["hedge_wins"], snapshot["hedge_capped"]) == (3, 1, 1, 0)
+
+
+def test_hedge_waits_for_the_latency_percentile():
+    upstream = _Upstream(delays=[0.2, 0.2, 0.1])
+    client, stats = _transport(upstream, percentile=50, min_delay=0.01)
+    _warm_up(client)
+
+    # 0.1 s is under the ~0.2 s median of this host and model, so no duplicate is sent.
+    response = client.post(URL, json=DETERMINISTIC)
+
+    assert response.headers["x-call"] == "call-2"
+    assert upstream.calls == 3
+    assert stats.snapshot()["hedged"] == 0
+
+
+def test_no_hedge_before_enough_latency_samples():
+    upstream = _Upstream(delays=[0, 0.3])
+    client, stats = _transport(upstream, min_samples=3)
+    _warm_up(client, count=1)
+
+    client.post(URL, json=DETERMINISTIC)
+
+    assert upstream.calls == 2
+    assert stats.snapshot()["hedged"] == 0
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"model": "m", "temperature": 0.7, "messages": []},
+        {"model": "m", "messages": []},
+        {"model": "m", "temperature": 0, "n": 2, "messages": []},
+    ],
+    ids=["sampled", "default-temperature", "several-choices"],
+)
+def test_non_deterministic_requests_are_never_hedged(payload):
+    upstream = _Upstream(delays=[0, 0, 0.3])
+    client, stats = _transport(upstream)
+    for _ in range(2):
+        client.post(URL, json=payload)
+
+    client.post(URL, json=payload)
+
+    assert upstream.calls == 3
+    assert stats.snapshot()["hedge_eligible"] == 0
+
+
+def test_hedges_are_capped_at_max_ratio():
+    upstream = _Upstream(delays=[0, 0, 0.3])
+    client, stats = _transport(upstream, max_ratio=0.1)
+    _warm_up(client)
+
+    # One hedge out of three eligible requests would exceed a 10% ratio.
+    response = client.post(URL, json=DETERMINISTIC)
+
+    assert response.headers["x-call"] == "call-2"
+    assert upstream.calls == 3
+    snapshot = stats.snapshot()
+    assert (snapshot["hedged"], snapshot["hedge_capped"]) == (0, 1)
+
+
+def test_connection_stats_snapshot_reports_reuse_and_sections():
+    stats = ConnectionStats()
+    stats.add("requests", 4)
+    stats.add("connections_opened")
+    stats.add_section("endpoints", lambda: {"pool": "ok"})
+
+    snapshot = stats.snapshot()
+
+    assert snapshot["reused"] == 3 and snapshot["reuse_ratio"] == 0.75
+    assert snapshot["endpoints"] == {"pool": "ok"}
+    assert ConnectionStats().snapshot()["reuse_ratio"] is None
@@ -0,0 +1,119 @@
+import base64
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils import llm_tracer  # noqa: E402
+from utils.llm_cassette import CassetteMissError, CassetteTransport  # noqa: E402
+
+URL = "http://llm.test/v1/chat/completions"
+SSE_CHUNKS = [b'data: {"delta": "\xe7\x99\xbb"}\n\n', b'data: {"delta": "\xe5\xbd\x95"}\n\n', b"data: [DONE]\n\n"]
+
+
+def _payload(question, stream=False, model="m"):
+    return {"model": model, "stream": stream, "messages": [{"role": "user", "content": question}]}
+
+
+def _upstream(request):
+    payload = json.loads(request.content)
+    if payload["stream"]:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=httpx.ByteStream(b"".join(SSE_CHUNKS)))
+    return httpx.Response(200, json={"answer": payload["messages"][-1]["content"]})
+
+
+class _ChunkedStream(httpx.SyncByteStream):
+    def __iter__(self):
+        yield from SSE_CHUNKS
+
+
+def _streaming_upstream(request):
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=_ChunkedStream())
+
+
+def _record(path, payloads, upstream=_upstream):
+    recorder = CassetteTransport(str(path), mode="record", transport=httpx.MockTransport(upstream))
+    with httpx.Client(transport=recorder) as client:
+        for payload in payloads:
+            client.post(URL, json=payload).read()
+
+
+def _replayer(path, **options):
+    return httpx.Client(transport=CassetteTransport(str(path), mode="replay", timing="none", **options))
+
+
+def test_recorded_responses_replay_without_the_network(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("登录规则"), _payload("退款规则")])
+
+    with _replayer(cassette) as client:
+        answers = [client.post(URL, json=_payload(q)).json()["answer"] for q in ("退款规则", "登录规则")]
+
+    assert answers == ["退款规则", "登录规则"]
+    assert len(cassette.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_streamed_chunks_replay_one_by_one(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("登录规则", stream=True)], upstream=_streaming_upstream)
+
+    with _replayer(cassette) as client:
+        with client.stream("POST", URL, json=_payload("登录规则", stream=True)) as response:
+            chunks = list(response.iter_raw())
+
+    assert chunks == SSE_CHUNKS
+    assert response.headers["content-type"] == "text/event-stream"
+
+
+def test_strict_replay_raises_on_unrecorded_requests(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("登录规则")])
+
+    with _replayer(cassette, strict=True) as client:
+        with pytest.raises(CassetteMissError):
+            client.post(URL, json=_payload("生成于 2026-10-19 的新问题"))
+
+
+def test_unmatched_requests_fall_back_to_unused_recordings_in_order(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("第一次 10:00"), _payload("流式", stream=True), _payload("第二次 10:00")])
+
+    with _replayer(cassette) as client:
+        first = client.post(URL, json=_payload("第一次 11:30")).json()
+        second = client.post(URL, json=_payload("第二次 11:30")).json()
+        with pytest.raises(CassetteMissError):
+            client.post(URL, json=_payload("第三次 11:30"))
+
+    assert [first["answer"], second["answer"]] == ["第一次 10:00", "第二次 10:00"]
+
+
+def test_repeated_identical_requests_reuse_the_last_recording(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("登录规则")])
+    lines = cassette.read_text(encoding="utf-8").splitlines()
+    # Two recordings of the same request with different answers.
+    second = json.loads(lines[0])
+    answer = json.dumps({"answer": "第二次"}, ensure_ascii=False).encode("utf-8")
+    second["response"]["chunks"] = [[0.0, base64.b64encode(answer).decode("ascii")]]
+    cassette.write_text(lines[0] + "\n" + json.dumps(second) + "\n", encoding="utf-8")
+
+    with _replayer(cassette, strict=True) as client:
+        answers = [client.post(URL, json=_payload("登录规则")).json()["answer"] for _ in range(3)]
+
+    assert answers == ["登录规则", "第二次", "第二次"]
+
+
+def test_replayed_calls_are_marked_as_cache_hits(tmp_path):
+    cassette = tmp_path / "session.jsonl"
+    _record(cassette, [_payload("登录规则")])
+    llm_tracer._consume_cache_mark()
+
+    with _replayer(cassette) as client:
+        client.post(URL, json=_payload("登录规则"))
+
+    assert llm_tracer._consume_cache_mark() is True
+    assert llm_tracer._consume_cache_mark() is False
@@ -0,0 +1,162 @@
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils import load_balancer  # noqa: E402
+from utils.load_balancer import Endpoint, EndpointPool, LoadBalancingTransport  # noqa: E402
+
+LOGICAL = "http://llm.test/v1"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(load_balancer.time, "monotonic", fake)
+    return fake
+
+
+def _pool(weights=(1, 1), **options):
+    endpoints = [
+        Endpoint(base_url=f"http://{name}.test/v1", api_key=f"key-{name}", weight=weight)
+        for name, weight in zip("ab", weights)
+    ]
+    return EndpointPool(endpoints, **options)
+
+
+def _client(pool, handler):
+    seen = []
+
+    def _record(request):
+        seen.append((request.url.host, request.headers["authorization"]))
+        return handler(request)
+
+    transport = LoadBalancingTransport(httpx.MockTransport(_record), {LOGICAL: pool})
+    return httpx.Client(transport=transport), seen
+
+
+def _ok(request):
+    return httpx.Response(200, json={"host": request.url.host})
+
+
+def test_weighted_round_robin_spreads_requests_by_weight():
+    pool = _pool(weights=(3, 1))
+    client, seen = _client(pool, _ok)
+
+    hosts = [client.post(f"{LOGICAL}/chat/completions", json={}).json()["host"] for _ in range(8)]
+
+    assert hosts == ["a.test", "a.test", "b.test", "a.test"] * 2
+    assert ("a.test", "Bearer key-a") in seen and ("b.test", "Bearer key-b") in seen
+    assert [row["requests"] for row in pool.snapshot()] == [6, 2]
+
+
+def test_requests_outside_the_logical_base_url_pass_through():
+    client, seen = _client(_pool(), _ok)
+
+    response = client.get("http://other.test/health", headers={"Authorization": "Bearer own"})
+
+    assert response.json() == {"host": "other.test"}
+    assert seen == [("other.test", "Bearer own")]
+
+
+def test_breaker_opens_after_failure_threshold(clock):
+    pool = _pool(failure_threshold=3, cooldown=30)
+    first = pool.endpoints[0]
+
+    for _ in range(2):
+        pool.record_failure(first, "HTTP 503")
+        assert first.state == "closed"
+    pool.record_failure(first, "HTTP 503")
+
+    assert first.state == "open"
+    assert first.open_until == clock.now + 30
+    assert all(pool.acquire([]) is pool.endpoints[1] for _ in range(4))
+    assert pool.snapshot()[0]["opened"] == 1 and pool.snapshot()[0]["failures"] == 3
+
+
+def test_rate_limit_opens_the_circuit_for_retry_after(clock):
+    def _handler(request):
+        if request.url.host == "a.test":
+            return httpx.Response(429, headers={"Retry-After": "7"})
+        return _ok(request)
+
+    pool = _pool(failure_threshold=3, cooldown=30)
+    client, seen = _client(pool, _handler)
+
+    response = client.post(f"{LOGICAL}/chat/completions", json={})
+
+    first = pool.endpoints[0]
+    assert response.status_code == 200
+    assert [host for host, _ in seen] == ["a.test", "b.test"]
+    assert first.state == "open" and first.open_until == clock.now + 7
+    assert pool.snapshot()[0]["rate_limited"] == 1
+
+
+def test_one_trial_request_after_the_cooldown(clock):
+    pool = _pool(failure_threshold=1, cooldown=30)
+    first, second = pool.endpoints
+    pool.record_failure(first, "ConnectError")
+    assert pool.acquire([]) is second
+
+    clock.now += 31
+    assert pool.acquire([second]) is first
+    assert first.state == "half_open" and first.trial_in_flight
+    # While the trial is in flight every other request avoids the endpoint.
+    assert all(pool.acquire([]) is second for _ in range(4))
+
+    pool.record_failure(first, "HTTP 502")
+    assert first.state == "open" and first.open_until == clock.now + 30
+
+    clock.now += 31
+    assert pool.acquire([second]) is first
+    pool.record_success(first)
+    assert first.state == "closed" and not first.trial_in_flight
+    assert first in {pool.acquire([]) for _ in range(2)}
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        lambda request: httpx.Response(503),
+        lambda request: (_ for _ in ()).throw(httpx.ConnectError("refused", request=request)),
+    ],
+    ids=["5xx", "connect-error"],
+)
+def test_failed_attempts_fail_over_to_the_next_endpoint(failure):
+    def _handler(request):
+        return failure(request) if request.url.host == "a.test" else _ok(request)
+
+    pool = _pool()
+    client, seen = _client(pool, _handler)
+
+    response = client.post(f"{LOGICAL}/chat/completions", json={"model": "m"})
+
+    assert response.json() == {"host": "b.test"}
+    assert [host for host, _ in seen] == ["a.test", "b.test"]
+    assert [row["failures"] for row in pool.snapshot()] == [1, 0]
+    assert [endpoint.failures for endpoint in pool.endpoints] == [1, 0]
+
+
+def test_every_endpoint_failing_surfaces_the_last_error():
+    pool = _pool()
+    client, seen = _client(pool, lambda request: httpx.Response(502))
+    assert client.post(f"{LOGICAL}/chat/completions", json={}).status_code == 502
+    assert len(seen) == 2
+
+    def _refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client, _ = _client(_pool(), _refuse)
+    with pytest.raises(httpx.ConnectError):
+        client.post(f"{LOGICAL}/chat/completions", json={})
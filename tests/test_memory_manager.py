@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from chatbot.memory_manager import ConversationStore  # noqa: E402
+
+
+def _store(turns, limit=None):
+    store = ConversationStore(limit=limit)
+    for turn in range(turns):
+        store.append('user', f"问{turn}")
+        store.append('assistant', f"答{turn}")
+    return store
+
+
+def test_store_evicts_oldest_messages_and_keeps_absolute_indices():
+    store = _store(5, limit=4)
+
+    assert len(store) == 4
+    assert store.total == 10
+    assert store.first_index == 6
+    assert [message['content'] for message in store.messages()] == ["问3", "答3", "问4", "答4"]
+    assert store.pairs() == [("问3", "答3"), ("问4", "答4")]
+
+
+def test_slice_uses_absolute_cursors():
+    store = _store(5, limit=4)
+
+    assert [message['content'] for message in store.slice(7)] == ["答3", "问4", "答4"]
+    assert [message['content'] for message in store.slice(7, 9)] == ["答3", "问4"]
+    # Cursors older than the retention window start at the oldest retained message.
+    assert [message['content'] for message in store.slice(0, 8)] == ["问3", "答3"]
+    assert store.slice(10) == [] and store.slice(9, 7) == [] and store.slice(0, 3) == []
+
+
+def test_limits_copy_only_the_recent_range():
+    store = _store(6)
+
+    assert [message['content'] for message in store.messages(3)] == ["答4", "问5", "答5"]
+    assert store.messages(0) == [] and len(store.messages(100)) == 12
+    assert store.pairs(2) == [("问4", "答4"), ("问5", "答5")]
+    assert store.pairs(0) == [] and len(store.pairs(100)) == 6
+    assert [message['content'] for message in store.slice(1, 4)] == ["答0", "问1", "答1"]
+
+
+def test_unanswered_question_is_not_a_pair():
+    store = _store(1)
+    store.append('user', "还没有回答")
+
+    assert store.pairs() == [("问0", "答0")]
+    assert store.messages(1) == [{'role': 'user', 'content': "还没有回答"}]
@@ -0,0 +1,115 @@
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from rich.console import Console
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from terminal.script_runner import ScriptRunner, parse_script  # noqa: E402
+
+
+class _Chatbot:
+    """Session double that records chat turns and how many overlapped."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.asked = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def new_ingest_sequencer(self):
+        return object()
+
+    @contextmanager
+    def ingest_slot(self, sequencer, position):
+        yield
+
+    def ask(self, prompt, stream_handler=None, use_rag=None):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+            self.asked.append(prompt)
+        return f"answer to {prompt}"
+
+
+class _Handler:
+    """Commands: /read <seconds> sleeps, /ask <text> chats, /exit stops, /boom fails."""
+
+    def __init__(self, chatbot):
+        self.chatbot = chatbot
+
+    def process(self, text):
+        command, _, argument = text.partition(' ')
+        if command == '/read':
+            time.sleep(float(argument))
+            return True, None
+        if command == '/ask':
+            return True, {'prompt': argument}
+        if command == '/boom':
+            raise RuntimeError("boom")
+        return command != '/exit', None
+
+
+def _runner(chatbot, max_workers=4):
+    output, log = io.StringIO(), io.StringIO()
+    console = Console(file=output, force_terminal=False, color_system=None, width=200)
+    runner = ScriptRunner(chatbot, lambda _console: _Handler(chatbot), console, log, max_workers=max_workers)
+    return runner, output, log
+
+
+def test_script_stops_at_the_first_failing_command():
+    chatbot = _Chatbot()
+    runner, output, log = _runner(chatbot)
+
+    status = runner.run_lines(["你好", "/boom", "之后的问题"])
+
+    assert status == 'error'
+    assert chatbot.asked == ["你好"]
+    assert "Script command failed (line 2): boom" in output.getvalue()
+    assert "CMD#3" not in log.getvalue()
+
+
+def test_exit_ends_the_script():
+    chatbot = _Chatbot()
+    runner, _, log = _runner(chatbot)
+
+    status = runner.run_lines(["/read 0", "/exit", "不会执行"])
+
+    assert status == 'exit'
+    assert chatbot.asked == []
+    assert "script requested exit" in log.getvalue()
+
+
+def test_parallel_block_output_follows_script_order():
+    chatbot = _Chatbot()
+    runner, output, log = _runner(chatbot)
+    script = ["parallel {", "/read 0.3", "/read 0", "/read 0.1", "}", "完成了吗"]
+
+    assert [len(stage.steps) for stage in parse_script(script)] == [3, 1]
+    status = runner.run_lines(script)
+
+    assert status == 'ok'
+    echoed = [line for line in output.getvalue().splitlines() if line.startswith("script >")]
+    assert echoed == ["script > /read 0.3", "script > /read 0", "script > /read 0.1", "script > 完成了吗"]
+    commands = [line.split("CMD#")[1] for line in log.getvalue().splitlines() if "CMD#" in line]
+    assert commands == ["2: /read 0.3", "3: /read 0", "4: /read 0.1", "6: 完成了吗"]
+    assert "STAGE: 3 steps in parallel (lines 2, 3, 4)" in log.getvalue()
+
+
+def test_chat_inside_a_parallel_block_runs_one_turn_at_a_time_in_order():
+    chatbot = _Chatbot(delay=0.05)
+    runner, _, _ = _runner(chatbot)
+
+    status = runner.run_lines(["parallel {", "第一问", "/read 0.1", "/ask 第二问", "第三问", "/read 0", "}"])
+
+    assert status == 'ok'
+    assert chatbot.asked == ["第一问", "第二问", "第三问"]
+    assert chatbot.max_active == 1
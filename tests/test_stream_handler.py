@@ -0,0 +1,93 @@
+import io
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from rich.console import Console
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from terminal import stream_handler  # noqa: E402
+from terminal.stream_handler import TerminalStreamHandler  # noqa: E402
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+class _Output(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+        return super().write(text)
+
+
+def _handler(monkeypatch, **options):
+    clock = _Clock()
+    monkeypatch.setattr(stream_handler, "time", SimpleNamespace(perf_counter=clock.perf_counter))
+    output = _Output()
+    console = Console(file=output, force_terminal=False, color_system=None, width=200)
+    handler = TerminalStreamHandler(console, **options)
+    handler.on_chat_model_start({}, [])
+    return handler, output, clock
+
+
+def _stream(handler, clock, tokens):
+    for at, token in tokens:
+        clock.now = at
+        handler.on_llm_new_token(token)
+
+
+def test_tokens_are_rendered_in_batches(monkeypatch):
+    handler, output, clock = _handler(monkeypatch, flush_interval=1.0)
+
+    _stream(handler, clock, [(0.2, "登录"), (0.4, "失败"), (0.6, "5次")])
+    assert output.writes == []
+
+    _stream(handler, clock, [(1.2, "后锁定")])
+    assert output.writes == ["登录失败5次后锁定"]
+
+    _stream(handler, clock, [(1.4, "账户。")])
+    clock.now = 1.5
+    handler.on_llm_end(None)
+    assert output.getvalue().startswith("登录失败5次后锁定账户。\n")
+    assert handler.get_full_response() == "登录失败5次后锁定账户。"
+
+
+def test_footer_reports_time_to_first_token_and_throughput(monkeypatch):
+    handler, output, clock = _handler(monkeypatch, flush_interval=1.0)
+
+    _stream(handler, clock, [(0.2, "a"), (0.4, "b"), (0.6, "c"), (0.8, "d"), (1.0, "e")])
+    clock.now = 1.3
+    handler.on_llm_end(None)
+
+    assert output.getvalue().splitlines()[-1] == "TTFT 0.20s · 5 tokens · 3.6 tok/s · total 1.30s"
+    metrics = handler.get_metrics()
+    assert metrics["time_to_first_token"] == 0.2 and metrics["total_tokens"] == 5
+
+
+def test_footer_can_be_disabled(monkeypatch):
+    handler, output, clock = _handler(monkeypatch, show_metrics=False)
+
+    _stream(handler, clock, [(0.1, "答案\n")])
+    clock.now = 0.2
+    handler.on_llm_end(None)
+
+    assert output.getvalue() == "答案\n"
+
+
+def test_code_blocks_are_rendered_when_closed(monkeypatch):
+    handler, output, clock = _handler(monkeypatch, flush_interval=1.0, show_metrics=False)
+
+    _stream(handler, clock, [(0.1, "示例：```py"), (0.2, "\nprint(1)\n"), (0.3, "```完毕")])
+    handler.on_llm_end(None)
+
+    text = output.getvalue()
+    assert text.index("示例：") < text.index("Code:") < text.index("print(1)") < text.index("完毕")
@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from chatbot.content_processor import ContentSegment  # noqa: E402
+from chatbot.memory_manager import MemoryManager  # noqa: E402
+from chatbot import testcase_generator  # noqa: E402
+from utils.token_counter import TokenCounter  # noqa: E402
+
+PRD = "## 用户登录\n手机号登录，失败5次锁定账户。\n\n## 购物车结算\n优惠券与满减不可叠加。"
+
+
+def test_context_keeps_overview_entries_and_drops_duplicate_segments():
+    memory = MemoryManager()
+    # Overview entries are the opening of each document, so their text is part of the segment.
+    memory.add_document_summary(f"prd.md: {PRD[:20]}")
+    generator = testcase_generator.TestcaseGenerator(None, memory, token_counter=TokenCounter(tokenizer='estimate'))
+    segment = ContentSegment("text", "prd.md", PRD)
+
+    context = generator._build_context([segment, ContentSegment("text", "prd.md", PRD)], limit=2000)
+
+    assert context.startswith(f"prd.md: {PRD[:20]}\n\n### text:prd.md\n")
+    assert context.count("### text:prd.md") == 1
+    assert context.endswith(PRD)
@@ -0,0 +1,104 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from chatbot import testcase_generator as generator  # noqa: E402
+from chatbot.testcase_writer import create_testcase_writer  # noqa: E402
+
+LAYOUTS = {
+    "basic": generator.TestcaseLayout(
+        "basic",
+        "默认模板",
+        [generator.TestcaseFieldSchema("title", "用例标题"), generator.TestcaseFieldSchema("expected", "预期结果")],
+        [],
+    )
+}
+MODULES = [
+    generator.TestcaseModule(
+        "用户登录", "basic", goal="验证锁定", cases=[generator.TestcaseCase("连续失败5次", {"expected": "账户锁定"})]
+    ),
+    generator.TestcaseModule(
+        "购物车结算", "basic", cases=[generator.TestcaseCase("优惠叠加", {"expected": "提示不可叠加"})]
+    ),
+]
+PLAN = [generator.TestPlanSection("基础检查", ["覆盖主流程"])]
+
+
+def _writer(tmp_path, output_format):
+    path = tmp_path / f"cases.{output_format}"
+    writer = create_testcase_writer(
+        output_format, path, "default", {"config_hash": "abc"}, {"source": "prd.md"}, layouts=LAYOUTS
+    )
+    return writer.open(), path
+
+
+def _jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_json_file_is_valid_after_every_module(tmp_path):
+    writer, path = _writer(tmp_path, "json")
+    assert json.loads(path.read_text(encoding="utf-8"))["document"]["modules"] == []
+
+    for index, module in enumerate(MODULES, start=1):
+        writer.write_module(index, module)
+        document = json.loads(path.read_text(encoding="utf-8"))["document"]
+        assert document["complete"] is False
+        assert [item["name"] for item in document["modules"]] == [item.name for item in MODULES[:index]]
+
+    writer.close(["note"], PLAN)
+
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    assert payload["metadata"] == {"config_hash": "abc"}
+    assert payload["document"]["complete"] is True
+    assert payload["document"]["planner_notes"] == ["note"]
+    assert payload["document"]["plan_summary"] == [{"title": "基础检查", "checklist": ["覆盖主流程"]}]
+
+
+def test_jsonl_file_has_one_line_per_module_and_a_summary(tmp_path):
+    writer, path = _writer(tmp_path, "jsonl")
+
+    for index, module in enumerate(MODULES, start=1):
+        writer.write_module(index, module)
+        lines = _jsonl(path)
+        assert [line["type"] for line in lines] == ["header"] + ["module"] * index
+    writer.close([], PLAN)
+
+    lines = _jsonl(path)
+    assert lines[-1]["type"] == "summary" and lines[-1]["modules"] == 2
+    assert [line.get("index") for line in lines[1:-1]] == [1, 2]
+
+
+def test_markdown_report_grows_module_by_module(tmp_path):
+    writer, path = _writer(tmp_path, "markdown")
+
+    writer.write_module(1, MODULES[0])
+    text = path.read_text(encoding="utf-8")
+    assert "# 测试用例（模式：default）" in text
+    assert "## 模块 1: 用户登录" in text and "- 预期结果: 账户锁定" in text
+    assert "购物车结算" not in text
+
+    writer.write_module(2, MODULES[1])
+    writer.close([], PLAN)
+
+    text = path.read_text(encoding="utf-8")
+    assert text.index("## 模块 1") < text.index("## 模块 2") < text.index("## 测试方案摘要")
+
+
+def test_aborted_json_run_keeps_the_written_modules(tmp_path):
+    writer, path = _writer(tmp_path, "json")
+    writer.write_module(1, MODULES[0])
+
+    writer.abort()
+
+    document = json.loads(path.read_text(encoding="utf-8"))["document"]
+    assert document["complete"] is False and len(document["modules"]) == 1
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported testcase output format"):
+        create_testcase_writer("xml", tmp_path / "cases.xml", "default", {}, {})
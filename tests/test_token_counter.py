@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils import token_counter  # noqa: E402
+from utils.token_counter import TokenCounter, estimate_tokens  # noqa: E402
+
+TEXT = "登录失败5次后锁定账户 for 30 minutes."
+
+
+def test_estimate_counts_cjk_characters_and_english_by_length():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("登录失败") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("登录 ok") == 2 + 1
+
+
+def test_counter_estimates_when_tiktoken_is_missing(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    monkeypatch.setattr(token_counter, "_ENCODINGS", {})
+
+    counter = TokenCounter("gpt-4o")
+
+    assert not counter.exact
+    assert counter.count(TEXT) == estimate_tokens(TEXT)
+    assert counter.count_messages([TEXT, TEXT]) == 2 * (estimate_tokens(TEXT) + 4)
+
+
+def test_kimi_models_always_estimate():
+    counter = TokenCounter("kimi-k2-turbo-preview")
+
+    assert not counter.exact
+    assert counter.count(TEXT) == estimate_tokens(TEXT)
+    assert counter.context_window == 262144
+
+
+def test_check_warns_over_the_prompt_budget():
+    warnings = []
+    counter = TokenCounter(
+        "kimi-k2-turbo-preview", context_window=100, reserve_output_tokens=60
+    ).with_warning(warnings.append)
+
+    assert counter.check(["登录" * 10], "Chat") == 24
+    assert warnings == []
+    counter.check(["登录" * 20], "Chat")
+    assert len(warnings) == 1 and "over the 40-token budget" in warnings[0]
+
+
+def test_truncate_cuts_at_paragraph_boundaries():
+    counter = TokenCounter(tokenizer='estimate')
+    text = "第一段内容\n\n第二段内容\n\n第三段内容"
+
+    assert counter.truncate(text, 12) == "第一段内容\n\n第二段内容"
+    assert counter.truncate(text, 12, keep='tail') == "第二段内容\n\n第三段内容"
+    assert counter.truncate("一二三四五六", 3) == "一二三"